@@ -223,6 +223,7 @@ def onAnswerAcceptCanceled(answer, user, timestamp=None):
 
     answer.thread.accepted_answer = None
     answer.thread.save()
+    answer.thread.reset_unanswered_counters()
 
     question = answer.thread._question_post()
 
@@ -265,10 +266,10 @@ def onUpVoted(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.save()
 
-    if post.post_type != 'comment':
-        post.vote_up_count = int(post.vote_up_count) + 1
-    post.points = int(post.points) + 1
-    post.save()
+    if post.post_type == 'comment':
+        post.update_vote_counts(1)
+    else:
+        post.update_vote_counts(1, up_votes=1)
 
     if post.post_type == 'comment':
         # reputation is not affected by the comment votes
@@ -302,13 +303,10 @@ def onUpVotedCanceled(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.delete()
 
-    if post.post_type != 'comment':
-        post.vote_up_count = int(post.vote_up_count) - 1
-        if post.vote_up_count < 0:
-            post.vote_up_count = 0
-
-    post.points = int(post.points) - 1
-    post.save()
+    if post.post_type == 'comment':
+        post.update_vote_counts(-1)
+    else:
+        post.update_vote_counts(-1, up_votes=-1)
 
     if post.post_type == 'comment':
         # comment votes do not affect reputation
@@ -340,9 +338,7 @@ def onDownVoted(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.save()
 
-    post.vote_down_count = int(post.vote_down_count) + 1
-    post.points = int(post.points) - 1
-    post.save()
+    post.update_vote_counts(-1, down_votes=1)
 
     if not (post.wiki or post.is_anonymous):
         author = post.author
@@ -384,11 +380,7 @@ def onDownVotedCanceled(vote, post, user, timestamp=None):
         timestamp = timezone.now()
     vote.delete()
 
-    post.vote_down_count = int(post.vote_down_count) - 1
-    if post.vote_down_count < 0:
-        post.vote_down_count = 0
-    post.points = post.points + 1
-    post.save()
+    post.update_vote_counts(1, down_votes=-1)
 
     if not (post.wiki or post.is_anonymous):
         author = post.author
@@ -20,6 +20,7 @@ at run time
 
 askbot.deps.livesettings is a module developed for satchmo project
 """
+import functools
 import logging
 
 from django.conf import settings as django_settings
@@ -37,6 +38,7 @@ from livesettings.values import SortedDotDict
 from livesettings.functions import config_register
 from livesettings.functions import config_get
 from livesettings import signals
+from askbot.utils.cache import get_or_compute, get_stale_key, set_with_stale
 from askbot.utils.functions import format_setting_name
 
 
@@ -195,7 +197,12 @@ class ConfigSettings(object):
 
     def as_dict(self):
         cache_key = get_bulk_cache_key()
-        return cache.get(cache_key) or self.prime_cache(cache_key)
+        #one request reloads the settings, others get the stale copy
+        return get_or_compute(
+                    cache_key,
+                    functools.partial(self.prime_cache, cache_key),
+                    family='askbot-settings'
+                )
 
     @classmethod
     def precache_all_values(cls):
@@ -218,7 +225,9 @@ class ConfigSettings(object):
 
     @classmethod
     def prime_cache(cls, cache_key, **kwargs):
-        """reload all settings into cache as dictionary
+        """reload all settings into cache,
+        returns all settings as dictionary,
+        which is cached by the ``as_dict()``
         """
         db_keys = cls.precache_all_values()
 
@@ -247,8 +256,6 @@ class ConfigSettings(object):
 
             out[key] = value
 
-        cache.set(cache_key, out)
-
         return out
 
 
@@ -262,7 +269,10 @@ def update_cached_value(key, value, language_code=None):
     settings_dict = cache.get(cache_key)
     if settings_dict:
         settings_dict[key] = value
-        cache.set(cache_key, settings_dict)
+        set_with_stale(cache_key, settings_dict)
+    else:
+        #the changed value must not be served from the stale copy
+        cache.delete(get_stale_key(cache_key))
 
 
 def cached_value_update_handler(setting=None, new_value=None,
@@ -7,16 +7,19 @@ from askbot import const
 class AskbotStaticSettings(AppConf):
     ALLOWED_UPLOAD_FILE_TYPES = ('.jpg', '.jpeg', '.gif',
                                 '.bmp', '.png', '.tiff')
+    CACHE_STATS_ENABLED = False # count hits and misses of the caches, see askbot.utils.cache_stats
     CAS_USER_FILTER = None
     CAS_USER_FILTER_DENIED_MSG = None
     CAS_GET_USERNAME = None # python path to function
     CAS_GET_EMAIL = None # python path to function
+    COUNTERS_TIMEOUT = 24 * 3600 # seconds, see askbot.models.counters
     CUSTOM_BADGES = None # python path to module with badges
     CUSTOM_USER_PROFILE_TAB = None # dict(NAME, SLUG, CONTEXT_GENERATOR
                                    # the latter is path to func with 
                                    # variables (request, user)
     DEBUG_INCOMING_EMAIL = False
     EXTRA_SKINS_DIR = None #None or path to directory with skins
+    INSTANT_NOTIFICATIONS_BATCH_SIZE = 200 # recipients per email sending task
     IP_MODERATION_ENABLED = False
     LANGUAGE_MODE = 'single-lang' # 'single-lang', 'url-lang' or 'user-lang'
     MAIN_PAGE_BASE_URL = pgettext('urls', 'questions') + '/'
@@ -29,10 +32,14 @@ class AskbotStaticSettings(AppConf):
         }
 
     QUESTION_PAGE_BASE_URL = pgettext('urls', 'question') + '/'
+    QUESTIONS_COUNT_CACHE_TIMEOUT = 60 # seconds, 0 to count on every request
     SERVICE_URL_PREFIX = 's/' # prefix for non-UI urls
     SELF_TEST = True # if true - run startup self-test
+    SQLITE_FULL_TEXT_SEARCH_ENABLED = False # FTS5 search index, see askbot.search.sqlite
     TRANSLATE_URL = True # set true to localize urls
     USER_DATA_EXPORT_DIR = const.DEFAULT_USER_DATA_EXPORT_DIR
+    VISIT_RECORDING_INTERVAL = 0 # seconds between writes of user visits
+                                 # to the database, 0 - write every visit
     WHITELISTED_IPS = tuple() # a tuple of whitelisted ips for moderation
 
     class Meta:
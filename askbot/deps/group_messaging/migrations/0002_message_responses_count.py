@@ -0,0 +1,38 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import models, migrations
+
+
+def count_responses(apps, schema_editor):
+    Message = apps.get_model('group_messaging', 'Message')
+    counts = Message.objects.filter(
+                            root__isnull=False
+                        ).values('root_id').annotate(
+                            count=models.Count('id')
+                        )
+    for item in counts:
+        Message.objects.filter(id=item['root_id']).update(
+                                        responses_count=item['count']
+                                    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('group_messaging', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='message',
+            name='responses_count',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='message',
+            name='last_active_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.RunPython(count_responses, migrations.RunPython.noop),
+    ]
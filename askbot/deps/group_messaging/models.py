@@ -192,21 +192,18 @@ class MessageManager(models.Manager):
             )
             return self.filter(message_filter & deleted_filter)
         else:
-            #rather a tricky query (may need to change the idea to get rid of this)
-            #select threads that have a memo for the user, but the memo is not ARCHIVED
-            #in addition, select threads that have zero memos for the user
-            marked_as_non_deleted_filter = models.Q(
-                                            memos__status=MessageMemo.SEEN,
-                                            memos__user=recipient
-                                        )
-            #part1 - marked as non-archived
-            part1 = self.filter(message_filter & marked_as_non_deleted_filter)
-            #part2 - messages for the user without an attached memo
-            part2 = self.filter(message_filter & ~models.Q(memos__user=recipient))
-            #strange that (part1 | part2).distinct() sometimes gives wrong result
-            threads = list(set(part1) | set(part2))
-            thread_ids = [thread.id for thread in threads]
-            return Message.objects.filter(id__in=thread_ids).distinct()
+            #select threads that have no memo for the user
+            #or have a memo in the SEEN status - i.e. all threads
+            #except the ones archived or deleted by the user,
+            #there is at most one memo per user and message
+            hidden_ids = MessageMemo.objects.filter(
+                                    user=recipient,
+                                    status__gt=MessageMemo.SEEN
+                                ).values('message_id')
+            thread_ids = self.filter(message_filter).values('id')
+            return Message.objects.filter(
+                                    id__in=thread_ids
+                                ).exclude(id__in=hidden_ids).distinct()
 
     def create(self, **kwargs):
         """creates a message"""
@@ -276,6 +273,11 @@ class MessageManager(models.Manager):
         message.root.last_active_at = timezone.now()
         #update senders info - stuff that is shown in the thread heading
         message.root.update_senders_info()
+        #count the response with a narrow update, root is saved above
+        Message.objects.filter(id=message.root_id).update(
+                        responses_count=models.F('responses_count') + 1
+                    )
+        message.root.responses_count += 1
         #signal response as created, upon signal increment counters
         response_created.send(None, message=message)
         #move the thread to inboxes of all recipients
@@ -332,9 +334,13 @@ class Message(models.Model):
     )
 
     sent_at = models.DateTimeField(auto_now_add=True)
-    last_active_at = models.DateTimeField(auto_now_add=True)
+    last_active_at = models.DateTimeField(auto_now_add=True, db_index=True)
     active_until = models.DateTimeField(blank=True, null=True)
 
+    #denormalized number of responses in the thread,
+    #maintained on the root messages only
+    responses_count = models.PositiveIntegerField(default=0)
+
     objects = MessageManager()
 
     def add_recipient_names_to_senders_info(self, recipient_groups):
@@ -483,7 +489,9 @@ class Message(models.Model):
         senders_names.insert(0, self.sender.username)
 
         self.senders_info = (','.join(senders_names))[:64]
-        self.save()
+        #fields updated upon a new response,
+        #the responses count is updated separately
+        self.save(update_fields=('senders_info', 'headline', 'last_active_at'))
 
     def move_to_inbox(self, user=None):
         """unarchive message for all recipients"""
@@ -557,23 +565,53 @@ class UnreadInboxCounter(models.Model):
 
 
 def increment_unread_inbox_counters(sender, message, **kwargs):
+    """increments unread inbox counters of the message recipients
+    with a fixed number of queries, regardless of the number
+    of recipients"""
     root_message = message.get_root_message()
-    for user in message.get_recipients_users():
-        if message == root_message \
-            or not root_message.is_unread_by_user(user, ignore_message=message) \
-            or root_message.is_archived_or_deleted(user):
-
-            # 1) if message is root - we have new thread,
-            # so it's safe to increment the inbox counter
-            # 2) if the message is a reply - the counter might
-            # have already been incremented. Therefore - we check
-            # whether the message was unread by the user,
-            # excluding the current message, which is obviously unread
-            # 3) if root message is deleted or archived then increment
-
-            counter = get_unread_inbox_counter(user)
-            counter.increment()
-            counter.save()
+    users = message.get_recipients_users()
+
+    if message != root_message:
+        # 1) if message is root - we have new thread,
+        # so it's safe to increment the inbox counter
+        # 2) if the message is a reply - the counter might
+        # have already been incremented. Therefore - we select
+        # users who have seen the thread, excluding the current message,
+        # which is obviously unread
+        # 3) if root message is deleted or archived then increment
+        newer_messages = Message.objects.filter(
+                                    root=root_message,
+                                    sent_at__gt=models.OuterRef('at')
+                                ).exclude(id=message.id)
+        seen_user_ids = LastVisitTime.objects.filter(
+                                    message=root_message
+                                ).annotate(
+                                    has_newer=models.Exists(newer_messages)
+                                ).filter(
+                                    has_newer=False
+                                ).values('user_id')
+        hidden_user_ids = MessageMemo.objects.filter(
+                                    message=root_message,
+                                    status__gt=MessageMemo.SEEN
+                                ).values('user_id')
+        users = users.filter(
+                    models.Q(id__in=seen_user_ids) \
+                    | models.Q(id__in=hidden_user_ids)
+                )
+
+    user_ids = users.values('id')
+    missing_ids = User.objects.filter(
+                            id__in=user_ids
+                        ).exclude(
+                            id__in=UnreadInboxCounter.objects.values('user_id')
+                        ).values_list('id', flat=True)
+    UnreadInboxCounter.objects.bulk_create(
+                [UnreadInboxCounter(user_id=user_id) for user_id in missing_ids],
+                batch_size=500
+            )
+    UnreadInboxCounter.objects.filter(
+                            user__in=user_ids
+                        ).update(count=models.F('count') + 1)
 
 
 def send_email(sender, message, **kwargs):
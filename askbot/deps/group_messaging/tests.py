@@ -6,12 +6,13 @@ from askbot.deps.group_messaging.models import create_personal_group
 from askbot.deps.group_messaging.models import get_personal_group
 from askbot.deps.group_messaging.models import get_unread_inbox_counter
 from askbot.deps.group_messaging.views import ThreadsList
+from askbot.models import GroupMembership
 from askbot.tests.utils import with_settings
 from bs4 import BeautifulSoup
 from django.contrib.auth.models import User, Group
 from django.test import TestCase
 from django.utils import timezone
-from mock import Mock
+from mock import Mock, patch
 import time
 import urllib.parse
 
@@ -192,6 +193,37 @@ class ViewsTests(GroupMessagingTests):
         thread_data = context['threads_data'][root.id]
         self.assertEqual(thread_data['status'], 'seen')
 
+    @patch('askbot.deps.group_messaging.views.THREADS_PAGE_SIZE', 2)
+    def test_threads_list_is_paginated(self):
+        root, response, response2 = self.setup_three_message_thread()
+        threads = [root]
+        for _ in range(2):
+            threads.append(self.create_thread_for_user(self.sender, self.recipient))
+        #same activity time for all threads, order falls back to id
+        Message.objects.filter(id__in=[t.id for t in threads]).update(
+                                        last_active_at=root.last_active_at
+                                    )
+        context = self.get_view_context(
+                                ThreadsList,
+                                data={'sender_id': '-1'},
+                                user=self.recipient
+                            )
+        page_ids = [thread.id for thread in context['threads']]
+        self.assertEqual(page_ids, [threads[2].id, threads[1].id])
+        self.assertEqual(context['next_before'], threads[1].id)
+
+        context = self.get_view_context(
+                                ThreadsList,
+                                data={
+                                    'sender_id': '-1',
+                                    'before': str(context['next_before'])
+                                },
+                                user=self.recipient
+                            )
+        self.assertEqual(context['threads'], [root])
+        self.assertEqual(context['next_before'], None)
+        self.assertEqual(context['threads_data'][root.id]['responses_count'], 2)
+
 class ModelsTests(GroupMessagingTests):
     """test cases for the `private_messaging` models"""
 
@@ -250,6 +282,29 @@ class ModelsTests(GroupMessagingTests):
         counter = get_unread_inbox_counter(self.sender)
         self.assertEqual(counter.count, 0)
 
+    def test_unread_counters_of_group_members(self):
+        group = Group.objects.create(name='somegroup')
+        members = [create_user('member%d' % idx) for idx in range(3)]
+        for member in members:
+            GroupMembership.objects.create(group=group, user=member)
+        get_unread_inbox_counter(members[0])#one counter exists already
+        thread = self.create_thread(self.sender, [group])
+        counts = [get_unread_inbox_counter(member).count for member in members]
+        self.assertEqual(counts, [1, 1, 1])
+
+        #seen and archived threads are counted again upon a response,
+        #the thread that is still unread is not
+        self.visit_thread(thread, members[0])
+        thread.archive(members[1])
+        Message.objects.create_response(
+                                sender=self.sender,
+                                text='some response',
+                                parent=thread
+                            )
+        counts = [get_unread_inbox_counter(member).count for member in members]
+        self.assertEqual(counts, [2, 2, 1])
+        self.assertEqual(get_unread_inbox_counter(self.sender).count, 0)
+
     def test_recalculate_unread_counter(self):
         thread = self.create_thread_for_user(self.sender, self.recipient)
         counter = get_unread_inbox_counter(self.recipient)
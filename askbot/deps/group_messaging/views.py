@@ -12,7 +12,6 @@ import copy
 from django.template.loader import get_template
 from django.template import Context
 from django.contrib.auth.models import User
-from django.db import models
 from django.db.models import Q
 from django.forms import IntegerField
 from django.http import HttpResponse
@@ -30,6 +29,19 @@ from askbot.deps.group_messaging.models import get_personal_groups_for_users
 from askbot.deps.group_messaging.models import get_unread_inbox_counter
 
 
+#number of threads per page of the thread list
+THREADS_PAGE_SIZE = 30
+
+
+def get_request_param(request, name, default):
+    """returns value of the request parameter,
+    from the GET data, then from the POST data"""
+    value = getattr(request, 'GET', {}).get(name, None)
+    if value is None:
+        value = getattr(request, 'POST', {}).get(name, default)
+    return value
+
+
 class NewThread(PjaxView):
     """view for creation of new thread"""
     http_method_list = ('POST',)
@@ -100,7 +112,9 @@ class ThreadsList(PjaxView):
     http_method_list = ('GET',)
 
     def get_context(self, request, *args):
-        """returns thread list data"""
+        """returns one page of the thread list data,
+        pages are selected by the id of the last thread
+        on the previous page, passed as parameter ``before``"""
 
         if len(args):
             user = args[0]
@@ -108,7 +122,10 @@ class ThreadsList(PjaxView):
             user = request.user
 
         #get threads and the last visit time
-        sender_id = IntegerField().clean(request.GET.get('sender_id',request.POST.get('sender_id', '-1')))
+        sender_id = IntegerField().clean(get_request_param(request, 'sender_id', '-1'))
+        before_id = IntegerField(required=False).clean(
+                                get_request_param(request, 'before', None)
+                            )
 
         if sender_id == -2:
             received = Message.objects.get_threads(recipient=user, deleted=True)
@@ -124,7 +141,24 @@ class ThreadsList(PjaxView):
                                             recipient=user,
                                             sender=sender
                                         )
-        threads = threads.order_by('-last_active_at')
+
+        if before_id:
+            #keyset condition, ordering is by the activity time and id
+            before = Message.objects.filter(id=before_id).values('last_active_at')
+            before_time = before[0]['last_active_at'] if before else None
+            if before_time:
+                threads = threads.filter(
+                    Q(last_active_at__lt=before_time) \
+                    | Q(last_active_at=before_time, id__lt=before_id)
+                )
+
+        threads = threads.order_by('-last_active_at', '-id')
+        #one extra thread tells whether there is a next page
+        threads = list(threads[:THREADS_PAGE_SIZE + 1])
+        next_before = None
+        if len(threads) > THREADS_PAGE_SIZE:
+            threads = threads[:THREADS_PAGE_SIZE]
+            next_before = threads[-1].id
 
         #for each thread we need to know if there is something
         #unread for the user - to mark "new" threads as bold
@@ -139,22 +173,13 @@ class ThreadsList(PjaxView):
                 senders_names.remove(user.username)
             thread_data['senders_info'] = ', '.join(senders_names)
             thread_data['thread'] = thread
+            #responses are counted upon creation
+            thread_data['responses_count'] = thread.responses_count
             threads_data[thread.id] = thread_data
 
-        ids = [thread.id for thread in threads]
-        counts = Message.objects.filter(
-                                id__in=ids
-                            ).annotate(
-                                responses_count=models.Count('descendants')
-                            ).values('id', 'responses_count')
-        for count in counts:
-            thread_id = count['id']
-            responses_count = count['responses_count']
-            threads_data[thread_id]['responses_count'] = responses_count
-
         last_visit_times = LastVisitTime.objects.filter(
                                             user=user,
-                                            message__in=threads
+                                            message__in=[thread.id for thread in threads]
                                         )
         for last_visit in last_visit_times:
             thread_data = threads_data[last_visit.message_id]
@@ -163,9 +188,9 @@ class ThreadsList(PjaxView):
 
         return {
             'threads': threads,
-            'threads_count': threads.count(),
             'threads_data': threads_data,
-            'sender_id': sender_id
+            'sender_id': sender_id,
+            'next_before': next_before
         }
 
 
@@ -47,7 +47,8 @@ def extract_first_email_address(text):
     else:
         return None
 
-def _send_mail(subject_line, body_text, sender_email, recipient_list, headers=None, attachments=None):
+def _send_mail(subject_line, body_text, sender_email, recipient_list,
+               headers=None, attachments=None, connection=None):
     """base send_mail function, which will attach email in html format
     if html email is enabled"""
     html_enabled = askbot_settings.HTML_EMAIL_ENABLED
@@ -71,7 +72,8 @@ def _send_mail(subject_line, body_text, sender_email, recipient_list, headers=No
                 sender_email,
                 email_list,
                 headers=headers,
-                attachments=attachments
+                attachments=attachments,
+                connection=connection
             )
     if html_enabled:
         msg.attach_alternative(body_text, "text/html")
@@ -85,7 +87,8 @@ def send_mail(
             recipient_list=None,
             headers=None,
             raise_on_failure=False,
-            attachments=None
+            attachments=None,
+            connection=None
         ):
     """
     todo: remove parameters not relevant to the function
@@ -96,6 +99,8 @@ def send_mail(
 
     if raise_on_failure is True, exceptions.EmailNotSent is raised
     `attachments` is a tuple of triples ((filename, filedata, mimetype), ...)
+    `connection` - optional email backend connection, allows to
+    send many messages over one connection, see `get_mail_connection`
     """
     from_email = from_email or askbot_settings.ADMIN_EMAIL \
                             or django_settings.DEFAULT_FROM_EMAIL
@@ -109,7 +114,8 @@ def send_mail(
             from_email,
             recipient_list,
             headers=headers,
-            attachments=attachments
+            attachments=attachments,
+            connection=connection
         )
         logging.debug('sent update to %s' % ','.join(map(str, recipient_list)))
     except Exception as error:
@@ -117,6 +123,20 @@ def send_mail(
         if raise_on_failure == True:
             raise exceptions.EmailNotSent(str(error))
 
+def get_mail_connection():
+    """returns an open email backend connection,
+    to be reused for sending many messages,
+    caller is responsible for closing the connection
+    """
+    connection = mail.get_connection()
+    try:
+        connection.open()
+    except Exception as error:
+        #messages will be sent over new connections
+        #and errors reported by the send_mail function
+        sys.stderr.write('\n' + str(error) + '\n')
+    return connection
+
 INSTRUCTIONS_PREAMBLE = ugettext_lazy('<p>To post by email, please:</p>')
 QUESTION_TITLE_INSTRUCTION = ugettext_lazy(
     '<li>Type title in the subject line</li>'
@@ -137,7 +137,8 @@ class BaseEmail(object):
         body = template.render(Context(self.get_context(context)))
         return absolutize_urls(body)
 
-    def send(self, recipient_list, raise_on_failure=False, headers=None, attachments=None):
+    def send(self, recipient_list, raise_on_failure=False, headers=None,
+             attachments=None, connection=None):
         if self.is_enabled():
             from askbot.mail import send_mail
             send_mail(
@@ -147,7 +148,8 @@ class BaseEmail(object):
                 recipient_list=recipient_list,
                 headers=headers or self.get_headers(),
                 raise_on_failure=raise_on_failure,
-                attachments=attachments or self.get_attachments()
+                attachments=attachments or self.get_attachments(),
+                connection=connection
             )
         else:
             LOG.warning(
@@ -339,25 +341,54 @@ class InstantEmailAlert(BaseEmail):
         update_type_map = const.RESPONSE_ACTIVITY_TYPE_MAP_FOR_TEMPLATES
         return update_type_map[activity.activity_type]
 
+    @classmethod
+    def get_post_context(cls, post, update_activity):
+        """returns part of the context that is the same
+        for all recipients of the alert about the post update,
+        when alerts are sent in bulk, it is calculated once
+        and passed to the emails as `post_context`"""
+        update_type = cls.get_update_type(update_activity)
+        origin_post = post.get_origin_post()
+        context = {
+           'update_type': update_type,
+           'post_url': site_url(post.get_absolute_url()),
+           'origin_post': origin_post,
+           'thread_title': origin_post.thread.title,
+           'alt_reply_subject': urllib.parse.quote(('Re: ' + post.thread.title).encode('utf-8')),
+           'parent_posts': post.get_parent_post_chain(),
+           'revision_diff': None
+        }
+        if update_type.endswith('update'):
+            context['revision_diff'] = post.get_latest_revision_diff(
+                    ins_start='<b><u style="background-color:#cfc">',
+                    ins_end='</u></b>',
+                    del_start='<del style="color:#600;background-color:#fcc">',
+                    del_end='</del>'
+                )
+        return context
+
     def process_context(self, context):
         to_user = context.get('to_user')
         from_user = context.get('from_user')
         post = context.get('post')
         update_activity = context.get('update_activity')
-        update_type = self.get_update_type(update_activity)
 
         #unhandled update_type 'post_shared'
         #user_action = _('%(user)s shared a %(post_link)s.')
 
-        origin_post = post.get_origin_post()
-        post_url = site_url(post.get_absolute_url())
+        post_context = context.get('post_context')
+        if post_context is None:
+            post_context = self.get_post_context(post, update_activity)
 
         can_reply = to_user.can_post_by_email()
-        from askbot.models import get_reply_to_addresses
-        reply_address, alt_reply_address = get_reply_to_addresses(to_user, post)
-        alt_reply_subject = urllib.parse.quote(('Re: ' + post.thread.title).encode('utf-8'))
+        if 'reply_address' in context:
+            reply_address = context['reply_address']
+            alt_reply_address = context.get('alt_reply_address')
+        else:
+            from askbot.models import get_reply_to_addresses
+            reply_address, alt_reply_address = get_reply_to_addresses(to_user, post)
 
-        return {
+        context = {
            'admin_email': askbot_settings.ADMIN_EMAIL,
            'recipient_user': to_user,
            'update_author_name': from_user.username,
@@ -365,18 +396,15 @@ class InstantEmailAlert(BaseEmail):
            'receiving_user_karma': to_user.reputation,
            'reply_by_email_karma_threshold': askbot_settings.MIN_REP_TO_POST_BY_EMAIL,
            'can_reply': can_reply,
-           'update_type': update_type,
            'update_activity': update_activity,
            'post': post,
-           'post_url': post_url,
-           'origin_post': origin_post,
-           'thread_title': origin_post.thread.title,
            'reply_address': reply_address,
            'alt_reply_address': alt_reply_address,
-           'alt_reply_subject': alt_reply_subject,
            'is_multilingual': askbot.is_multilingual(),
            'reply_sep_tpl': const.SIMPLE_REPLY_SEPARATOR_TEMPLATE
         }
+        context.update(post_context)
+        return context
 
 
 class ReplyByEmailError(BaseEmail):
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+
+from askbot.models import SimilarThread, Thread
+from askbot.utils.console import ProgressBar
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the index of similar threads shown in the question sidebar'
+
+    def handle(self, **options):
+        SimilarThread.objects.all().delete()
+        threads = Thread.objects.filter(deleted=False)
+        count = threads.count()
+        message = 'Building the similar threads index'
+        for thread in ProgressBar(threads.iterator(), count, message):
+            #every thread builds its own list
+            thread.update_similar_threads(update_neighbors=False)
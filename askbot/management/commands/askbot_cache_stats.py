@@ -0,0 +1,62 @@
+"""Shows hit ratios, recomputation times and sizes
+of the askbot caches and the numbers of queries and render times
+of the views, collected with ``ASKBOT_CACHE_STATS_ENABLED``"""
+from django.core.management import BaseCommand
+from askbot.utils import cache_stats
+
+
+def get_average(total, count):
+    if count:
+        return float(total) / count
+    return 0.0
+
+
+class Command(BaseCommand):
+    help = 'Shows statistics of the askbot caches and views'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--reset',
+            action='store_true',
+            default=False,
+            help='Delete the collected statistics'
+        )
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            cache_stats.reset_stats()
+            return
+
+        stats = cache_stats.get_stats()
+        families = sorted(family for family in stats if not family.startswith('view:'))
+        views = sorted(family for family in stats if family.startswith('view:'))
+
+        row = '%-50s %8s %8s %8s %6s %8s %10s %10s\n'
+        self.stdout.write(row % (
+                'cache key family', 'hits', 'misses', 'stale',
+                'ratio', 'computes', 'avg ms', 'avg bytes'
+            ))
+        for family in families:
+            data = stats[family]
+            lookups = data['hits'] + data['misses'] + data['stale']
+            self.stdout.write(row % (
+                family,
+                data['hits'],
+                data['misses'],
+                data['stale'],
+                '%.2f' % get_average(data['hits'] + data['stale'], lookups),
+                data['computes'],
+                '%.1f' % get_average(data['compute_ms'], data['computes']),
+                '%.0f' % get_average(data['bytes'], data['computes'])
+            ))
+
+        row = '%-50s %8s %12s %10s\n'
+        self.stdout.write('\n' + row % ('view', 'requests', 'avg queries', 'avg ms'))
+        for family in views:
+            data = stats[family]
+            self.stdout.write(row % (
+                family[len('view:'):],
+                data['requests'],
+                '%.1f' % get_average(data['queries'], data['requests']),
+                '%.1f' % get_average(data['render_ms'], data['requests'])
+            ))
@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from askbot.search import sqlite
+
+
+class Command(BaseCommand):
+    help = 'Rebuilds the SQLite full text search index of threads, posts and users'
+
+    def handle(self, **options):
+        if not sqlite.supports_full_text_search():
+            raise CommandError('Database is not SQLite or SQLite has no FTS5 extension')
+        with transaction.atomic():
+            thread_count, user_count = sqlite.rebuild_index()
+        self.stdout.write(
+            'Indexed %d threads and %d users' % (thread_count, user_count)
+        )
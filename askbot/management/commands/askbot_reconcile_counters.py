@@ -0,0 +1,13 @@
+"""Recounts cached counters of posts, users, groups and
+listed questions, to be run periodically, e.g. from cron"""
+from askbot.models import counters
+from django.conf import settings as django_settings
+from django.core.management import BaseCommand
+from django.utils import translation
+
+class Command(BaseCommand):
+    help = 'Recounts cached counters of posts, users, groups and questions'
+
+    def handle(self, *args, **kwargs):
+        translation.activate(django_settings.LANGUAGE_CODE)
+        counters.reconcile_counters()
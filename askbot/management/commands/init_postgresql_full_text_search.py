@@ -30,3 +30,11 @@ class Command(BaseCommand):
                             'user_profile_search_12202015.plsql'
                         )
         setup_full_text_search(script_path)
+
+        script_path = os.path.join(
+                            dir_path,
+                            'search',
+                            'postgresql',
+                            'trigram_indexes_10182026.plsql'
+                        )
+        setup_full_text_search(script_path)
@@ -7,24 +7,32 @@ from collections import OrderedDict
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
-from django.core.management import BaseCommand
-from django.db import connection
-from django.db.models import Q, F
+from django.core.cache import cache
+from django.core.management import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Q, F, Max
+from django.db.models.functions import Mod
 from django.utils import timezone
 from django.utils.translation import ugettext as _
 from django.utils.translation import activate as activate_language
 
 from askbot import const
+from askbot.exceptions import EmailNotSent
 from askbot.deps.django_authopenid.util import email_is_blacklisted
 from askbot.conf import settings as askbot_settings
 from askbot.models import User, Post, PostRevision, Thread
 from askbot.models import Activity, EmailFeedSetting
 from askbot.mail.messages import BatchEmailAlert
-from askbot.mail import send_mail
+from askbot.mail import get_mail_connection, send_mail
 from askbot.utils.html import site_url
 
 
 DEBUG_THIS_COMMAND = False
+#checkpoints allow to resume interrupted runs without rescanning
+#the users processed before, they are kept in the cache and may be lost,
+#which is safe - feeds are marked reported together with the sending
+#of the email, so the users emailed before are not emailed again
+CHECKPOINT_TIMEOUT = 24 * 60 * 60
 SITE_ID = Site.objects.get_current().id
 
 
@@ -90,20 +98,306 @@ def format_action_count(string, number, output):
         output.append(_(string) % {'num':number})
 
 
+def get_due_feeds(now):
+    """returns query set of the daily and weekly
+    feeds for which the report must be sent now,
+    same as ``EmailFeedSetting.should_send_now()`` in bulk"""
+    due_filter = Q(reported_at__isnull=True)
+    for frequency in ('d', 'w'):
+        cutoff_time = now - EmailFeedSetting.DELTA_TABLE[frequency]
+        due_filter |= Q(frequency=frequency, reported_at__lte=cutoff_time)
+    return EmailFeedSetting.objects.filter(
+                                frequency__in=('d', 'w')
+                            ).filter(due_filter)
+
+
+def get_latest_activity_per_user(threads, user_field):
+    """returns dictionary user id -> latest activity time
+    among the given threads, users are related to threads via ``user_field``
+    """
+    rows = threads.order_by().values(user_field).annotate(
+                                    latest=Max('last_activity_at')
+                                )
+    return dict([(row[user_field], row['latest']) for row in rows if row[user_field]])
+
+
+def merge_latest_activity(dst, src):
+    for user_id, timestamp in src.items():
+        if user_id not in dst or dst[user_id] < timestamp:
+            dst[user_id] = timestamp
+
+
+def get_checkpoint_cache_key(shards, shard_index):
+    return 'askbot-email-alerts-checkpoint-{}-{}'.format(shards, shard_index)
+
+
+def cache_is_persistent():
+    """True if the cache is shared by the processes
+    and survives the restarts of the command"""
+    backend = django_settings.CACHES['default']['BACKEND']
+    return not ('locmem' in backend or 'dummy' in backend)
+
+
+def filter_user_shard(queryset, field_name, shard):
+    """filters the query set by the user ids of the shard,
+    ``shard`` is a pair (number of shards, shard index),
+    users with ``id % shards == shard_index`` are in the shard,
+    so that the shards agree regardless of the users joining
+    between the starts of the shards"""
+    shards, shard_index = shard
+    if shards == 1:
+        return queryset
+    return queryset.annotate(
+                    user_shard=Mod(field_name, shards)
+                ).filter(user_shard=shard_index)
+
+
+def find_digest_recipient_ids(now, shard=(1, 0)):
+    """Returns set of ids of users who may have something
+    to receive in the digest.
+
+    Starts from the activity since the previous report
+    of the ripe feeds (``EmailFeedSetting.reported_at`` is the
+    persisted high-water mark per subscriber and feed type),
+    and inverts it into per-subscriber buckets in bulk
+    for each feed type.
+
+    Ripe feeds of the users without the relevant activity
+    are marked as reported, so that the next run starts from ``now``.
+
+    ``shard`` limits the search to the subscribers
+    of the shard, see ``filter_user_shard``.
+    """
+    due_feeds = get_due_feeds(now).exclude(subscriber__askbot_profile__status='b')
+    due_feeds = filter_user_shard(due_feeds, 'subscriber_id', shard)
+    due = list(due_feeds.values_list('id', 'subscriber_id', 'feed_type', 'reported_at'))
+    marks = [item[3] for item in due if item[3] is not None]
+    if marks:
+        since = min(marks)
+    else:
+        since = now
+
+    threads = Thread.objects.filter(
+                            last_activity_at__gt=since,
+                            last_activity_at__lte=now,
+                            closed=False
+                        )
+
+    #feed type -> {user id -> time of latest relevant activity}
+    activity = dict()
+    activity['q_sel'] = get_latest_activity_per_user(threads, 'followed_by')
+    activity['q_ask'] = get_latest_activity_per_user(
+                            threads.filter(posts__post_type='question'),
+                            'posts__author'
+                        )
+    activity['q_ans'] = get_latest_activity_per_user(
+                            threads.filter(posts__post_type='answer'),
+                            'posts__author'
+                        )
+    #authors of any posts may have comment responses
+    m_and_c = get_latest_activity_per_user(threads, 'posts__author')
+    mentions = Activity.objects.filter(
+                            activity_type=const.TYPE_ACTIVITY_MENTION,
+                            active_at__gt=since
+                        ).order_by().values('recipients').annotate(
+                            latest=Max('active_at')
+                        )
+    merge_latest_activity(
+        m_and_c,
+        dict([(row['recipients'], row['latest']) for row in mentions if row['recipients']])
+    )
+    activity['m_and_c'] = m_and_c
+
+    #whole forum subscribers receive any activity, except those
+    #who only want to hear about the interesting tags
+    latest_activity = threads.aggregate(latest=Max('last_activity_at'))['latest']
+    narrow_users = set(
+        due_feeds.filter(
+            feed_type='q_all',
+            subscriber__askbot_profile__email_tag_filter_strategy=const.INCLUDE_INTERESTING
+        ).exclude(
+            #wildcard selections are resolved in the per-user processing
+            subscriber__askbot_profile__interesting_tags__gt='',
+        ).exclude(
+            subscriber__askbot_profile__subscribed_tags__gt='',
+        ).values_list('subscriber_id', flat=True)
+    )
+    interesting = get_latest_activity_per_user(
+                    threads.filter(
+                        tags__user_selections__reason__in=('good', 'subscribed')
+                    ),
+                    'tags__user_selections__user'
+                )
+
+    recipient_ids = set()
+    for feed_id, user_id, feed_type, reported_at in due:
+        if reported_at is None:
+            recipient_ids.add(user_id)
+            continue
+
+        if feed_type == 'q_all':
+            if user_id in narrow_users:
+                latest = interesting.get(user_id)
+            else:
+                latest = latest_activity
+        else:
+            latest = activity[feed_type].get(user_id)
+
+        if latest and latest > reported_at:
+            recipient_ids.add(user_id)
+
+    #feeds of the recipients are marked reported in the per-user processing
+    idle_feed_ids = [item[0] for item in due if item[1] not in recipient_ids]
+    if DEBUG_THIS_COMMAND == False:
+        EmailFeedSetting.objects.filter(id__in=idle_feed_ids).update(reported_at=now)
+
+    return recipient_ids
+
+
 class Command(BaseCommand):
+    def add_arguments(self, parser):
+        parser.add_argument('--full',
+            action='store_true',
+            dest='full',
+            default=False,
+            help='Process all users, instead of only the ones '
+                 'with the relevant activity since the previous report'
+        )
+        parser.add_argument('--shards',
+            action='store',
+            type=int,
+            dest='shards',
+            default=1,
+            help='Number of user shards (by user id modulo the number '
+                 'of shards) processed by separate instances of this command'
+        )
+        parser.add_argument('--shard-index',
+            action='store',
+            type=int,
+            dest='shard_index',
+            default=0,
+            help='Zero-based index of the user shard '
+                 'processed by this instance'
+        )
+
     def handle(self, **options):
+        shards = options['shards']
+        shard_index = options['shard_index']
+        if shards < 1 or not 0 <= shard_index < shards:
+            raise CommandError('--shard-index must be between 0 and --shards - 1')
+
         if askbot_settings.ENABLE_EMAIL_ALERTS:
             activate_language(django_settings.LANGUAGE_CODE)
-            for user in User.objects.exclude(askbot_profile__status='b').iterator():
-                try:
-                    if email_is_blacklisted(user.email) \
-                        and askbot_settings.BLACKLISTED_EMAIL_PATTERNS_MODE == 'strict':
-                        continue
-                    self.send_email_alerts(user)
-                except Exception:
-                    self.report_exception(user)
+
+            if not cache_is_persistent():
+                self.stderr.write(
+                    'WARNING: the cache is not persistent, interrupted runs '
+                    'will rescan the users from the start, set up a shared '
+                    'cache system, such as redis or memcached'
+                )
+
+            checkpoint_key = get_checkpoint_cache_key(shards, shard_index)
+            checkpoint = cache.get(checkpoint_key)
+            if checkpoint is None:
+                #start a new run
+                checkpoint = {
+                    'started_at': timezone.now(),
+                    'shard': (shards, shard_index),
+                    'last_user_id': 0
+                }
+                cache.set(checkpoint_key, checkpoint, CHECKPOINT_TIMEOUT)
+
+            self.mail_connection = get_mail_connection()
+            try:
+                if options['full']:
+                    users = self.get_all_users(checkpoint)
+                else:
+                    users = self.get_recipients(checkpoint)
+
+                strict_blacklist = \
+                    askbot_settings.BLACKLISTED_EMAIL_PATTERNS_MODE == 'strict'
+                for user in users:
+                    if not (strict_blacklist and email_is_blacklisted(user.email)):
+                        try:
+                            #feeds are marked reported and the email
+                            #activity is saved only if the email is sent
+                            with transaction.atomic():
+                                self.send_email_alerts(user)
+                        except EmailNotSent as error:
+                            #checkpoint is not advanced past the user,
+                            #the next run resumes from this user
+                            raise CommandError(
+                                'Email alerts were not sent: %s' % error
+                            )
+                        except Exception:
+                            self.report_exception(user)
+
+                    checkpoint['last_user_id'] = user.id
+                    cache.set(checkpoint_key, checkpoint, CHECKPOINT_TIMEOUT)
+            finally:
+                self.mail_connection.close()
+
+            #the run is complete
+            cache.delete(checkpoint_key)
             connection.close()
 
+    def get_all_users(self, checkpoint, batch_size=500):
+        """yields all not blocked users of the shard
+        of the checkpoint, starting after the last processed user"""
+        users = User.objects.exclude(askbot_profile__status='b')
+        users = filter_user_shard(users, 'id', checkpoint['shard'])
+        last_user_id = checkpoint['last_user_id']
+        while True:
+            batch = list(users.filter(id__gt=last_user_id).order_by('id')[:batch_size])
+            if not batch:
+                return
+            for user in batch:
+                yield user
+            last_user_id = batch[-1].id
+
+    def get_recipients(self, checkpoint, batch_size=500):
+        """yields users who may have something to receive
+        in the digest, loaded in batches ordered by id"""
+        recipient_ids = find_digest_recipient_ids(
+                                    checkpoint['started_at'],
+                                    shard=checkpoint['shard']
+                                )
+        last_user_id = checkpoint['last_user_id']
+        recipient_ids = sorted([uid for uid in recipient_ids if uid > last_user_id])
+        for start in range(0, len(recipient_ids), batch_size):
+            batch_ids = recipient_ids[start:start + batch_size]
+            users = User.objects.filter(id__in=batch_ids).order_by('id')
+            for user in users:
+                yield user
+
+    def reopen_mail_connection(self):
+        try:
+            self.mail_connection.close()
+        except Exception:
+            pass
+        self.mail_connection = get_mail_connection()
+
+    def send_email(self, email, recipient_email):
+        """sends email over the shared connection,
+        if the sending fails, reopens the connection and
+        sends the email once again, raises ``EmailNotSent``
+        when the second attempt fails too"""
+        try:
+            email.send(
+                [recipient_email],
+                raise_on_failure=True,
+                connection=self.mail_connection
+            )
+        except EmailNotSent:
+            #connection may be dropped by the server
+            #during the long run
+            self.reopen_mail_connection()
+            email.send(
+                [recipient_email],
+                raise_on_failure=True,
+                connection=self.mail_connection
+            )
+
     def format_debug_msg(self, user, content):
         msg = "%s site_id=%d user=%s: %s" % (
             timezone.now().strftime('%y-%m-%d %h:%m:%s'),
@@ -449,7 +743,8 @@ class Command(BaseCommand):
         return q_list
 
     def send_email_alerts(self, user):
-        #does not change the database, only sends the email
+        #marks the feeds reported and records the email activity,
+        #must run in a transaction, rolled back if the email is not sent
         #todo: move this to template
         user.add_missing_askbot_subscriptions()
 
@@ -509,4 +804,4 @@ class Command(BaseCommand):
                 recipient_email = user.email
 
             if recipient_email:
-                email.send([recipient_email])
+                self.send_email(email, recipient_email)
@@ -378,6 +378,15 @@ ThreadList.prototype.decorate = function (element) {
     this._threads = threads;
     this._emptyMemo = element.find('.js-no-threads');
     this._senderId = element.data('senderId');
+
+    var olderThreads = element.find('.js-older-threads');
+    if (olderThreads.length) {
+        var before = olderThreads.data('before');
+        setupButtonEventHandlers(olderThreads, function () {
+            me._messageCenter.loadThreadsForSender(me._senderId, before);
+            return false;
+        });
+    }
 };
 
 
@@ -624,12 +633,15 @@ MessageCenter.prototype.setUnreadInboxCount = function (count) {
     this._unreadInboxCount.html(count);
 };
 
-MessageCenter.prototype.hitThreadList = function (url, senderId, requestMethod) {
+MessageCenter.prototype.hitThreadList = function (url, senderId, requestMethod, before) {
     if (this._loadingStatus === true) {
         return;
     }
     var me = this;
     var data = { sender_id: senderId };
+    if (before) {
+        data.before = before;
+    }
     $.ajax({
         type: requestMethod,
         dataType: 'json',
@@ -664,9 +676,9 @@ MessageCenter.prototype.restoreThread = function (threadId, senderId) {
     this.hitThreadList(url, senderId, 'POST');
 };
 
-MessageCenter.prototype.loadThreadsForSender = function (senderId) {
+MessageCenter.prototype.loadThreadsForSender = function (senderId, before) {
     var url = this._urls.getThreads;
-    this.hitThreadList(url, senderId, 'GET');
+    this.hitThreadList(url, senderId, 'GET', before);
 };
 
 MessageCenter.prototype.decorate = function (element) {
@@ -0,0 +1,51 @@
+"""
+This module measures the processing of the requests
+
+Included here is the DebugHeadersMiddleware
+"""
+import time
+from django.db import connection
+from askbot.utils import cache_stats
+
+
+class DebugHeadersMiddleware(object):
+    """
+    DebugHeadersMiddleware adds to the responses headers with
+    the number of the database queries, the processing time
+    and the cache hits and misses of the request.
+
+    With ``ASKBOT_CACHE_STATS_ENABLED`` the numbers are also
+    recorded per view, see the ``askbot_cache_stats`` command.
+    """
+    def __init__(self, get_response=None):
+        if get_response is None:
+            get_response = lambda x:x
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = [0]
+
+        def count_query(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        cache_stats.REQUEST_STATS.counters = dict()
+        start = time.time()
+        try:
+            with connection.execute_wrapper(count_query):
+                response = self.get_response(request)
+        finally:
+            counters = cache_stats.REQUEST_STATS.counters
+            cache_stats.REQUEST_STATS.counters = None
+        seconds = time.time() - start
+
+        response['X-Askbot-Queries'] = str(queries[0])
+        response['X-Askbot-Time-Ms'] = str(int(seconds * 1000))
+        response['X-Askbot-Cache-Hits'] = str(counters.get('hits', 0))
+        response['X-Askbot-Cache-Misses'] = str(counters.get('misses', 0))
+
+        resolver_match = getattr(request, 'resolver_match', None)
+        if resolver_match:
+            view_name = resolver_match.view_name or resolver_match.func.__name__
+            cache_stats.record_view(view_name, queries[0], seconds)
+        return response
@@ -0,0 +1,27 @@
+# -*- coding: utf-8 -*-
+
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('askbot', '0014_populate_askbot_roles'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SimilarThread',
+            fields=[
+                ('id', models.AutoField(verbose_name='ID', serialize=False, auto_created=True, primary_key=True)),
+                ('score', models.FloatField()),
+                ('similar_thread', models.ForeignKey(related_name='+', to='askbot.Thread', on_delete=models.CASCADE)),
+                ('thread', models.ForeignKey(related_name='similar_thread_records', to='askbot.Thread', on_delete=models.CASCADE)),
+            ],
+        ),
+        migrations.AlterUniqueTogether(
+            name='similarthread',
+            unique_together=set([('thread', 'similar_thread')]),
+        ),
+    ]
@@ -28,6 +28,7 @@ from django.db.models import Count, Q
 from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.cache import cache
+from django.core.signals import request_finished
 from django.core import exceptions as django_exceptions
 from askbot import exceptions as askbot_exceptions
 from askbot import const
@@ -41,9 +42,14 @@ from askbot.mail.messages import (WelcomeEmail,
 from askbot.models.question import QuestionView, AnonymousQuestion
 from askbot.models.question import DraftQuestion
 from askbot.models.question import FavoriteQuestion
+from askbot.models.question import SimilarThread
+from askbot.models.question import ThreadToGroup
 from askbot.models.message import Message
 from askbot.models.tag import Tag, MarkedTag, TagSynonym
 from askbot.models.tag import format_personal_group_name
+from askbot.models.tag import invalidate_wildcard_index
+from askbot.models.tag import reset_tag_caches, reset_tag_filter_profiles
+from askbot.models import counters
 from askbot.models.user import EmailFeedSetting, ActivityAuditStatus, Activity
 from askbot.models.user import GroupMembership
 from askbot.models.user import Group
@@ -54,6 +60,8 @@ from askbot.models.post import PostToGroup
 from askbot.models.post import DraftAnswer
 from askbot.models.user_profile import (
                                 add_profile_properties,
+                                get_profile,
+                                prefetch_profiles,
                                 UserProfile,
                                 LocalizedUserProfile,
                                 get_localized_profile_cache_key
@@ -74,6 +82,8 @@ from askbot.utils.transaction import defer_celery_task
 from askbot.utils.translation import get_language
 from askbot.utils.html import replace_links_with_text
 from askbot.utils import functions
+from askbot.search import sqlite as sqlite_search
+from askbot.search import title_index
 from askbot import mail
 from askbot import signals
 from jsonfield import JSONField
@@ -134,6 +144,8 @@ def get_users_by_text_query(search_query, users_query_set = None):
             from askbot.search import postgresql
             return postgresql.run_user_search(users_query_set, search_query)
         else:
+            if sqlite_search.can_search(search_query):
+                return sqlite_search.run_user_search(users_query_set, search_query)
             return users_query_set.filter(
                 models.Q(username__icontains=search_query) |
                 models.Q(localized_askbot_profiles__about__icontains=search_query)
@@ -1617,6 +1629,8 @@ def user_mark_tags(
                 marked_ts.update(reason=reason)
             cleaned_tagnames = tagnames
 
+    #marks may have been changed by the queryset update, bypassing signals
+    reset_tag_filter_profiles([self.id])
     return cleaned_tagnames, cleaned_wildcards
 
 def user_merge_duplicate_questions(self, from_q, to_q):
@@ -3126,12 +3140,7 @@ def _process_vote(user, post, timestamp=None, cancel=False, vote_type=None):
         else:
             auth.onDownVoted(vote, post, user, timestamp)
 
-    post.thread.reset_cached_data()
-
-    if post.post_type == 'question':
-        #denormalize the question post score on the thread
-        post.thread.points = post.points
-        post.thread.save()
+    post.thread.update_post_score(post)
 
     if cancel:
         return None
@@ -3383,6 +3392,11 @@ def user_update_wildcard_tag_selections(
     interesting = set(self.interesting_tags.split())
     ignored = set(self.ignored_tags.split())
     subscribed = set(self.subscribed_tags.split())
+    old_selections = {
+        'good': set(interesting),
+        'bad': set(ignored),
+        'subscribed': set(subscribed)
+    }
 
     if reason == 'good':
         target_set = interesting
@@ -3409,6 +3423,15 @@ def user_update_wildcard_tag_selections(
     self.ignored_tags = ' '.join(ignored)
     self.subscribed_tags = ' '.join(subscribed)
     self.save()
+    new_selections = {
+        'good': interesting,
+        'bad': ignored,
+        'subscribed': subscribed
+    }
+    for selection_reason, wildcards in new_selections.items():
+        if wildcards != old_selections[selection_reason]:
+            invalidate_wildcard_index(selection_reason)
+    reset_tag_filter_profiles([self.id])
     return new_tags
 
 
@@ -3697,32 +3720,47 @@ def get_reply_to_addresses(user, post):
     "comment" or "answer", the address will be for posting
     a "comment".
     """
-    #these variables will contain return values
-    primary_addr = django_settings.DEFAULT_FROM_EMAIL
-    secondary_addr = None
-    if user.can_post_by_email():
-        if user.reputation >= askbot_settings.MIN_REP_TO_POST_BY_EMAIL:
+    return get_reply_to_addresses_for_users([user], post)[0]
+
 
+def get_reply_to_addresses_for_users(users, post):
+    """Returns list of pairs of reply addresses as in
+    the :func:`get_reply_to_addresses`, one pair per user
+    in the same order, reply addresses are created with one insert
+    """
+    reply_action = 'post_comment'
+    if post.post_type == 'question':
+        reply_action = 'post_answer'
+
+    reply_args_list = list()
+    repliers = set()
+    for user in users:
+        if user.can_post_by_email() \
+            and user.reputation >= askbot_settings.MIN_REP_TO_POST_BY_EMAIL:
+            repliers.add(id(user))
             reply_args = {
                 'post': post,
                 'user': user,
-                'reply_action': 'post_comment'
+                'reply_action': reply_action
             }
-            if post.post_type in ('answer', 'comment'):
-                reply_args['reply_action'] = 'post_comment'
-            elif post.post_type == 'question':
-                reply_args['reply_action'] = 'post_answer'
-
-            primary_addr = ReplyAddress.objects.create_new(
-                                                    **reply_args
-                                                ).as_email_address()
-
+            reply_args_list.append(reply_args)
             if post.post_type == 'question':
-                reply_args['reply_action'] = 'post_comment'
-                secondary_addr = ReplyAddress.objects.create_new(
-                                                    **reply_args
-                                                ).as_email_address()
-    return primary_addr, secondary_addr
+                reply_args = dict(reply_args, reply_action='post_comment')
+                reply_args_list.append(reply_args)
+
+    reply_addresses = iter(ReplyAddress.objects.create_many(reply_args_list))
+
+    #addresses are consumed in the order of creation
+    addresses = list()
+    for user in users:
+        primary_addr = django_settings.DEFAULT_FROM_EMAIL
+        secondary_addr = None
+        if id(user) in repliers:
+            primary_addr = next(reply_addresses).as_email_address()
+            if post.post_type == 'question':
+                secondary_addr = next(reply_addresses).as_email_address()
+        addresses.append((primary_addr, secondary_addr))
+    return addresses
 
 
 def notify_author_of_published_revision(revision=None, was_approved=False, **kwargs):
@@ -3863,30 +3901,84 @@ def record_answer_accepted(instance, created, **kwargs):
                                 )
         activity.add_recipients(recipients)
 
+def get_visit_flush_cache_key(user):
+    return 'askbot-visit-flush-{}'.format(user.pk)
+
+
+def get_visit_pending_cache_key(user_id):
+    return 'askbot-visit-pending-{}'.format(user_id)
+
+
+def write_pending_user_visit(user_id):
+    """writes to the database the last visit of the user,
+    buffered by the ``record_user_visit`` within the interval"""
+    key = get_visit_pending_cache_key(user_id)
+    update_data = cache.get(key)
+    if update_data is None:
+        return
+    cache.delete(key)
+    UserProfile.objects.filter(
+                    pk=user_id, last_seen__lt=update_data['last_seen']
+                ).update(**update_data)
+
+
 def record_user_visit(user, timestamp, **kwargs):
     """
     when user visits any pages, we update the last_seen and
     consecutive_days_visit_count
+
+    With ``ASKBOT_VISIT_RECORDING_INTERVAL`` > 0 the visit data
+    is kept in the cached profile and written to the database
+    at most once per the interval (in seconds) per user and
+    always on the day rollover. Visits skipped within the interval
+    are written by the task scheduled at the end of the interval.
+    Without the celery workers every visit is written right away.
     """
-    prev_last_seen = user.last_seen or timezone.now()
-    user.last_seen = timestamp
-    consecutive_days = user.consecutive_days_visit_count
-    if (user.last_seen.date() - prev_last_seen.date()).days == 1:
-        user.consecutive_days_visit_count += 1
-        consecutive_days = user.consecutive_days_visit_count
+    profile = get_profile(user)
+    prev_last_seen = profile.last_seen or timezone.now()
+    profile.last_seen = timestamp
+    days_passed = (timestamp.date() - prev_last_seen.date()).days
+    if days_passed == 1:
+        profile.consecutive_days_visit_count += 1
+
+    interval = django_settings.ASKBOT_VISIT_RECORDING_INTERVAL
+    flush_key = get_visit_flush_cache_key(user)
+    if interval <= 0 or django_settings.CELERY_ALWAYS_EAGER:
+        flush = True
+    elif days_passed != 0:
+        flush = True
+        cache.set(flush_key, True, interval)
+    else:
+        #cache.add is atomic and fails when the key is still there
+        flush = cache.add(flush_key, True, interval)
+
+    update_data = {
+        'last_seen': timestamp,
+        'consecutive_days_visit_count': profile.consecutive_days_visit_count
+    }
+    if flush:
+        #somehow it saves on the query as compared to user.save()
+        UserProfile.objects.filter(pk=user.pk).update(**update_data)
+        if interval > 0:
+            cache.delete(get_visit_pending_cache_key(user.pk))
+    else:
+        cache.set(get_visit_pending_cache_key(user.pk), update_data, 2 * interval)
+        #the write is scheduled once, after the first skipped visit
+        if cache.add('askbot-visit-scheduled-{}'.format(user.pk), True, interval):
+            from askbot.tasks import write_pending_user_visit_celery_task
+            defer_celery_task(
+                write_pending_user_visit_celery_task,
+                args=(user.pk,),
+                countdown=interval
+            )
+    profile.update_cache()
+
+    if days_passed == 1:
         award_badges_signal.send(None,
                                  event='site_visit',
                                  actor=user,
                                  context_object=user,
                                  timestamp=timestamp)
-    #somehow it saves on the query as compared to user.save()
-    update_data = {
-        'last_seen': timestamp,
-        'consecutive_days_visit_count': consecutive_days
-    }
-    UserProfile.objects.filter(pk=user.pk).update(**update_data)
-    profile = UserProfile.objects.get(pk=user.pk)
-    profile.update_cache()
 
 
 def record_question_visit(request, question, **kwargs):
@@ -4046,6 +4138,126 @@ def record_update_tags(thread, tags, user, timestamp, **kwargs):
                 )
     activity.save()
 
+def reset_tag_caches_on_tag_save(instance, created, **kwargs):
+    """resets cached tag data when a tag is added or renamed"""
+    old_name = getattr(instance, '_loaded_name', None)
+    if created or old_name != instance.name:
+        reset_tag_caches(instance, old_name=old_name)
+    instance._loaded_name = instance.name
+
+def reset_tag_caches_on_tag_delete(instance, **kwargs):
+    reset_tag_caches(instance)
+
+def reset_tag_filter_profile_on_mark_change(instance, **kwargs):
+    reset_tag_filter_profiles([instance.user_id])
+
+def update_post_counters(post, delta):
+    """applies removal (delta=-1) or restoration (delta=1)
+    of the post to the counters"""
+    if post.post_type not in counters.POST_TYPES:
+        return
+    counters.update_counter(delta, 'posts', post.post_type)
+    if post.post_type == 'question':
+        counters.update_question_counters(delta, post.language_code, scopes=('all',))
+        counters.reset_question_counters(
+                            post.language_code,
+                            scopes=('unanswered',),
+                            tag_names=post.thread.get_tag_names()
+                        )
+    elif post.post_type == 'answer':
+        post.thread.reset_unanswered_counters()
+
+def update_counters_on_post_save(instance, created, **kwargs):
+    if created and not instance.deleted:
+        if instance.post_type == 'question':
+            #new thread is unanswered, tag counters are reset
+            #when the tags are assigned
+            counters.update_counter(1, 'posts', 'question')
+            counters.update_question_counters(1, instance.language_code)
+        else:
+            update_post_counters(instance, 1)
+
+def update_counters_on_post_delete(instance, **kwargs):
+    if not instance.deleted:
+        update_post_counters(instance, -1)
+
+def update_counters_on_post_removed(instance, **kwargs):
+    update_post_counters(instance, -1)
+
+def update_counters_on_post_restored(instance, **kwargs):
+    update_post_counters(instance, 1)
+
+def update_counters_on_tags_updated(thread, tags, **kwargs):
+    counters.reset_question_counters(
+                        thread.language_code,
+                        scopes=(),
+                        tag_names=[tag.name for tag in tags]
+                    )
+
+def update_similar_threads_on_tags_updated(thread, **kwargs):
+    from askbot.tasks import update_similar_threads_celery_task
+    defer_celery_task(update_similar_threads_celery_task, args=(thread.id,))
+
+def create_search_index_tables(app_config, **kwargs):
+    if app_config.label == 'askbot' and sqlite_search.is_enabled():
+        sqlite_search.create_index_tables()
+
+def update_search_index_on_post_save(instance, **kwargs):
+    if sqlite_search.is_ready() and instance.thread_id \
+        and instance.post_type in ('question', 'answer', 'comment'):
+        sqlite_search.update_thread_index(instance.thread)
+        sqlite_search.update_post_index(instance)
+
+def update_search_index_on_post_delete(instance, **kwargs):
+    if sqlite_search.is_ready() and instance.thread_id:
+        sqlite_search.remove_post_from_index(instance.id)
+        #thread may be deleted together with the post
+        thread = Thread.objects.filter(id=instance.thread_id).first()
+        if thread:
+            sqlite_search.update_thread_index(thread)
+
+def update_search_index_on_thread_save(instance, **kwargs):
+    if sqlite_search.is_ready():
+        sqlite_search.update_thread_index(instance)
+
+def update_search_index_on_thread_delete(instance, **kwargs):
+    if sqlite_search.is_ready():
+        sqlite_search.remove_thread_from_index(instance.id)
+
+def update_title_index_on_thread_change(instance, **kwargs):
+    title_index.record_change(instance.id)
+
+def update_title_index_on_question_save(instance, created, **kwargs):
+    #thread is saved before the question, whose url is in the index
+    if created and instance.post_type == 'question':
+        title_index.record_change(instance.thread_id)
+
+def update_title_index_on_thread_groups_change(instance, **kwargs):
+    title_index.record_change(instance.thread_id)
+
+def update_search_index_on_user_save(instance, **kwargs):
+    if sqlite_search.is_ready():
+        sqlite_search.update_user_index(instance)
+
+def update_search_index_on_user_delete(instance, **kwargs):
+    if sqlite_search.is_ready():
+        sqlite_search.remove_user_from_index(instance.id)
+
+def update_search_index_on_localized_profile_save(instance, **kwargs):
+    if sqlite_search.is_ready():
+        sqlite_search.update_user_index(instance.auth_user)
+
+def update_counters_on_user_save(instance, created, **kwargs):
+    if created and instance.is_active:
+        counters.update_counter(1, 'users')
+
+def update_counters_on_user_delete(instance, **kwargs):
+    if instance.is_active:
+        counters.update_counter(-1, 'users')
+
+def reset_group_counter(instance, **kwargs):
+    counters.reset_counter('groups')
+
 def record_favorite_question(instance, created, **kwargs):
     """
     when user add the question in him favorite questions list.
@@ -4408,6 +4620,74 @@ django_signals.post_save.connect(
     sender=GroupMembership,
     dispatch_uid='moderate_group_joining_on_gm_save'
 )
+django_signals.post_save.connect(
+    reset_tag_caches_on_tag_save,
+    sender=Tag,
+    dispatch_uid='reset_tag_caches_on_tag_save'
+)
+django_signals.post_save.connect(
+    reset_tag_filter_profile_on_mark_change,
+    sender=MarkedTag,
+    dispatch_uid='reset_tag_filter_profile_on_mark_save'
+)
+django_signals.post_save.connect(
+    update_counters_on_post_save,
+    sender=Post,
+    dispatch_uid='update_counters_on_post_save'
+)
+django_signals.post_save.connect(
+    update_counters_on_user_save,
+    sender=User,
+    dispatch_uid='update_counters_on_user_save'
+)
+django_signals.post_save.connect(
+    reset_group_counter,
+    sender=Group,
+    dispatch_uid='reset_group_counter_on_group_save'
+)
+django_signals.post_save.connect(
+    update_search_index_on_post_save,
+    sender=Post,
+    dispatch_uid='update_search_index_on_post_save'
+)
+django_signals.post_save.connect(
+    update_search_index_on_thread_save,
+    sender=Thread,
+    dispatch_uid='update_search_index_on_thread_save'
+)
+django_signals.post_save.connect(
+    update_title_index_on_thread_change,
+    sender=Thread,
+    dispatch_uid='update_title_index_on_thread_save'
+)
+django_signals.post_save.connect(
+    update_title_index_on_question_save,
+    sender=Post,
+    dispatch_uid='update_title_index_on_question_save'
+)
+django_signals.post_save.connect(
+    update_title_index_on_thread_groups_change,
+    sender=ThreadToGroup,
+    dispatch_uid='update_title_index_on_thread_to_group_save'
+)
+django_signals.post_save.connect(
+    update_search_index_on_user_save,
+    sender=User,
+    dispatch_uid='update_search_index_on_user_save'
+)
+django_signals.post_save.connect(
+    update_search_index_on_localized_profile_save,
+    sender=LocalizedUserProfile,
+    dispatch_uid='update_search_index_on_localized_profile_save'
+)
+django_signals.post_migrate.connect(
+    create_search_index_tables,
+    dispatch_uid='create_search_index_tables'
+)
+request_finished.connect(
+    title_index.build_pending_indexes,
+    dispatch_uid='build_pending_title_indexes'
+)
 django_signals.m2m_changed.connect(
     group_membership_changed,
     sender=User.groups.through,
@@ -4420,6 +4700,58 @@ django_signals.post_delete.connect(
     dispatch_uid='record_cancel_vote_on_vote_delete'
 )
 
+django_signals.post_delete.connect(
+    reset_tag_caches_on_tag_delete,
+    sender=Tag,
+    dispatch_uid='reset_tag_caches_on_tag_delete'
+)
+django_signals.post_delete.connect(
+    reset_tag_filter_profile_on_mark_change,
+    sender=MarkedTag,
+    dispatch_uid='reset_tag_filter_profile_on_mark_delete'
+)
+
+django_signals.post_delete.connect(
+    update_counters_on_post_delete,
+    sender=Post,
+    dispatch_uid='update_counters_on_post_delete'
+)
+django_signals.post_delete.connect(
+    update_counters_on_user_delete,
+    sender=User,
+    dispatch_uid='update_counters_on_user_delete'
+)
+django_signals.post_delete.connect(
+    reset_group_counter,
+    sender=Group,
+    dispatch_uid='reset_group_counter_on_group_delete'
+)
+django_signals.post_delete.connect(
+    update_search_index_on_post_delete,
+    sender=Post,
+    dispatch_uid='update_search_index_on_post_delete'
+)
+django_signals.post_delete.connect(
+    update_search_index_on_thread_delete,
+    sender=Thread,
+    dispatch_uid='update_search_index_on_thread_delete'
+)
+django_signals.post_delete.connect(
+    update_title_index_on_thread_change,
+    sender=Thread,
+    dispatch_uid='update_title_index_on_thread_delete'
+)
+django_signals.post_delete.connect(
+    update_title_index_on_thread_groups_change,
+    sender=ThreadToGroup,
+    dispatch_uid='update_title_index_on_thread_to_group_delete'
+)
+django_signals.post_delete.connect(
+    update_search_index_on_user_delete,
+    sender=User,
+    dispatch_uid='update_search_index_on_user_delete'
+)
+
 django_signals.pre_delete.connect(
     delete_post_activities,
     sender=Post,
@@ -4432,6 +4764,14 @@ signals.after_post_removed.connect(
     sender=Post,
     dispatch_uid='record_delete_question_on_delete_post'
 )
+signals.after_post_removed.connect(
+    update_counters_on_post_removed,
+    dispatch_uid='update_counters_on_post_removed'
+)
+signals.after_post_restored.connect(
+    update_counters_on_post_restored,
+    dispatch_uid='update_counters_on_post_restored'
+)
 signals.flag_offensive.connect(
     record_flag_offensive,
     sender=Post,
@@ -4446,6 +4786,14 @@ signals.tags_updated.connect(
     record_update_tags,
     dispatch_uid='record_tag_update'
 )
+signals.tags_updated.connect(
+    update_counters_on_tags_updated,
+    dispatch_uid='update_counters_on_tags_updated'
+)
+signals.tags_updated.connect(
+    update_similar_threads_on_tags_updated,
+    dispatch_uid='update_similar_threads_on_tags_updated'
+)
 signals.user_registered.connect(
     greet_new_user,
     dispatch_uid='greet_user_upon_registration'
@@ -4534,6 +4882,7 @@ __all__ = [
         'FavoriteQuestion',
         'AnonymousQuestion',
         'DraftQuestion',
+        'SimilarThread',
 
         'AnonymousAnswer',
         'DraftAnswer',
@@ -4560,6 +4909,7 @@ __all__ = [
 
         'User',
         'UserProfile',
+        'prefetch_profiles',
 
         'ReplyAddress',
 
@@ -0,0 +1,187 @@
+"""Cached counters of posts, users and groups and of the
+questions shown in the main listing (per language, scope and tag).
+
+Counters are calculated on the first read and then
+updated by the signal handlers in :mod:`askbot.models`:
+creation, removal and restoration of posts add to or subtract
+from the cached values, other changes, whose effect is not known
+without a query (e.g. new answers for the "unanswered" scope), reset
+the affected counters, which are recounted on the next read.
+
+Counters expire in ``ASKBOT_COUNTERS_TIMEOUT`` seconds and
+may be reconciled at any time with :func:`reconcile_counters`
+(management command ``askbot_reconcile_counters``).
+"""
+import hashlib
+
+import askbot
+from django.conf import settings as django_settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.utils.translation import get_language
+from askbot import const
+from askbot.conf import settings as askbot_settings
+
+GENERATION_CACHE_KEY = 'askbot-counters-generation'
+POST_TYPES = ('question', 'answer', 'comment')
+QUESTION_SCOPES = ('all', 'unanswered')
+
+def count_posts(post_type):
+    from askbot.models.post import Post
+    return Post.objects.filter(deleted=False, post_type=post_type).count()
+
+def count_users():
+    return User.objects.filter(is_active=True).count()
+
+def count_groups():
+    from askbot.models.user import Group
+    return Group.objects.exclude_personal().count()
+
+def count_questions(language_code, scope, tag_name=None):
+    """counts threads as listed by ``ThreadManager.run_advanced_search``
+    for the anonymous user, ``language_code`` None means all languages"""
+    from askbot.models.question import Thread
+    threads = Thread.objects.filter(
+                            posts__post_type='question',
+                            posts__deleted=False
+                        )
+    if language_code:
+        threads = threads.filter(language_code=language_code)
+    if scope == 'unanswered':
+        threads = threads.filter(closed=False)
+        meaning = askbot_settings.UNANSWERED_QUESTION_MEANING
+        if meaning == 'NO_ANSWERS':
+            threads = threads.filter(answer_count=0)
+        elif meaning == 'NO_ACCEPTED_ANSWERS':
+            threads = threads.filter(accepted_answer__isnull=True)
+        elif meaning == 'NO_UPVOTED_ANSWERS':
+            from askbot.models.post import Post
+            upvoted = Post.objects.filter(
+                                post_type='answer', deleted=False, points__gt=0
+                            ).values('thread_id')
+            threads = threads.exclude(id__in=upvoted)
+        #other meanings count all open threads
+    if tag_name:
+        threads = threads.filter(tags__name=tag_name)
+    return threads.distinct().count()
+
+COUNTERS = {
+    'posts': count_posts,
+    'users': count_users,
+    'groups': count_groups,
+    'questions': count_questions,
+}
+
+def get_generation():
+    generation = cache.get(GENERATION_CACHE_KEY)
+    if generation is None:
+        generation = 0
+        cache.add(GENERATION_CACHE_KEY, generation, None)
+    return generation
+
+def get_counter_key(name, *args):
+    bits = [name] + [str(arg) for arg in args]
+    if name == 'questions' and args[1] == 'unanswered':
+        #count depends on the meaning of "unanswered"
+        bits.append(askbot_settings.UNANSWERED_QUESTION_MEANING)
+    bits_hash = hashlib.md5(':'.join(bits).encode('utf-8')).hexdigest()
+    return 'askbot-counter-{}-{}'.format(get_generation(), bits_hash)
+
+def get_counter(name, *args):
+    """returns value of the counter, counts on cache miss
+    ``args`` are passed to the counting function"""
+    key = get_counter_key(name, *args)
+    value = cache.get(key)
+    if value is None:
+        value = COUNTERS[name](*args)
+        cache.set(key, value, django_settings.ASKBOT_COUNTERS_TIMEOUT)
+    return value
+
+def update_counter(delta, name, *args):
+    """adds delta to the cached counter,
+    counters that are not cached are left alone"""
+    try:
+        cache.incr(get_counter_key(name, *args), delta)
+    except ValueError:
+        pass
+
+def reset_counter(name, *args):
+    cache.delete(get_counter_key(name, *args))
+
+def update_question_counters(delta, language_code, scopes=QUESTION_SCOPES):
+    for counted_language in (None, language_code):
+        for scope in scopes:
+            update_counter(delta, 'questions', counted_language, scope)
+
+def reset_question_counters(language_code, scopes=QUESTION_SCOPES, tag_names=None):
+    """resets question counters of the scopes and of the
+    given tag names in all scopes"""
+    keys = list()
+    for counted_language in (None, language_code):
+        for scope in scopes:
+            keys.append(get_counter_key('questions', counted_language, scope))
+        for tag_name in tag_names or ():
+            for scope in QUESTION_SCOPES:
+                keys.append(
+                    get_counter_key('questions', counted_language, scope, tag_name)
+                )
+    cache.delete_many(keys)
+
+def reconcile_counters():
+    """drops all counters and recounts the ones
+    without the tag filter"""
+    if cache.get(GENERATION_CACHE_KEY) is None:
+        cache.set(GENERATION_CACHE_KEY, 1, None)
+    else:
+        cache.incr(GENERATION_CACHE_KEY)
+
+    for post_type in POST_TYPES:
+        get_counter('posts', post_type)
+    get_counter('users')
+    get_counter('groups')
+
+    language_codes = [None]
+    if askbot.is_multilingual():
+        language_codes.extend(dict(django_settings.LANGUAGES).keys())
+    for language_code in language_codes:
+        for scope in QUESTION_SCOPES:
+            get_counter('questions', language_code, scope)
+
+def get_listing_count(search_state, user):
+    """returns count of questions in the main listing
+    from the counters or ``None``, if the listing
+    is filtered by more than the scope, language and one tag
+    """
+    if search_state.query or search_state.author:
+        return None
+    if search_state.scope not in QUESTION_SCOPES:
+        return None
+    if len(search_state.tags) > 1:
+        return None
+    if user.is_authenticated \
+        and user.display_tag_filter_strategy != const.INCLUDE_ALL:
+        return None
+    if askbot_settings.GROUPS_ENABLED \
+        or askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
+        return None
+
+    lang_mode = askbot.get_lang_mode()
+    if lang_mode == 'url-lang':
+        language_code = get_language()
+    elif lang_mode == 'user-lang':
+        return None
+    else:
+        language_code = None
+
+    tag_name = None
+    if search_state.tags:
+        tag_name = search_state.tags[0]
+        if askbot_settings.TAG_SEARCH_INPUT_ENABLED:
+            #listing matches tag names case-insensitively
+            from askbot.models.tag import resolve_tag_names
+            resolved = resolve_tag_names([tag_name], get_language())
+            if tag_name not in resolved:
+                return None
+            tag_name = resolved[tag_name][1]
+
+    return get_counter('questions', language_code, search_state.scope, tag_name)
@@ -7,6 +7,7 @@ from django.utils import html
 from django.conf import settings as django_settings
 from django.contrib.auth.models import User
 from django.db import models
+from django.db.models.functions import Greatest
 from django.utils import html as html_utils
 from django.utils import timezone
 from django.utils.text import Truncator
@@ -27,7 +28,7 @@ from askbot.utils.loading import load_plugin, load_function
 from askbot.utils.slug import slugify
 from askbot import const
 from askbot.models.tag import Tag, MarkedTag
-from askbot.models.tag import tags_match_some_wildcard
+from askbot.models.tag import get_wildcard_subscriber_ids
 from askbot.models.fields import LanguageCodeField
 from askbot.conf import settings as askbot_settings
 from askbot import exceptions
@@ -42,6 +43,7 @@ from askbot.models.base import (AnonymousContent, BaseQuerySetManager,
 # TODO: maybe merge askbot.utils.markup and forum.utils.html
 from askbot.utils.diff import textDiff as htmldiff
 from askbot.search import mysql
+from askbot.search import sqlite
 
 
 def default_html_moderator(post):
@@ -112,6 +114,8 @@ class PostQuerySet(models.query.QuerySet):
         """returns a query set of questions,
         matching the full text query
         """
+        if sqlite.can_search(search_query):
+            return sqlite.run_post_search(self, search_query)
         return self.filter(
             models.Q(thread__title__icontains=search_query) |
             models.Q(text__icontains=search_query) |
@@ -338,6 +342,42 @@ class PostManager(BaseQuerySetManager):
         #
         #            return comments
 
+    def precache_revisions(self, for_posts):
+        """
+        Fetches the earliest and the latest revisions of the given posts
+        with two queries and stores them in the revision caches of the posts,
+        so that ``get_earliest_revision`` and ``get_latest_revision``
+        do not hit the database.
+        """
+        post_map = dict([(post.id, post) for post in for_posts])
+        if not post_map:
+            return
+
+        revisions = PostRevision.objects.filter(post_id__in=list(post_map.keys()))
+        revision_ranges = revisions.order_by().values('post_id').annotate(
+                                        first_revision=models.Min('revision'),
+                                        last_revision=models.Max('revision')
+                                    )
+        first_revs = set()
+        last_revs = set()
+        for item in revision_ranges:
+            first_revs.add((item['post_id'], item['first_revision']))
+            last_revs.add((item['post_id'], item['last_revision']))
+
+        # filter by revision numbers selects a superset
+        # of the needed revisions, exact matches are picked below
+        numbers = set([number for _, number in first_revs | last_revs])
+        revisions = revisions.filter(revision__in=numbers).select_related('author')
+        for rev in revisions:
+            key = (rev.post_id, rev.revision)
+            post = post_map[rev.post_id]
+            if key in first_revs:
+                rev.post = post
+                setattr(post, '_first_rev_cache', rev)
+            if key in last_revs:
+                rev.post = post
+                post.cache_latest_revision(rev)
+
 
 class MockPost(object):
     """Used for special purposes, e.g. to fill
@@ -471,6 +511,19 @@ class Post(models.Model):
         if number:
             self.points = int(number)
 
+    def update_vote_counts(self, points, up_votes=0, down_votes=0):
+        """adds the deltas to the score and to the vote counts
+        with a narrow ``UPDATE``, so that concurrent votes are not lost
+        and the rest of the row is not rewritten,
+        then reloads the updated values into the instance"""
+        fields = {'points': models.F('points') + points}
+        if up_votes:
+            fields['vote_up_count'] = Greatest(models.F('vote_up_count') + up_votes, 0)
+        if down_votes:
+            fields['vote_down_count'] = Greatest(models.F('vote_down_count') + down_votes, 0)
+        Post.objects.filter(id=self.id).update(**fields)
+        self.refresh_from_db(fields=('points', 'vote_up_count', 'vote_down_count'))
+
     def as_tweet(self):
         """a naive tweet representation of post
         todo: add mentions to relevant people
@@ -729,6 +782,8 @@ class Post(models.Model):
             for group in groups:
                 for comment in comments:
                     PostToGroup.objects.get_or_create(post=comment, group=group)
+        if self.thread_id:
+            self.thread.invalidate_group_caches()
 
     def remove_from_groups(self, groups):
         PostToGroup.objects.filter(post=self, group__in=groups).delete()
@@ -738,6 +793,8 @@ class Post(models.Model):
                         post__id__in=comment_ids,
                         group__in=groups
                     ).delete()
+        if self.thread_id:
+            self.thread.invalidate_group_caches()
 
     def issue_update_notifications(self, updated_by=None, notify_sets=None,
                                    activity_type=None, suppress_email=False,
@@ -952,7 +1009,11 @@ class Post(models.Model):
         if askbot_settings.CONTENT_MODERATION_MODE == 'premoderation':
             if self.approved:
                 return True
-            if self.revisions.filter(revision=0).count() == 1:
+            if hasattr(self, '_first_rev_cache'):
+                # pending revision always has number 0
+                if self._first_rev_cache.revision == 0:
+                    return False
+            elif self.revisions.filter(revision=0).count() == 1:
                 return False
         return True
 
@@ -1216,40 +1277,22 @@ class Post(models.Model):
         )
 
         # part 2 - find users who follow or not ignore tags via wildcard selections
-        # inside there is a potentially time consuming loop
+        # candidates are looked up in the precomputed wildcard index
         if askbot_settings.USE_WILDCARD_TAGS:
-            # TODO: fix this
-            # this branch will not scale well
-            # because we have to loop through the list of users
-            # in python
-            if tag_mark_reason == 'good':
-                empty_wildcard_filter = {'askbot_profile__interesting_tags__exact': ''}
-                wildcard_tags_attribute = 'interesting_tags'
-                update_subscribers = lambda the_set, item: the_set.add(item)
-            elif tag_mark_reason == 'bad':
-                empty_wildcard_filter = {'askbot_profile__ignored_tags__exact': ''}
-                wildcard_tags_attribute = 'ignored_tags'
-                update_subscribers = lambda the_set, item: the_set.discard(item)
-            elif tag_mark_reason == 'subscribed':
-                empty_wildcard_filter = {'askbot_profile__subscribed_tags__exact': ''}
-                wildcard_tags_attribute = 'subscribed_tags'
-                update_subscribers = lambda the_set, item: the_set.add(item)
-
-            potential_wildcard_subscribers = User.objects.filter(
-                notification_subscriptions__in=subscription_records
-            ).filter(
-                askbot_profile__email_tag_filter_strategy=email_tag_filter_strategy
-            ).exclude(
-                **empty_wildcard_filter  # need this to limit size of the loop
-            )
-            for potential_subscriber in potential_wildcard_subscribers:
-                wildcard_tags = getattr(
-                    potential_subscriber,
-                    wildcard_tags_attribute
-                ).split(' ')
-
-                if tags_match_some_wildcard(tag_names, wildcard_tags):
-                    update_subscribers(subscribers, potential_subscriber)
+            wildcard_user_ids = get_wildcard_subscriber_ids(tag_names, tag_mark_reason)
+            if tag_mark_reason == 'bad':
+                # subscribers were already filtered by the strategy
+                # and subscription records in part 1
+                subscribers = set([user for user in subscribers
+                                   if user.id not in wildcard_user_ids])
+            elif wildcard_user_ids:
+                wildcard_subscribers = User.objects.filter(
+                    id__in=wildcard_user_ids,
+                    notification_subscriptions__in=subscription_records
+                ).filter(
+                    askbot_profile__email_tag_filter_strategy=email_tag_filter_strategy
+                )
+                subscribers.update(wildcard_subscribers)
 
         return subscribers
 
@@ -1,11 +1,16 @@
 import datetime
+import functools
+import hashlib
 import logging
+import math
 import operator
+import uuid
 import regex as re
 
 from copy import copy
 from django.conf import settings as django_settings
 from django.db import models
+from django.db import transaction
 from django.db.models import F, Q
 from django.contrib.auth.models import User
 from django.core import cache  # import cache, not from cache import cache, to be able to monkey-patch cache.cache in test cases
@@ -22,18 +27,25 @@ from askbot import mail
 from askbot.mail import messages
 from askbot.models.tag import Tag, TagSynonym
 from askbot.models.tag import get_tags_by_names
+from askbot.models.tag import get_tag_filter_profile, resolve_tag_names
 from askbot.models.tag import filter_accepted_tags, filter_suggested_tags
 from askbot.models.tag import separate_unused_tags
+from askbot.models import counters
 from askbot.models.base import BaseQuerySetManager
 from askbot.models.base import DraftContent, AnonymousContent
 from askbot.models.user import Group, PERSONAL_GROUP_NAME_PREFIX
+from askbot.models.user_profile import detach_profiles
 from askbot.models.fields import LanguageCodeField
 from askbot import signals
 from askbot import const
+from askbot.utils import cache_stats
+from askbot.utils.cache import get_or_compute, memoize, set_with_stale
 from askbot.utils.lists import LazyList
 from askbot.utils.loading import load_plugin
 from askbot.search import mysql
+from askbot.search import sqlite
 from askbot.utils.slug import slugify
+from askbot.utils.transaction import defer_celery_task
 from askbot.utils import translation as translation_utils
 from askbot.search.state_manager import DummySearchState
 
@@ -59,6 +71,27 @@ def clean_tagnames(tagnames):
             tagnames.pop()
 
 
+#placeholders of the tag urls in the cached question summaries
+TAG_PLACEHOLDER_RE = re.compile(r'<<<(%s)>>>' % const.TAG_REGEX_BARE, re.UNICODE)
+
+
+#number of similar threads stored per thread
+SIMILAR_THREADS_COUNT = 10
+#weight of a title word shared by two threads, relative
+#to the weight of a shared tag, which is the tag's IDF
+SIMILAR_TITLE_TERM_WEIGHT = 0.5
+#number of the thread tag records compared on the fly
+#for the threads missing in the similar threads index
+SIMILAR_THREADS_FALLBACK_ROWS = 100
+TITLE_TERM_RE = re.compile(r'\w{4,}', re.UNICODE)
+
+
+def get_title_terms(title):
+    """returns set of normalized words of the title,
+    that are used to compare the thread titles"""
+    return set(TITLE_TERM_RE.findall(title.lower()))
+
+
 def default_title_renderer(thread):
     """renders thread title,
     can be overridden by setting
@@ -78,6 +111,27 @@ def default_title_renderer(thread):
         return thread.title
 
 
+@memoize(timeout=const.LONG_TIME)
+def get_global_group_id(group_name):
+    """returns id of the global group,
+    the name of the group is a part of the cache key"""
+    return Group.objects.get_global_group().id
+
+
+def get_visible_group_ids(user=None):
+    """returns set of ids of the groups whose posts
+    are visible to the user, the same groups as used by
+    ``PostQuerySet.get_for_user()``,
+    ids of user's groups are memoized on the user object
+    """
+    if user is None or user.is_anonymous:
+        return set([get_global_group_id(askbot_settings.GLOBAL_GROUP_NAME)])
+
+    if not hasattr(user, '_visible_group_ids'):
+        user._visible_group_ids = set(user.get_groups().values_list('id', flat=True))
+    return set(user._visible_group_ids)
+
+
 class ThreadQuerySet(models.query.QuerySet):
 
     def get_visible(self, user):
@@ -101,6 +155,7 @@ class ThreadQuerySet(models.query.QuerySet):
         else:
             db_engine_name = askbot.get_database_engine_name()
             filter_parameters = {'deleted': False}
+            query_set = self
             if 'postgresql_psycopg2' in db_engine_name:
                 from askbot.search import postgresql
                 return postgresql.run_title_search(
@@ -110,13 +165,17 @@ class ThreadQuerySet(models.query.QuerySet):
                                     ).order_by('-relevance')
             elif 'mysql' in db_engine_name and mysql.supports_full_text_search():
                 filter_parameters['title__search'] = search_query
+            elif sqlite.can_search(search_query):
+                query_set = sqlite.run_title_search(
+                                        self, search_query
+                                    ).order_by('-relevance')
             else:
                 filter_parameters['title__icontains'] = search_query
 
             if askbot.is_multilingual():
                 filter_parameters['language_code'] = get_language()
 
-            return self.filter(**filter_parameters)
+            return query_set.filter(**filter_parameters)
 
 
 class ThreadManager(BaseQuerySetManager):
@@ -261,6 +320,8 @@ class ThreadManager(BaseQuerySetManager):
                 from askbot.search import postgresql
                 return postgresql.run_thread_search(qs, search_query)
             else:
+                if sqlite.can_search(search_query):
+                    return sqlite.run_thread_search(qs, search_query)
                 return qs.filter(
                     models.Q(title__icontains=search_query) |
                     models.Q(tagnames__icontains=search_query) |
@@ -338,19 +399,10 @@ class ThreadManager(BaseQuerySetManager):
             if askbot_settings.TAG_SEARCH_INPUT_ENABLED:
                 # TODO: this may be gone or disabled per option
                 # "tag_search_box_enabled"
-                existing_tags = set()
-                non_existing_tags = set()
-                # we're using a one-by-one tag retreival, b/c
-                # we want to take advantage of case-insensitive search indexes
-                # in postgresql, plus it is most likely that there will be
-                # only one or two search tags anyway
-                for tag in tags:
-                    try:
-                        tag_record = Tag.objects.get(
-                            name__iexact=tag, language_code=get_language())
-                        existing_tags.add(tag_record.name)
-                    except Tag.DoesNotExist:
-                        non_existing_tags.add(tag)
+                # case-insensitive name lookups are cached per tag name
+                resolved_tags = resolve_tag_names(tags, get_language())
+                existing_tags = set([name for tag_id, name in resolved_tags.values()])
+                non_existing_tags = set(tags) - set(resolved_tags.keys())
 
                 meta_data['non_existing_tags'] = list(non_existing_tags)
                 tags = existing_tags
@@ -414,32 +466,23 @@ class ThreadManager(BaseQuerySetManager):
         if request_user and request_user.is_authenticated:
             # mark questions tagged with interesting tags
             # a kind of fancy annotation, would be nice to avoid it
-            lang = get_language()
-            interesting_tags = Tag.objects.filter(
-                user_selections__user=request_user,
-                user_selections__reason='good',
-                language_code=lang)
-            ignored_tags = Tag.objects.filter(
-                user_selections__user=request_user,
-                user_selections__reason='bad',
-                language_code=lang)
-            subscribed_tags = Tag.objects.none()
+            # tag marks and wildcard expansions are cached per user
+            tag_profile = get_tag_filter_profile(request_user, get_language())
+            interesting_tags = tag_profile['good']['ids']
+            ignored_tags = tag_profile['bad']['ids']
+            subscribed_tags = list()
             if askbot_settings.SUBSCRIBED_TAG_SELECTOR_ENABLED:
-                subscribed_tags = Tag.objects.filter(
-                    user_selections__user=request_user,
-                    user_selections__reason='subscribed',
-                    language_code=lang)
-                meta_data['subscribed_tag_names'] = [tag.name for tag in subscribed_tags]
+                subscribed_tags = tag_profile['subscribed']['ids']
+                meta_data['subscribed_tag_names'] = list(tag_profile['subscribed']['names'])
 
-            meta_data['interesting_tag_names'] = [tag.name for tag in interesting_tags]
-            meta_data['ignored_tag_names'] = [tag.name for tag in ignored_tags]
+            meta_data['interesting_tag_names'] = list(tag_profile['good']['names'])
+            meta_data['ignored_tag_names'] = list(tag_profile['bad']['names'])
 
             if request_user.display_tag_filter_strategy == const.INCLUDE_INTERESTING and (interesting_tags or request_user.has_interesting_wildcard_tags()):
                 # filter by interesting tags only
                 interesting_tag_filter = models.Q(tags__in=interesting_tags)
                 if request_user.has_interesting_wildcard_tags():
-                    interesting_wildcards = request_user.interesting_tags.split()
-                    extra_interesting_tags = Tag.objects.get_by_wildcards(interesting_wildcards)
+                    extra_interesting_tags = tag_profile['good']['wildcard_ids']
                     interesting_tag_filter |= models.Q(tags__in=extra_interesting_tags)
                 qs = qs.filter(interesting_tag_filter)
 
@@ -448,8 +491,7 @@ class ThreadManager(BaseQuerySetManager):
                 # exclude ignored tags if the user wants to
                 qs = qs.exclude(tags__in=ignored_tags)
                 if request_user.has_ignored_wildcard_tags():
-                    ignored_wildcards = request_user.ignored_tags.split()
-                    extra_ignored_tags = Tag.objects.get_by_wildcards(ignored_wildcards)
+                    extra_ignored_tags = tag_profile['bad']['wildcard_ids']
                     qs = qs.exclude(tags__in=extra_ignored_tags)
 
             if request_user.display_tag_filter_strategy == const.INCLUDE_SUBSCRIBED \
@@ -478,7 +520,9 @@ class ThreadManager(BaseQuerySetManager):
         if not (getattr(django_settings, 'ENABLE_HAYSTACK_SEARCH', False) \
                 and orderby == '-relevance'):
             # FIXME: this does not produces the very same results as postgres.
-            qs = qs.extra(order_by=[orderby])
+            # thread id breaks the ties, which is required for the keyset pagination
+            tiebreak = '-id' if orderby.startswith('-') else 'id'
+            qs = qs.extra(order_by=[orderby, tiebreak])
         # HACK: We add 'ordering_key' column as an alias and order by it, because when distict() is used,
         #       qs.extra(order_by=[orderby,]) is lost if only `orderby` column is from askbot_post!
         #       Removing distinct() from the queryset fixes the problem, but we have to use it here.
@@ -487,7 +531,8 @@ class ThreadManager(BaseQuerySetManager):
         # qs = qs.distinct()
         qs = qs.only(
             'id', 'title', 'view_count', 'answer_count', 'last_activity_at',
-            'last_activity_by', 'closed', 'tagnames', 'accepted_answer'
+            'last_activity_by', 'closed', 'tagnames', 'accepted_answer',
+            'added_at', 'points'
         )
         return qs.distinct(), meta_data
 
@@ -846,6 +891,16 @@ class Thread(models.Model):
         self.close_reason = close_reason
         self.save()
         self.reset_cached_data()
+        self.reset_unanswered_counters()
+
+    def reset_unanswered_counters(self):
+        """resets counters of unanswered questions
+        affected by the state of this thread"""
+        counters.reset_question_counters(
+                            self.language_code,
+                            scopes=('unanswered',),
+                            tag_names=self.get_tag_names()
+                        )
 
     def set_tags_language_code(self, language_code=None):
         """sets language code to tags of this thread.
@@ -912,6 +967,7 @@ class Thread(models.Model):
         # TODO: in the future there may be >1 accepted answer
         self.accepted_answer = answer
         self.save()
+        self.reset_unanswered_counters()
         answer.endorsed = True
         answer.endorsed_at = timestamp
         answer.endorsed_by = actor
@@ -1023,26 +1079,114 @@ class Thread(models.Model):
 
     def invalidate_cached_summary_html(self):
         """Invalidates cached summary html in all activated languages"""
+        if askbot_settings.GROUPS_ENABLED:
+            self.reset_groups_cache_version('summary')
+            return
         langs = translation_utils.get_language_codes()
         keys = [self.get_summary_cache_key(v) for v in langs]
         cache.cache.delete_many(keys)
 
-    def get_summary_cache_key(self, lang=None):
+    def get_summary_cache_key(self, lang=None, visitor=None):
         lang = lang or get_language()
-        return 'thread-question-summary-%d-%s' % (self.id, lang)
+        key = 'thread-question-summary-%d-%s' % (self.id, lang)
+        if askbot_settings.GROUPS_ENABLED:
+            key += self.get_groups_cache_key_suffix('summary', visitor)
+        return key
 
-    def get_post_data_cache_key(self, sort_method=None):
-        return 'thread-data-%s-%s' % (self.id, sort_method)
+    def get_post_data_cache_key(self, sort_method=None, user=None):
+        key = 'thread-data-%s-%s' % (self.id, sort_method)
+        if askbot_settings.GROUPS_ENABLED:
+            key += self.get_groups_cache_key_suffix('data', user)
+        return key
 
     def invalidate_cached_post_data(self):
         """needs to be called when anything notable
         changes in the post data - on votes, adding,
         deleting, editing content"""
+        if askbot_settings.GROUPS_ENABLED:
+            self.reset_groups_cache_version('data')
+            return
         # we can call delete_many() here if using Django > 1.2
         sort_methods = [v[0] for v in const.ANSWER_SORT_METHODS]
         keys = [self.get_post_data_cache_key(v) for v in sort_methods]
         cache.cache.delete_many(keys)
 
+    def get_post_groups(self):
+        """returns dictionary post id -> set of group ids
+        of the thread posts, cached until the
+        ``invalidate_group_caches()`` call"""
+        key = 'thread-post-groups-%d' % self.id
+        post_groups = cache.cache.get(key)
+        if post_groups is None:
+            from askbot.models.post import PostToGroup
+            post_groups = dict()
+            items = PostToGroup.objects.filter(
+                                    post__thread=self
+                                ).values_list('post_id', 'group_id')
+            for post_id, group_id in items:
+                post_groups.setdefault(post_id, set()).add(group_id)
+            cache.cache.set(key, post_groups, const.LONG_TIME)
+        return post_groups
+
+    def get_groups_cache_key_suffix(self, name, user=None):
+        """returns suffix of the keys of the cached data ``name``,
+        used when groups are enabled: current version of the data and
+        the fingerprint of the thread posts visible to the user,
+        so that all users seeing the same posts share the cached data"""
+        group_ids = get_visible_group_ids(user)
+        post_ids = [
+            post_id for post_id, post_group_ids in self.get_post_groups().items()
+            if post_group_ids & group_ids
+        ]
+        fingerprint = ','.join([str(v) for v in sorted(post_ids)])
+        if user is None or user.is_anonymous:
+            # latest revision in the summary is not filtered
+            # by the groups for the anonymous visitors
+            fingerprint = 'anon:' + fingerprint
+        fingerprint = hashlib.md5(fingerprint.encode('utf-8')).hexdigest()
+        return '-%s-%s' % (self.get_groups_cache_version(name), fingerprint)
+
+    def get_groups_cache_version(self, name):
+        key = 'thread-%s-version-%d' % (name, self.id)
+        version = cache.cache.get(key)
+        if version is None:
+            version = self.reset_groups_cache_version(name)
+        return version
+
+    def reset_groups_cache_version(self, name):
+        """makes all group-keyed variants of the cached data ``name``
+        unreachable, the version is random, so that the stale
+        variants do not come back if the version is evicted"""
+        version = uuid.uuid4().hex[:12]
+        key = 'thread-%s-version-%d' % (name, self.id)
+        cache.cache.set(key, version, const.LONG_TIME)
+        return version
+
+    def invalidate_group_caches(self):
+        """needs to be called when the thread or its posts
+        are added to or removed from groups"""
+        cache.cache.delete('thread-post-groups-%d' % self.id)
+        self.clear_cached_data()
+
+    def update_post_score(self, post):
+        """needs to be called when the score of the post changes,
+        instead of the ``reset_cached_data()``:
+        copies the question score to the thread with a narrow update
+        and drops the cached post data, which is recomputed on the next
+        read, while the stale copy is served to the concurrent readers.
+        The cached data is not patched in place, because concurrent votes
+        would overwrite each other's changes. The summary html is only
+        invalidated, when the question is voted, and is rendered
+        on the next read"""
+        if post.post_type == 'question':
+            self.points = post.points
+            Thread.objects.filter(id=self.id).update(points=post.points)
+
+        self.invalidate_cached_post_data()
+
+        if post.post_type == 'question':
+            self.invalidate_cached_summary_html()
+
     def reset_cached_data(self):
         self.clear_cached_data()
         self.update_summary_html()
@@ -1157,15 +1301,14 @@ class Thread(models.Model):
         the method get_post_data()"""
         sort_method = sort_method or askbot_settings.DEFAULT_ANSWER_SORT_METHOD
 
+        key = self.get_post_data_cache_key(sort_method, user=user)
         if askbot_settings.GROUPS_ENABLED:
-            # temporary plug: bypass cache where groups are enabled
-            return self.get_post_data(sort_method=sort_method, user=user)
-        key = self.get_post_data_cache_key(sort_method)
-        post_data = cache.cache.get(key)
-        if not post_data:
-            post_data = self.get_post_data(sort_method)
-            cache.cache.set(key, post_data, const.LONG_TIME)
-        return post_data
+            # the key is made by the groups visible to the user
+            compute = functools.partial(self.get_post_data, sort_method, user=user)
+        else:
+            compute = functools.partial(self.get_post_data, sort_method)
+        # concurrent requests get the stale data while one recomputes it
+        return get_or_compute(key, compute, const.LONG_TIME, backend=cache.cache)
 
     def get_public_posts(self):
         kwargs = {
@@ -1184,9 +1327,10 @@ class Thread(models.Model):
         all (both posts and the comments sorted in the correct
         order)
         """
+        from askbot.models.post import Post
         sort_method = sort_method or askbot_settings.DEFAULT_ANSWER_SORT_METHOD
 
-        thread_posts = self.posts.all()
+        thread_posts = self.posts.select_related('author')
         if askbot_settings.GROUPS_ENABLED:
             if user is None or user.is_anonymous:
                 groups = (Group.objects.get_global_group(),)
@@ -1219,8 +1363,10 @@ class Thread(models.Model):
         comment_map = dict()
         post_to_author = dict()
         question_post = None
+        thread_posts = list(thread_posts)
+        # precache some revision data
+        Post.objects.precache_revisions(thread_posts)
         for post in thread_posts:
-            # precache some revision data
             first_rev = post.get_earliest_revision()
             last_rev = post.get_latest_revision()
             first_rev.post = post
@@ -1292,6 +1438,15 @@ class Thread(models.Model):
                     answers.remove(answer)
                     answers.insert(0, answer)
 
+        # profiles of the authors are not cached with the posts,
+        # they are read from the profile cache, when used
+        authors = list()
+        for post in thread_posts:
+            authors.append(post.author)
+            authors.append(post.get_earliest_revision().author)
+            authors.append(post.get_latest_revision().author)
+        detach_profiles(authors)
+
         return (question_post, answers, post_to_author, published_answer_ids)
 
     def has_accepted_answer(self):
@@ -1305,56 +1460,158 @@ class Thread(models.Model):
         others_tags = set(other_thread.get_tag_names())
         return len(my_tags & others_tags)
 
+    def get_similar_thread_scores(self, use_title=True, max_rows=None):
+        """returns list of pairs (thread id, score) of at most
+        ``SIMILAR_THREADS_COUNT`` threads most similar to this one,
+        best first.
+
+        The score adds up the IDF weights of the shared tags
+        and, with ``use_title``, the weights of the shared title words.
+        ``max_rows`` - if given, only that many thread tag records
+        of the newest threads are compared
+        """
+        tags = self.tags.filter(status=Tag.STATUS_ACCEPTED)
+        tags = tags.values_list('id', 'used_count')
+        total = counters.get_counter('posts', 'question') + 1
+        tag_weights = dict()
+        for tag_id, used_count in tags:
+            tag_weights[tag_id] = math.log(1.0 + float(total) / max(used_count, 1))
+
+        if not tag_weights:
+            return list()
+
+        thread_tags = Thread.tags.through.objects.filter(
+                                tag_id__in=list(tag_weights.keys()),
+                                thread__deleted=False,
+                                thread__language_code=self.language_code
+                            ).exclude(thread_id=self.id)
+        if max_rows:
+            thread_tags = thread_tags.order_by('-thread_id')[:max_rows]
+
+        scores = dict()
+        for thread_id, tag_id in thread_tags.values_list('thread_id', 'tag_id'):
+            scores[thread_id] = scores.get(thread_id, 0) + tag_weights[tag_id]
+
+        def by_score(item):
+            return (-item[1], -item[0])
+
+        scores = sorted(scores.items(), key=by_score)
+        if use_title and scores:
+            #titles are compared for the best candidates only
+            candidates = dict(scores[:SIMILAR_THREADS_COUNT * 5])
+            title_terms = get_title_terms(self.title)
+            titles = Thread.objects.filter(id__in=list(candidates.keys()))
+            for thread_id, title in titles.values_list('id', 'title'):
+                common_terms = title_terms & get_title_terms(title)
+                candidates[thread_id] += SIMILAR_TITLE_TERM_WEIGHT * len(common_terms)
+            scores = sorted(candidates.items(), key=by_score)
+
+        return scores[:SIMILAR_THREADS_COUNT]
+
+    def update_similar_threads(self, update_neighbors=True):
+        """stores the most similar threads in the index
+        of :class:`SimilarThread` records.
+
+        Similarity is symmetric, so with ``update_neighbors``
+        this thread replaces the weakest records
+        of the similar threads, if scores are high enough.
+        Threads, which had this thread in their lists, but are
+        not similar anymore, recalculate their lists in the celery tasks.
+        """
+        scores = self.get_similar_thread_scores()
+        changed_ids = set([self.id])
+        stale_ids = set()
+        with transaction.atomic():
+            SimilarThread.objects.filter(thread=self).delete()
+            records = [
+                SimilarThread(thread=self, similar_thread_id=thread_id, score=score)
+                for thread_id, score in scores
+            ]
+            if update_neighbors:
+                stale = SimilarThread.objects.filter(similar_thread=self)
+                stale_ids.update(stale.values_list('thread_id', flat=True))
+                changed_ids.update(stale_ids)
+                stale.delete()
+                records.extend(self.get_neighbor_similar_thread_records(scores))
+                changed_ids.update(thread_id for thread_id, score in scores)
+            SimilarThread.objects.bulk_create(records)
+
+        cache.cache.delete_many(['similar-threads-%s' % thread_id for thread_id in changed_ids])
+
+        #lists of these threads have a free slot now
+        stale_ids.difference_update([thread_id for thread_id, score in scores])
+        if stale_ids:
+            from askbot.tasks import update_similar_threads_celery_task
+            for thread_id in stale_ids:
+                defer_celery_task(
+                    update_similar_threads_celery_task,
+                    args=(thread_id,),
+                    kwargs={'update_neighbors': False}
+                )
+
+    def get_neighbor_similar_thread_records(self, scores):
+        """returns unsaved :class:`SimilarThread` records pointing
+        to this thread for the threads in ``scores`` whose lists
+        have room for it, evicted records are deleted"""
+        score_map = dict(scores)
+        neighbor_lists = dict()
+        existing = SimilarThread.objects.filter(thread_id__in=list(score_map.keys()))
+        for record in existing.only('id', 'thread_id', 'score'):
+            neighbor_lists.setdefault(record.thread_id, list()).append(record)
+
+        records = list()
+        evicted_ids = list()
+        for thread_id, score in scores:
+            neighbor_list = neighbor_lists.get(thread_id, list())
+            if len(neighbor_list) >= SIMILAR_THREADS_COUNT:
+                weakest = min(neighbor_list, key=operator.attrgetter('score'))
+                if weakest.score >= score:
+                    continue
+                evicted_ids.append(weakest.id)
+            records.append(SimilarThread(
+                                    thread_id=thread_id,
+                                    similar_thread=self,
+                                    score=score
+                                ))
+        SimilarThread.objects.filter(id__in=evicted_ids).delete()
+        return records
+
     def get_similar_threads(self):
         """
-        Get 10 similar threads for given one.
-        Threads with the individual tags will be added to list if above questions are not full.
-
-        This function has a limitation that it will
-        retrieve only 100 records then select 10 most similar
-        from that list as querying entire database may
-        be very expensive - this function will benefit from
-        some sort of optimization
+        Get 10 similar threads for given one,
+        from the index of :class:`SimilarThread` records,
+        see ``update_similar_threads()``.
+        Threads not in the index yet are compared on the fly.
         """
 
         def get_data():
-            # TODO: code in this function would be simpler if
-            # we had question post id denormalized on the thread
-            tags_list = self.get_tag_names()
-            similar_threads = Thread.objects\
-                .filter(tags__name__in=tags_list, language_code=self.language_code)\
-                .exclude(id=self.id)\
-                .exclude(posts__post_type='question', posts__deleted=True)\
-                .distinct()[:100]
-            similar_threads = list(similar_threads)
-
-            for thread in similar_threads:
-                thread.similarity = self.get_similarity(other_thread=thread)
-
-            similar_threads.sort(key=operator.attrgetter('similarity'), reverse=True)
-            similar_threads = similar_threads[:10]
-
-            # Denormalize questions to speed up template rendering
+            records = SimilarThread.objects.filter(thread=self).order_by('-score')
+            thread_ids = list(records.values_list('similar_thread_id', flat=True))
+            if not thread_ids:
+                scores = self.get_similar_thread_scores(
+                                    max_rows=SIMILAR_THREADS_FALLBACK_ROWS
+                                )
+                thread_ids = [item[0] for item in scores]
+
             # TODO: just denormalize question_post_id on the thread!
-            thread_map = dict([(thread.id, thread) for thread in similar_threads])
             from askbot.models.post import Post
-            questions = Post.objects.get_questions()
-            questions = questions.select_related('thread').filter(thread__in=similar_threads)
-            for q in questions:
-                thread_map[q.thread_id].question_denorm = q
+            questions = Post.objects.get_questions().filter(
+                                            deleted=False,
+                                            thread_id__in=thread_ids
+                                        ).select_related('thread')
+            question_map = dict([(q.thread_id, q) for q in questions])
 
             # Postprocess data for the final output
             result = list()
-            for thread in similar_threads:
-                question_post = getattr(thread, 'question_denorm', None)
-                # unfortunately the if statement below is necessary due to
-                # a possible bug
+            for thread_id in thread_ids:
+                question_post = question_map.get(thread_id)
+                # questions of some threads may be missing or deleted,
                 # all this proves that it's wrong to reference threads by
                 # the question post id in the question page urls!!!
                 # this is a "legacy" problem inherited from the old models
                 if question_post:
                     url = question_post.get_absolute_url()
-                    title = thread.get_title()
+                    title = question_post.thread.get_title()
                     result.append({'url': url, 'title': title})
 
             return result
@@ -1365,8 +1622,9 @@ class Thread(models.Model):
             """
             key = 'similar-threads-%s' % self.id
             data = cache.cache.get(key)
+            cache_stats.record_lookup('similar-threads', data is not None)
             if data is None:
-                data = get_data()
+                data = cache_stats.timed_compute('similar-threads', get_data)
                 cache.cache.set(key, data)
             return data
 
@@ -1418,7 +1676,7 @@ class Thread(models.Model):
         group_ids = [group.id for group in groups]
         from askbot.models.post import PostToGroup
         PostToGroup.objects\
-            .filter(post__id__in=post_ids, tag__id__in=group_ids)\
+            .filter(post__id__in=post_ids, group__id__in=group_ids)\
             .delete()
 
     def add_to_groups(self, groups,
@@ -1441,6 +1699,7 @@ class Thread(models.Model):
         if recursive:
             # comments are taken care of automatically
             self.add_child_posts_to_groups(groups)
+        self.invalidate_group_caches()
 
     def remove_from_groups(self, groups, recursive=False):
         thread_groups = ThreadToGroup.objects\
@@ -1448,6 +1707,7 @@ class Thread(models.Model):
         thread_groups.delete()
         if recursive:
             self.remove_child_posts_from_groups(groups)
+        self.invalidate_group_caches()
 
     def make_public(self, recursive=False):
         """adds the global group to the thread"""
@@ -1671,46 +1931,46 @@ class Thread(models.Model):
         return last_updated_at, last_updated_by
 
     def get_summary_html(self, search_state=None, visitor=None):
-        html = self.get_cached_summary_html(visitor) or self.update_summary_html(visitor)
+        html = get_or_compute(
+                    self.get_summary_cache_key(visitor=visitor),
+                    functools.partial(self.render_summary_html, visitor),
+                    const.LONG_TIME,
+                    backend=cache.cache
+                )
         # TODO: this work may be pushed onto javascript we post-process tag names
         # in the snippet so that tag urls match the search state
         # use `<<<` and `>>>` because they cannot be confused with user input
         # - if user accidentialy types <<<tag-name>>> into question title or body,
         # then in html it'll become escaped like this: &lt;&lt;&lt;tag-name&gt;&gt;&gt;
-        regex = re.compile(
-            r'<<<(%s)>>>' % const.TAG_REGEX_BARE,
-            re.UNICODE
-        )
-
         if search_state is None:
             search_state = DummySearchState()
 
-        while True:
-            match = regex.search(html)
-            if not match:
-                break
-            seq = match.group(0)  # e.g "<<<my-tag>>>"
-            tag = match.group(1)  # e.g "my-tag"
-            full_url = search_state.add_tag(tag).full_url()
-            html = html.replace(seq, full_url)
-
-        return html
+        # tag urls are memoized on the search state,
+        # which is shared by all summaries on the page
+        return TAG_PLACEHOLDER_RE.sub(
+            lambda match: search_state.add_tag_url(match.group(1)),
+            html
+        )
 
     def get_cached_summary_html(self, visitor=None):
-        # TODO: remove this plug by adding cached foreign user group
-        # parameter to the key. Now with groups on caching is turned off
-        # parameter visitor is there to get summary out by the user groups
-        if askbot_settings.GROUPS_ENABLED:
-            return None
-        return cache.cache.get(self.get_summary_cache_key())
+        # with groups enabled the summary depends on the groups
+        # visible to the visitor, see ``get_summary_cache_key()``
+        return cache.cache.get(self.get_summary_cache_key(visitor=visitor))
 
     def update_summary_html(self, visitor=None):
-        # TODO: it is quite wrong that visitor is an argument here
-        # because we do not include any visitor-related info in the cache key
-        # ideally cache should be shareable between users, so straight up
-        # using the user id for cache is wrong, we could use group
-        # memberships, but in that case we'd need to be more careful with
-        # cache invalidation
+        # visitor matters only when groups are enabled, then
+        # the html is cached by the groups visible to the visitor
+        html = self.render_summary_html(visitor)
+        # INFO: Timeout is set to 30 days:
+        # * timeout=0/None is not a reliable cross-backend way to set infinite timeout
+        # * We probably don't need to pollute the cache with threads older than 30 days
+        # * Additionally, Memcached treats timeouts > 30day as dates (https://code.djangoproject.com/browser/django/tags/releases/1.3/django/core/cache/backends/memcached.py#L36),
+        #   which probably doesn't break anything but if we can stick to 30 days then let's stick to it
+        set_with_stale(self.get_summary_cache_key(visitor=visitor), html,
+                       const.LONG_TIME, backend=cache.cache)
+        return html
+
+    def render_summary_html(self, visitor=None):
         context = {
             'thread': self,
             # fetch new question post to make sure we're up-to-date
@@ -1721,18 +1981,26 @@ class Thread(models.Model):
         from askbot.views.context import get_extra as get_extra_context
         context.update(get_extra_context('ASKBOT_QUESTION_SUMMARY_EXTRA_CONTEXT', None, context))
         template = get_template('widgets/question_summary.html')
-        html = template.render(Context(context))
-        # INFO: Timeout is set to 30 days:
-        # * timeout=0/None is not a reliable cross-backend way to set infinite timeout
-        # * We probably don't need to pollute the cache with threads older than 30 days
-        # * Additionally, Memcached treats timeouts > 30day as dates (https://code.djangoproject.com/browser/django/tags/releases/1.3/django/core/cache/backends/memcached.py#L36),
-        #   which probably doesn't break anything but if we can stick to 30 days then let's stick to it
-        cache.cache.set(self.get_summary_cache_key(), html,
-                        timeout=const.LONG_TIME)
-        return html
+        return template.render(Context(context))
+
+    def summary_html_cached(self, visitor=None):
+        return self.get_summary_cache_key(visitor=visitor) in cache.cache
+
 
-    def summary_html_cached(self):
-        return self.get_summary_cache_key() in cache.cache
+class SimilarThread(models.Model):
+    """index of similar threads, for each thread
+    stores up to ``SIMILAR_THREADS_COUNT`` records
+    with the most similar threads, built by the
+    ``askbot_build_similar_threads`` management command
+    and updated when threads are retagged
+    """
+    thread = models.ForeignKey(Thread, related_name='similar_thread_records', on_delete=models.CASCADE)
+    similar_thread = models.ForeignKey(Thread, related_name='+', on_delete=models.CASCADE)
+    score = models.FloatField()
+
+    class Meta:
+        app_label = 'askbot'
+        unique_together = ('thread', 'similar_thread')
 
 
 class QuestionView(models.Model):
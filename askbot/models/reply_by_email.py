@@ -27,6 +27,12 @@ def emailed_content_needs_moderation(email):
     return False
 
 
+def generate_address():
+    """returns a random code for the reply address"""
+    return ''.join(random.choice(string.ascii_letters +
+        string.digits) for i in range(random.randint(12, 25))).lower()
+
+
 class ReplyAddressManager(BaseQuerySetManager):
     """A manager for the :class:`ReplyAddress` model"""
 
@@ -36,15 +42,35 @@ class ReplyAddressManager(BaseQuerySetManager):
 
     def create_new(self, **kwargs):
         """creates a new reply address"""
-        kwargs['allowed_from_email'] = kwargs['user'].email
-        reply_address = ReplyAddress(**kwargs)
-        while True:
-            reply_address.address = ''.join(random.choice(string.ascii_letters +
-                string.digits) for i in range(random.randint(12, 25))).lower()
-            if self.filter(address=reply_address.address).count() == 0:
-                break
-        reply_address.save()
-        return reply_address
+        return self.create_many([kwargs])[0]
+
+    def create_many(self, kwargs_list):
+        """creates reply addresses for each dictionary
+        of parameters in the `kwargs_list`, with a single insert,
+        returns the list of created addresses"""
+        reply_addresses = list()
+        for kwargs in kwargs_list:
+            kwargs = dict(kwargs, allowed_from_email=kwargs['user'].email)
+            reply_addresses.append(ReplyAddress(**kwargs))
+
+        pending = reply_addresses
+        taken = set()
+        while pending:
+            for reply_address in pending:
+                reply_address.address = generate_address()
+            #regenerate addresses repeated in the batch or in the database
+            addresses = [reply_address.address for reply_address in pending]
+            taken.update(self.filter(address__in=addresses).values_list('address', flat=True))
+            retry = list()
+            for reply_address in pending:
+                if reply_address.address in taken:
+                    retry.append(reply_address)
+                else:
+                    taken.add(reply_address.address)
+            pending = retry
+
+        self.bulk_create(reply_addresses)
+        return reply_addresses
 
 
 REPLY_ACTION_CHOICES = (
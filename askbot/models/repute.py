@@ -92,6 +92,7 @@ class Vote(models.Model):
             # cancel downvote
             auth.onDownVotedCanceled(self, self.voted_post, self.user)
         score_after = self.voted_post.points
+        self.voted_post.thread.update_post_score(self.voted_post)
 
         return score_after - score_before
 
@@ -1,6 +1,9 @@
+import hashlib
 import re
+import uuid
 from django.db import models
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.utils.translation import get_language
 from django.utils.translation import ugettext as _
 from django.utils.translation import ugettext_lazy
@@ -87,6 +90,195 @@ def tags_match_some_wildcard(tag_names, wildcard_tags):
                 return True
     return False
 
+WILDCARD_SELECTION_FIELDS = {
+    'good': 'interesting_tags',
+    'bad': 'ignored_tags',
+    'subscribed': 'subscribed_tags',
+}
+
+def get_wildcard_index_version_key(reason):
+    return 'askbot-wildcard-tag-index-version-{}'.format(reason)
+
+def get_wildcard_index_version(reason):
+    key = get_wildcard_index_version_key(reason)
+    version = cache.get(key)
+    if version is None:
+        #version is random, so that the evicted
+        #versions of the index can't be reached
+        cache.add(key, uuid.uuid4().hex[:12], None)
+        version = cache.get(key)
+    return version
+
+def get_wildcard_index_cache_key(reason, version):
+    return 'askbot-wildcard-tag-index-{}-{}'.format(reason, version)
+
+def build_wildcard_index(reason):
+    """returns dictionary wildcard prefix -> set of user ids
+    built from the wildcard tag selections of all users
+    for the given tag mark reason ('good', 'bad' or 'subscribed')
+    """
+    from askbot.models.user_profile import UserProfile
+    field_name = WILDCARD_SELECTION_FIELDS[reason]
+    selections = UserProfile.objects.exclude(
+                                **{field_name: ''}
+                            ).values_list('pk', field_name)
+    index = dict()
+    for user_id, wildcards in selections:
+        for wildcard in wildcards.split():
+            prefix = wildcard[:-1]
+            index.setdefault(prefix, set()).add(user_id)
+    return index
+
+def get_wildcard_index(reason):
+    """returns cached wildcard index, see :func:`build_wildcard_index`"""
+    version = get_wildcard_index_version(reason)
+    key = get_wildcard_index_cache_key(reason, version)
+    index = cache.get(key)
+    if index is None:
+        index = build_wildcard_index(reason)
+        cache.set(key, index)
+    return index
+
+def invalidate_wildcard_index(reason):
+    """switches the index to a new version, which
+    is built on demand from the selections of all users,
+    the index is never patched in place, so that
+    the concurrent updates can't be lost"""
+    key = get_wildcard_index_version_key(reason)
+    cache.set(key, uuid.uuid4().hex[:12], None)
+
+def get_wildcard_subscriber_ids(tag_names, reason):
+    """returns set of ids of users whose wildcard tag selections
+    for the given reason match any of the tag names,
+    same as :func:`tags_match_some_wildcard` applied to every user
+    """
+    index = get_wildcard_index(reason)
+    if not index:
+        return set()
+
+    prefix_lengths = set([len(prefix) for prefix in index])
+    user_ids = set()
+    for tag_name in tag_names:
+        for length in prefix_lengths:
+            if length > len(tag_name):
+                continue
+            user_ids.update(index.get(tag_name[:length], ()))
+    return user_ids
+
+def get_tag_name_cache_key(tag_name, language_code):
+    name_hash = hashlib.md5(tag_name.lower().encode('utf-8')).hexdigest()
+    return 'askbot-tag-name-{}-{}'.format(language_code, name_hash)
+
+def resolve_tag_names(tag_names, language_code):
+    """returns dictionary tag name -> (tag id, canonical tag name)
+    for the tag names matching existing tags case-insensitively,
+    names of non-existing tags are left out.
+
+    Resolved names (including the misses) are cached per name,
+    the entries are reset by :func:`reset_tag_caches`.
+    """
+    keys = dict()
+    for tag_name in tag_names:
+        keys[get_tag_name_cache_key(tag_name, language_code)] = tag_name
+
+    resolved = dict()
+    missing = dict()
+    cached = cache.get_many(list(keys.keys()))
+    for key, tag_name in keys.items():
+        if key not in cached:
+            missing[key] = tag_name
+        elif cached[key]:
+            resolved[tag_name] = cached[key]
+
+    if missing:
+        name_filter = models.Q()
+        for tag_name in missing.values():
+            name_filter |= models.Q(name__iexact=tag_name)
+        tags = Tag.objects.filter(
+                        name_filter, language_code=language_code
+                    ).order_by('id').values_list('id', 'name')
+        found = dict()
+        for tag_id, name in tags:
+            found.setdefault(name.lower(), (tag_id, name))
+
+        new_entries = dict()
+        for key, tag_name in missing.items():
+            tag_data = found.get(tag_name.lower())
+            if tag_data:
+                resolved[tag_name] = tag_data
+            #misses are cached too, as False
+            new_entries[key] = tag_data or False
+        cache.set_many(new_entries)
+
+    return resolved
+
+def get_tag_filter_profile_cache_key(user_id):
+    return 'askbot-tag-filter-profile-{}'.format(user_id)
+
+def build_tag_filter_profile(user, language_code):
+    """returns dictionary keyed by the tag mark reason
+    ('good', 'bad', 'subscribed'), each value is a dictionary with
+    ids and names of the tags marked by the user and
+    ids of tags matching user's wildcards (for 'good' and 'bad' only)
+    """
+    profile = dict()
+    for reason in ('good', 'bad', 'subscribed'):
+        profile[reason] = {'ids': [], 'names': [], 'wildcard_ids': []}
+
+    marks = MarkedTag.objects.filter(
+                            user=user,
+                            tag__language_code=language_code
+                        ).order_by(
+                            '-tag__used_count', 'tag__name'
+                        ).values_list('reason', 'tag_id', 'tag__name')
+    for reason, tag_id, tag_name in marks:
+        profile[reason]['ids'].append(tag_id)
+        profile[reason]['names'].append(tag_name)
+
+    wildcards = {
+        'good': user.interesting_tags.split(),
+        'bad': user.ignored_tags.split()
+    }
+    for reason, reason_wildcards in wildcards.items():
+        if reason_wildcards:
+            tags = Tag.objects.get_by_wildcards(reason_wildcards)
+            profile[reason]['wildcard_ids'] = list(
+                            tags.values_list('id', flat=True)
+                        )
+    return profile
+
+def get_tag_filter_profile(user, language_code):
+    """returns cached tag filter profile,
+    see :func:`build_tag_filter_profile`"""
+    key = get_tag_filter_profile_cache_key(user.id)
+    profiles = cache.get(key) or dict()
+    if language_code not in profiles:
+        profiles[language_code] = build_tag_filter_profile(user, language_code)
+        cache.set(key, profiles)
+    return profiles[language_code]
+
+def reset_tag_filter_profiles(user_ids):
+    keys = [get_tag_filter_profile_cache_key(user_id) for user_id in user_ids]
+    cache.delete_many(keys)
+
+def reset_tag_caches(tag, old_name=None):
+    """resets cached tag name resolutions and tag filter
+    profiles of the users who marked the tag or
+    whose wildcards match the tag name"""
+    tag_names = set([tag.name])
+    if old_name:
+        tag_names.add(old_name)
+
+    keys = [get_tag_name_cache_key(name, tag.language_code) for name in tag_names]
+    cache.delete_many(keys)
+
+    user_ids = set(
+        MarkedTag.objects.filter(tag=tag).values_list('user_id', flat=True)
+    )
+    for reason in ('good', 'bad'):
+        user_ids.update(get_wildcard_subscriber_ids(tag_names, reason))
+    reset_tag_filter_profiles(user_ids)
+
 def get_mandatory_tags():
     """returns list of mandatory tags,
     or an empty list, if there aren't any"""
@@ -292,6 +484,13 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        tag = super(Tag, cls).from_db(db, field_names, values)
+        #remember the loaded name to detect renames in the post_save handler
+        tag._loaded_name = tag.__dict__.get('name')
+        return tag
+
     def decrement_used_count(self, delta=1):
         if self.used_count >= delta:
             self.used_count = self.used_count - delta
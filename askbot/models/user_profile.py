@@ -1,5 +1,7 @@
+import functools
 from askbot import const
 from askbot.models.fields import LanguageCodeField
+from askbot.utils import cache_stats
 from django.conf import settings as django_settings
 from django.core.cache import cache
 from django.db.models.signals import post_save
@@ -31,17 +33,87 @@ def get_profile_from_db(user):
     raise ValueError('auth.models.User is not saved, cant make UserProfile')
 
 
+def get_attached_profile(user):
+    """returns profile already attached to the user instance
+    by the ``get_profile``, ``prefetch_profiles`` or by the
+    ``select_related('askbot_profile')``, or None"""
+    return user._state.fields_cache.get('askbot_profile')
+
+
+def detach_profiles(users):
+    """removes profiles attached to the user instances,
+    which are stored in the cached data, so that outdated
+    profiles are not restored with them"""
+    for user in users:
+        if user is not None:
+            user._state.fields_cache.pop('askbot_profile', None)
+
+
 def get_profile(user):
+    profile = get_attached_profile(user)
+    if profile:
+        return profile
+
     key = get_profile_cache_key(user)
     profile = cache.get(key)
+    cache_stats.record_lookup('askbot-profile', bool(profile))
     if not profile:
-        profile = get_profile_from_db(user)
+        profile = cache_stats.timed_compute(
+                            'askbot-profile',
+                            functools.partial(get_profile_from_db, user)
+                        )
         cache.set(key, profile)
 
     setattr(user, 'askbot_profile', profile)
     return profile
 
 
+def prefetch_profiles(users):
+    """loads and attaches profiles to the users
+    with one ``cache.get_many`` and one database query
+    for the profiles missing in the cache.
+
+    Profiles attached before are re-read, because the users
+    may come from the cached data, with the outdated profiles.
+    """
+    users_by_id = dict()
+    for user in users:
+        if user is not None and user.pk:
+            users_by_id.setdefault(user.pk, list()).append(user)
+    if not users_by_id:
+        return
+
+    keys = dict()
+    for user_list in users_by_id.values():
+        keys[get_profile_cache_key(user_list[0])] = user_list[0].pk
+    cached = cache.get_many(list(keys.keys()))
+
+    profiles = dict()
+    for key, profile in cached.items():
+        profiles[keys[key]] = profile
+
+    for user_id in users_by_id:
+        cache_stats.record_lookup('askbot-profile', user_id in profiles)
+
+    missing_ids = set(users_by_id) - set(profiles)
+    if missing_ids:
+        loaded = UserProfile.objects.filter(pk__in=missing_ids)
+        loaded = dict([(profile.pk, profile) for profile in loaded])
+        for user_id in missing_ids:
+            if user_id not in loaded:
+                #profile is not created yet
+                loaded[user_id] = get_profile_from_db(users_by_id[user_id][0])
+        cache.set_many(dict([
+                        (get_profile_cache_key(users_by_id[user_id][0]), profile)
+                        for user_id, profile in loaded.items()
+                    ]))
+        profiles.update(loaded)
+
+    for user_id, user_list in users_by_id.items():
+        for user in user_list:
+            setattr(user, 'askbot_profile', profiles[user_id])
+
+
 def user_profile_property(field_name):
     """returns property that will access Askbot UserProfile
     of auth_user by field name"""
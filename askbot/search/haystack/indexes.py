@@ -29,7 +29,7 @@ class ThreadIndex(get_base_index()):
         return kwargs
 
     def prepare_tags(self, obj):
-        return [tag.name for tag in obj.tags.all()]
+        return obj.get_tag_names()
 
     def should_update(self, instance, **kwargs):
         # Update only if thread is not deleted
@@ -0,0 +1,189 @@
+"""Queue of the haystack index updates of threads and users,
+used by the ``AskbotQueuedSignalProcessor``.
+
+Saves of the posts, threads, users and user profiles put the thread
+and user ids into the queue kept in the shared cache. An object is queued once per
+``QUEUE_WINDOW`` seconds, and saves changing none of the indexed
+fields are skipped. The queue is flushed by the
+``update_haystack_index_celery_task``, scheduled once per window,
+which re-indexes the objects with one bulk update per backend
+and removes the objects that should not be indexed anymore.
+"""
+import hashlib
+import time
+from django.apps import apps
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import override
+
+QUEUE_WINDOW = 10 #seconds between the batched index updates
+VERSION_KEY = 'askbot-haystack-queue-version'
+FLUSHED_VERSION_KEY = 'askbot-haystack-queue-flushed'
+ITEM_TIMEOUT = 3600
+
+#fields that affect the indexed documents
+INDEXED_FIELDS = {
+    'askbot.thread': ('title', 'tagnames', 'deleted', 'language_code'),
+    'askbot.post': ('text', 'deleted', 'post_type', 'language_code', 'thread_id'),
+    'auth.user': (
+        'username', 'first_name', 'last_name', 'email',
+        'full_name', 'about', 'location'
+    ),
+    #profiles are indexed as the part of the user
+    'askbot.userprofile': ('location', 'real_name'),
+    'askbot.localizeduserprofile': ('about', 'language_code'),
+}
+#fields of the profiles, referring to the user
+PROFILE_USER_ID_FIELDS = {
+    'askbot.userprofile': 'auth_user_ptr_id',
+    'askbot.localizeduserprofile': 'auth_user_id',
+}
+
+
+def get_model_label(instance):
+    return instance._meta.label_lower
+
+
+def get_item_key(version):
+    return 'askbot-haystack-queue-item-%d' % version
+
+
+def get_pending_key(label, pk):
+    return 'askbot-haystack-pending-%s-%s' % (label, pk)
+
+
+def get_fingerprint_key(label, pk):
+    return 'askbot-haystack-fingerprint-%s-%s' % (label, pk)
+
+
+def get_profile_user_id(profile):
+    return getattr(profile, PROFILE_USER_ID_FIELDS[get_model_label(profile)])
+
+
+def get_fingerprint(instance):
+    label = get_model_label(instance)
+    #not all indexed fields are attributes of the users
+    values = [str(getattr(instance, name, '')) for name in INDEXED_FIELDS[label]]
+    return hashlib.md5('\n'.join(values).encode('utf-8')).hexdigest()
+
+
+def has_indexed_changes(instance, update_fields=None):
+    """False if the save changed none of the indexed fields
+    of the instance, compared to when it was queued the last time"""
+    label = get_model_label(instance)
+    if update_fields:
+        #fields of foreign keys are listed by the names in the update_fields
+        names = set([name.replace('_id', '') for name in INDEXED_FIELDS[label]])
+        if not names & set(update_fields):
+            return False
+    key = get_fingerprint_key(label, instance.pk)
+    fingerprint = get_fingerprint(instance)
+    if cache.get(key) == fingerprint:
+        return False
+    cache.set(key, fingerprint, None)
+    return True
+
+
+def enqueue(label, pk, language_code=None):
+    """adds object to the queue, unless it
+    is already waiting for the update
+
+    ``language_code`` - language of the thread, used
+    if the thread is deleted before the queue is flushed
+    """
+    if not cache.add(get_pending_key(label, pk), True, 2 * QUEUE_WINDOW):
+        return
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        cache.add(VERSION_KEY, 0, None)
+        version = cache.incr(VERSION_KEY)
+    cache.set(get_item_key(version), (label, pk, language_code), ITEM_TIMEOUT)
+    schedule_flush()
+
+
+def schedule_flush():
+    """schedules the flush of the queue at the end
+    of the current window, once per window"""
+    from askbot.tasks import update_haystack_index_celery_task
+    if django_settings.CELERY_ALWAYS_EAGER:
+        #no workers to wait for the end of the window,
+        #the objects saved in the transaction are updated after the commit
+        transaction.on_commit(update_haystack_index_celery_task.apply)
+        return
+    window = int(time.time() / QUEUE_WINDOW)
+    if cache.add('askbot-haystack-flush-%d' % window, True, 2 * QUEUE_WINDOW):
+        countdown = (window + 1) * QUEUE_WINDOW - time.time()
+        update_haystack_index_celery_task.apply_async(countdown=countdown)
+
+
+def get_queued_items():
+    """returns dictionary model label -> dictionary of the
+    queued ids -> language codes, removes the items from the queue"""
+    version = cache.get(VERSION_KEY, 0)
+    flushed_version = cache.get(FLUSHED_VERSION_KEY, 0)
+    if flushed_version > version:
+        #queue was evicted from the cache
+        flushed_version = 0
+    keys = [get_item_key(v) for v in range(flushed_version + 1, version + 1)]
+    items = cache.get_many(keys)
+    cache.set(FLUSHED_VERSION_KEY, version, None)
+    cache.delete_many(keys)
+
+    queued = dict()
+    for label, pk, language_code in items.values():
+        queued.setdefault(label, dict())[pk] = language_code
+    #objects saved from now on are queued again
+    cache.delete_many([
+        get_pending_key(label, pk)
+        for label, pks in queued.items() for pk in pks
+    ])
+    return queued
+
+
+def update_index(model, pks):
+    """re-indexes objects of the model in all backends
+    with one bulk update, removes from the index
+    the objects missing in the indexed query set"""
+    from haystack import connection_router, connections
+    from haystack.exceptions import NotHandled
+    for using in connection_router.for_write(models=[model]):
+        connection = connections[using]
+        try:
+            index = connection.get_unified_index().get_index(model)
+        except NotHandled:
+            continue
+        backend = connection.get_backend()
+        objects = list(index.index_queryset(using=using).filter(pk__in=pks))
+        if objects:
+            backend.update(index, objects)
+        for pk in set(pks) - set([obj.pk for obj in objects]):
+            backend.remove('%s.%s' % (model._meta.label_lower, pk))
+
+
+def flush_queue():
+    """updates the index of all queued threads and users"""
+    queued = get_queued_items()
+    user_ids = queued.get('auth.user', dict())
+    if user_ids:
+        update_index(apps.get_model('auth', 'User'), list(user_ids))
+
+    queued_languages = queued.get('askbot.thread', dict())
+    if not queued_languages:
+        return
+    #threads are indexed in the backends of their languages
+    Thread = apps.get_model('askbot', 'Thread')
+    languages = Thread.objects.filter(
+                        id__in=list(queued_languages)
+                    ).values_list('id', 'language_code')
+    languages = dict(languages)
+    thread_ids_by_language = dict()
+    for thread_id, queued_language in queued_languages.items():
+        #deleted threads are removed from the index of their language
+        language = languages.get(thread_id) or queued_language \
+                    or django_settings.LANGUAGE_CODE
+        thread_ids_by_language.setdefault(language, set()).add(thread_id)
+    for language, ids in thread_ids_by_language.items():
+        with override(language):
+            update_index(Thread, ids)
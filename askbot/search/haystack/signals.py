@@ -1,8 +1,9 @@
 from django.db.models import signals as django_signals
 
-from haystack.signals import RealtimeSignalProcessor
+from haystack.signals import BaseSignalProcessor, RealtimeSignalProcessor
 
 from askbot import signals as askbot_signals
+from askbot.search.haystack import queue
 
 
 class AskbotRealtimeSignalProcessor(RealtimeSignalProcessor):
@@ -40,6 +41,61 @@ class AskbotRealtimeSignalProcessor(RealtimeSignalProcessor):
         except ImportError:
             pass
 
+class AskbotQueuedSignalProcessor(BaseSignalProcessor):
+    '''
+    Queues updates of the threads and users, which are
+    then applied in batches, see askbot.search.haystack.queue
+    '''
+
+    def setup(self):
+        django_signals.post_save.connect(self.handle_save)
+        django_signals.post_delete.connect(self.handle_delete)
+        askbot_signals.after_post_removed.connect(self.handle_delete)
+
+    def teardown(self):
+        django_signals.post_save.disconnect(self.handle_save)
+        django_signals.post_delete.disconnect(self.handle_delete)
+        askbot_signals.after_post_removed.disconnect(self.handle_delete)
+
+    def handle_save(self, sender, instance, update_fields=None, **kwargs):
+        # avoid circular imports
+        from askbot.models import Post, Thread, User
+        from askbot.models import UserProfile, LocalizedUserProfile
+
+        if isinstance(instance, Post):
+            # posts are indexed as the part of the thread
+            if instance.thread_id \
+                and queue.has_indexed_changes(instance, update_fields):
+                queue.enqueue(
+                    'askbot.thread', instance.thread_id, instance.language_code
+                )
+        elif isinstance(instance, Thread):
+            if queue.has_indexed_changes(instance, update_fields):
+                queue.enqueue('askbot.thread', instance.pk, instance.language_code)
+        elif isinstance(instance, User):
+            if queue.has_indexed_changes(instance, update_fields):
+                queue.enqueue('auth.user', instance.pk)
+        elif isinstance(instance, (UserProfile, LocalizedUserProfile)):
+            # profiles are indexed as the part of the user
+            if queue.has_indexed_changes(instance, update_fields):
+                queue.enqueue('auth.user', queue.get_profile_user_id(instance))
+
+    def handle_delete(self, sender, instance, **kwargs):
+        # avoid circular imports
+        from askbot.models import Post, Thread, User
+
+        # objects missing in the indexed query sets
+        # are removed from the index
+        if isinstance(instance, Post):
+            if instance.thread_id:
+                queue.enqueue(
+                    'askbot.thread', instance.thread_id, instance.language_code
+                )
+        elif isinstance(instance, Thread):
+            queue.enqueue('askbot.thread', instance.pk, instance.language_code)
+        elif isinstance(instance, User):
+            queue.enqueue('auth.user', instance.pk)
+
 try:
     from haystack.exceptions import NotHandled
     from celery_haystack.signals import CelerySignalProcessor
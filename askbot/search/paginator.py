@@ -0,0 +1,148 @@
+"""Paginator for the question listings, which supports
+keyset (a.k.a. "seek") pagination via opaque cursors
+and caches the total count of the matching questions.
+
+With a cursor the page is selected by the values of the sort
+field and the thread id of the last item on the previous page,
+instead of the ``OFFSET``, so deep pages are as fast as the first one.
+"""
+import base64
+import hashlib
+
+import simplejson
+from django.conf import settings as django_settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+
+#sort method -> (thread field, is descending, is datetime)
+#id is used as the tie breaker, in the same direction
+KEYSET_SORT_FIELDS = {
+    'age-desc': ('added_at', True, True),
+    'age-asc': ('added_at', False, True),
+    'activity-desc': ('last_activity_at', True, True),
+    'activity-asc': ('last_activity_at', False, True),
+    'answers-desc': ('answer_count', True, False),
+    'answers-asc': ('answer_count', False, False),
+    'votes-desc': ('points', True, False),
+    'votes-asc': ('points', False, False),
+}
+
+def encode_cursor(sort, thread):
+    """returns opaque cursor pointing past the given thread
+    in the listing ordered by the ``sort`` method"""
+    field, _desc, is_datetime = KEYSET_SORT_FIELDS[sort]
+    value = getattr(thread, field)
+    if is_datetime:
+        value = value.isoformat()
+    data = simplejson.dumps([sort, value, thread.id])
+    return base64.urlsafe_b64encode(data.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor, sort):
+    """returns tuple (sort field value, thread id) or
+    ``None`` if the cursor is invalid or made for another sort method"""
+    if not cursor or sort not in KEYSET_SORT_FIELDS:
+        return None
+    try:
+        padding = '=' * (-len(cursor) % 4)
+        data = base64.urlsafe_b64decode((cursor + padding).encode('ascii'))
+        cursor_sort, value, thread_id = simplejson.loads(data.decode('utf-8'))
+        thread_id = int(thread_id)
+    except (TypeError, ValueError, UnicodeError):
+        return None
+
+    if cursor_sort != sort:
+        return None
+
+    is_datetime = KEYSET_SORT_FIELDS[sort][2]
+    try:
+        value = parse_datetime(value) if is_datetime else int(value)
+    except (TypeError, ValueError):
+        return None
+    if value is None:
+        return None
+    return value, thread_id
+
+def get_keyset_filter(sort, value, thread_id):
+    """returns Q object selecting threads following the
+    (value, thread_id) position in the listing"""
+    field, desc, _is_datetime = KEYSET_SORT_FIELDS[sort]
+    lookup = 'lt' if desc else 'gt'
+    return Q(**{field + '__' + lookup: value}) \
+        | Q(**{field: value, 'id__' + lookup: thread_id})
+
+def get_cached_count(queryset, timeout=None):
+    """returns count of the items in the queryset, cached
+    for the ``timeout`` seconds by the hash of the sql query"""
+    if timeout is None:
+        timeout = django_settings.ASKBOT_QUESTIONS_COUNT_CACHE_TIMEOUT
+    if timeout <= 0:
+        return queryset.count()
+
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        return 0
+    query_hash = hashlib.md5(sql.encode('utf-8')).hexdigest()
+    key = 'askbot-query-count-' + query_hash
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, timeout)
+    return count
+
+
+class QuestionsPaginator(Paginator):
+    """paginator for the thread querysets
+    returned by ``ThreadManager.run_advanced_search``
+
+    * total count is cached, see :func:`get_cached_count`,
+      or taken from the ``count`` argument,
+      so the number of pages is approximate
+    * if a valid ``cursor`` is given, the page is fetched
+      by the keyset condition instead of the offset,
+      ``number`` is then used only for display
+    * returned pages have attribute ``next_cursor``
+    """
+    def __init__(self, object_list, per_page, sort=None, cursor=None, count=None, **kwargs):
+        super(QuestionsPaginator, self).__init__(object_list, per_page, **kwargs)
+        self.sort = sort
+        self.cursor = cursor
+        self.known_count = count
+
+    @cached_property
+    def count(self):
+        if self.known_count is not None:
+            return self.known_count
+        return get_cached_count(self.object_list)
+
+    @cached_property
+    def position(self):
+        return decode_cursor(self.cursor, self.sort)
+
+    def page(self, number):
+        position = self.position
+        if position is None:
+            number = self.validate_number(number)
+            bottom = (number - 1) * self.per_page
+            #unlike the base class, don't trim the page
+            #by the count, as it may be out of date
+            threads = self.object_list[bottom:bottom + self.per_page]
+        else:
+            #page number is used only for display with the cursor
+            try:
+                number = max(int(number), 1)
+            except (TypeError, ValueError):
+                number = 1
+            threads = self.object_list.filter(
+                                get_keyset_filter(self.sort, *position)
+                            )[:self.per_page]
+
+        page = self._get_page(list(threads), number, self)
+        page.next_cursor = None
+        if self.sort in KEYSET_SORT_FIELDS and len(page.object_list) == self.per_page:
+            page.next_cursor = encode_cursor(self.sort, page.object_list[-1])
+        return page
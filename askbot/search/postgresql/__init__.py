@@ -43,7 +43,9 @@ def setup_full_text_search(script_path):
     finally:
         cursor.close()
 
-def run_full_text_search(query_set, query_text, text_search_vector_name):
+def run_full_text_search(
+    query_set, query_text, text_search_vector_name, fallback_filter=None
+):
     """runs full text search against the query set and
     the search text. All words in the query text are
     added to the search with the & operator - i.e.
@@ -53,6 +55,11 @@ def run_full_text_search(query_set, query_text, text_search_vector_name):
     table as the query set was built against, also
     it is assumed that the table has text search vector
     stored in the column called with value of`text_search_vector_name`.
+
+    ``fallback_filter`` - optional function returning the
+    ``Q`` object for the substring search, used for the short
+    queries, which find nothing with the full text search
+    (e.g. the stop words)
     """
     original_qs = query_set
     table_name = query_set.model._meta.db_table
@@ -89,21 +96,47 @@ def run_full_text_search(query_set, query_text, text_search_vector_name):
 
     result_qs = query_set.extra(**extra_kwargs)
     #added to allow search that can be ignored by postgres FTS.
-    if not result_qs and len(query_text) < 5:
+    #emptiness is tested with the "LIMIT 1" query, so that
+    #the ranked results are not loaded twice
+    if fallback_filter and len(query_text) < 5 and not result_qs.exists():
         return original_qs.filter(
-                    models.Q(title__icontains=search_query) |
-                    models.Q(tagnames__icontains=search_query) |
-                    models.Q(posts__text__icontains = search_query)
-                    ).extra(select={'relevance': rank_clause}, select_params=extra_params)
+                    fallback_filter(search_query)
+                ).extra(select={'relevance': rank_clause}, select_params=extra_params)
     return result_qs
 
 
+def get_thread_fallback_filter(search_query):
+    """substring search in the titles, tags and posts
+    of the threads, the "icontains" lookups, which are
+    ``UPPER(column::text) LIKE UPPER(...)`` on PostgreSQL,
+    are served by the trigram indexes of the same expressions
+    created by the `init_postgresql_full_text_search`,
+    except for the one and two character queries, which
+    the trigram indexes can't serve
+    """
+    from askbot.models import Post
+    thread_ids = Post.objects.filter(
+                        text__icontains=search_query
+                    ).values('thread_id')
+    return models.Q(title__icontains=search_query) | \
+            models.Q(tagnames__icontains=search_query) | \
+            models.Q(id__in=thread_ids)
+
+
 def run_thread_search(query_set, query):
     """runs search for full thread content"""
-    return run_full_text_search(query_set, query, 'text_search_vector');
+    return run_full_text_search(
+                    query_set, query, 'text_search_vector',
+                    fallback_filter=get_thread_fallback_filter
+                )
 
-run_user_search = run_thread_search #an alias
+def run_user_search(query_set, query):
+    """runs search for the users"""
+    return run_full_text_search(query_set, query, 'text_search_vector')
 
 def run_title_search(query_set, query):
     """runs search for title and tags"""
-    return run_full_text_search(query_set, query, 'title_search_vector')
+    return run_full_text_search(
+                    query_set, query, 'title_search_vector',
+                    fallback_filter=get_thread_fallback_filter
+                )
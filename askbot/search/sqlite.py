@@ -0,0 +1,251 @@
+"""Full text search for the SQLite databases,
+based on the FTS5 extension.
+
+Threads, posts and users are indexed in the FTS5 tables, whose rowid's
+are the ids of the threads, posts and users. Index is updated
+from the post, thread and user save signals, and is rebuilt
+by the ``askbot_rebuild_sqlite_search_index`` command.
+
+The search is enabled by the ``ASKBOT_SQLITE_FULL_TEXT_SEARCH_ENABLED``
+setting, when SQLite is compiled with FTS5.
+"""
+import re
+import askbot
+from django.conf import settings as django_settings
+from django.db import connection
+
+THREAD_INDEX_TABLE = 'askbot_thread_fts'
+USER_INDEX_TABLE = 'askbot_user_fts'
+POST_INDEX_TABLE = 'askbot_post_fts'
+INDEX_TABLES = (THREAD_INDEX_TABLE, USER_INDEX_TABLE, POST_INDEX_TABLE)
+#weights of the title, tagnames and text columns for the bm25 ranking
+THREAD_COLUMN_WEIGHTS = (10.0, 5.0, 1.0)
+SUPPORTS_FTS = None
+#True once the index tables are found in the database
+HAS_INDEX_TABLES = False
+
+
+def supports_full_text_search():
+    """True if the database is SQLite with the FTS5 extension"""
+    global SUPPORTS_FTS
+    if SUPPORTS_FTS is None:
+        if 'sqlite' in askbot.get_database_engine_name():
+            cursor = connection.cursor()
+            cursor.execute('PRAGMA compile_options')
+            options = [row[0] for row in cursor.fetchall()]
+            SUPPORTS_FTS = 'ENABLE_FTS5' in options
+        else:
+            SUPPORTS_FTS = False
+    return SUPPORTS_FTS
+
+
+def is_enabled():
+    return django_settings.ASKBOT_SQLITE_FULL_TEXT_SEARCH_ENABLED \
+        and supports_full_text_search()
+
+
+def has_index_tables():
+    """True if the index tables are created, the setting
+    may be enabled before the tables are created by the
+    ``migrate`` or the ``askbot_rebuild_sqlite_search_index``"""
+    global HAS_INDEX_TABLES
+    if not HAS_INDEX_TABLES:
+        cursor = connection.cursor()
+        cursor.execute(
+            'SELECT COUNT(*) FROM sqlite_master WHERE type=%s AND name IN (%s, %s, %s)',
+            ['table'] + list(INDEX_TABLES)
+        )
+        HAS_INDEX_TABLES = cursor.fetchone()[0] == len(INDEX_TABLES)
+    return HAS_INDEX_TABLES
+
+
+def is_ready():
+    """True if the search is enabled and the index tables exist"""
+    return is_enabled() and has_index_tables()
+
+
+def can_search(search_query):
+    """True if the search is ready and the query
+    has words to search for"""
+    return is_ready() and get_match_query(search_query) is not None
+
+
+def create_index_tables():
+    global HAS_INDEX_TABLES
+    cursor = connection.cursor()
+    cursor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS ' + THREAD_INDEX_TABLE + \
+        ' USING fts5(title, tagnames, text)'
+    )
+    cursor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS ' + USER_INDEX_TABLE + \
+        ' USING fts5(username, about)'
+    )
+    cursor.execute(
+        'CREATE VIRTUAL TABLE IF NOT EXISTS ' + POST_INDEX_TABLE + \
+        ' USING fts5(text)'
+    )
+    HAS_INDEX_TABLES = True
+
+
+def get_match_query(search_query, columns=None):
+    """returns FTS5 query, matching all of the words
+    of the search query as prefixes, or None
+    if there are no words in the query
+
+    ``columns`` - optional list of the searched column names
+    """
+    words = re.findall(r'\w+', search_query, re.UNICODE)
+    if not words:
+        return None
+    #words separated by spaces are all required
+    match_query = ' '.join(['"%s"*' % word for word in words])
+    if columns:
+        match_query = '{%s} : (%s)' % (' '.join(columns), match_query)
+    return match_query
+
+
+def update_thread_index(thread):
+    """indexes title, tags and text of the
+    not deleted posts of the thread"""
+    from askbot.models import Post
+    texts = Post.objects.filter(
+                        thread=thread,
+                        deleted=False,
+                        post_type__in=('question', 'answer', 'comment')
+                    ).order_by('id').values_list('text', flat=True)
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + THREAD_INDEX_TABLE + ' WHERE rowid=%s', [thread.id]
+    )
+    cursor.execute(
+        'INSERT INTO ' + THREAD_INDEX_TABLE + \
+        ' (rowid, title, tagnames, text) VALUES (%s, %s, %s, %s)',
+        [thread.id, thread.title, thread.tagnames, '\n'.join(texts)]
+    )
+
+
+def remove_thread_from_index(thread_id):
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + THREAD_INDEX_TABLE + ' WHERE rowid=%s', [thread_id]
+    )
+
+
+def update_post_index(post):
+    """indexes text of the post, deleted posts
+    and posts of other types are removed from the index"""
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + POST_INDEX_TABLE + ' WHERE rowid=%s', [post.id]
+    )
+    if post.deleted or post.post_type not in ('question', 'answer', 'comment'):
+        return
+    cursor.execute(
+        'INSERT INTO ' + POST_INDEX_TABLE + ' (rowid, text) VALUES (%s, %s)',
+        [post.id, post.text or '']
+    )
+
+
+def remove_post_from_index(post_id):
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + POST_INDEX_TABLE + ' WHERE rowid=%s', [post_id]
+    )
+
+
+def update_user_index(user):
+    """indexes user name and the "about" texts of the user"""
+    from askbot.models import LocalizedUserProfile
+    about = LocalizedUserProfile.objects.filter(
+                                auth_user=user
+                            ).values_list('about', flat=True)
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + USER_INDEX_TABLE + ' WHERE rowid=%s', [user.id]
+    )
+    cursor.execute(
+        'INSERT INTO ' + USER_INDEX_TABLE + \
+        ' (rowid, username, about) VALUES (%s, %s, %s)',
+        [user.id, user.username, '\n'.join([text or '' for text in about])]
+    )
+
+
+def remove_user_from_index(user_id):
+    cursor = connection.cursor()
+    cursor.execute(
+        'DELETE FROM ' + USER_INDEX_TABLE + ' WHERE rowid=%s', [user_id]
+    )
+
+
+def rebuild_index():
+    """re-creates the index of all threads, posts and users,
+    returns the number of the indexed threads and users"""
+    from askbot.models import Post, Thread, User
+    create_index_tables()
+    cursor = connection.cursor()
+    for table in INDEX_TABLES:
+        cursor.execute('DELETE FROM ' + table)
+    threads = Thread.objects.only('id', 'title', 'tagnames')
+    for thread in threads.iterator():
+        update_thread_index(thread)
+    posts = Post.objects.filter(
+                        deleted=False,
+                        post_type__in=('question', 'answer', 'comment')
+                    ).only('id', 'text', 'deleted', 'post_type')
+    for post in posts.iterator():
+        update_post_index(post)
+    users = User.objects.only('id', 'username')
+    for user in users.iterator():
+        update_user_index(user)
+    return threads.count(), users.count()
+
+
+def run_full_text_search(query_set, match_query, index_table, rank_clause):
+    """joins the index table to the query set,
+    adds the "relevance" column to the query set"""
+    table_name = query_set.model._meta.db_table
+    return query_set.extra(
+                tables=[index_table],
+                select={'relevance': rank_clause},
+                where=[
+                    index_table + '.rowid = ' + table_name + '.id',
+                    index_table + ' MATCH %s'
+                ],
+                params=[match_query]
+            )
+
+
+def run_thread_search(query_set, search_query, columns=None):
+    """runs search for full thread content"""
+    match_query = get_match_query(search_query, columns)
+    weights = ', '.join([str(weight) for weight in THREAD_COLUMN_WEIGHTS])
+    rank_clause = '-bm25(%s, %s)' % (THREAD_INDEX_TABLE, weights)
+    return run_full_text_search(
+                query_set, match_query, THREAD_INDEX_TABLE, rank_clause
+            )
+
+
+def run_title_search(query_set, search_query):
+    """runs search for title and tags"""
+    return run_thread_search(
+                query_set, search_query, columns=('title', 'tagnames')
+            )
+
+
+def run_user_search(query_set, search_query):
+    """runs search for the user names and profiles"""
+    match_query = get_match_query(search_query)
+    rank_clause = '-bm25(%s)' % USER_INDEX_TABLE
+    return run_full_text_search(
+                query_set, match_query, USER_INDEX_TABLE, rank_clause
+            )
+
+
+def run_post_search(query_set, search_query):
+    """filters posts, whose text matches the query"""
+    match_query = get_match_query(search_query)
+    where_clause = 'askbot_post.id IN (SELECT rowid FROM ' + \
+                    POST_INDEX_TABLE + ' WHERE ' + \
+                    POST_INDEX_TABLE + ' MATCH %s)'
+    return query_set.extra(where=[where_clause], params=[match_query])
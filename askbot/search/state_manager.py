@@ -86,11 +86,11 @@ class SearchState(object):
 
     @classmethod
     def get_empty(cls):
-        return cls(scope=None, sort=None, query=None, tags=None, author=None, page=None, page_size=None, user_logged_in=None)
+        return cls(scope=None, sort=None, query=None, tags=None, author=None, page=None, page_size=None, cursor=None, user_logged_in=None)
 
     def __init__(self,
         scope=None, sort=None, query=None, tags=None,
-        author=None, page=None, page_size=None, user_logged_in=False
+        author=None, page=None, page_size=None, cursor=None, user_logged_in=False
     ):
         # INFO: zip(*[('a', 1), ('b', 2)])[0] == ('a', 'b')
         if (scope not in list(zip(*const.POST_SCOPE_LIST))[0]) or (scope == 'followed' and not user_logged_in):
@@ -142,7 +142,12 @@ class SearchState(object):
         default_page_size = int(askbot_settings.DEFAULT_QUESTIONS_PAGE_SIZE)
         self.page_size = int(page_size) if page_size else default_page_size
 
+        #opaque position of the page in the listing, see askbot.search.paginator
+        self.cursor = cursor or None
+
         self._questions_url = reverse('questions')
+        #tag -> url of the search state with the added tag
+        self._tag_urls = dict()
 
     def __str__(self):
         return self.query_string()
@@ -196,6 +201,8 @@ class SearchState(object):
             r'(%s)?' % r'/tags:(?P<tags>[\w+.#,-]+)' + # Should match: const.TAG_CHARS + ','; TODO: Is `#` char decoded by the time URLs are processed ??
             r'(%s)?' % r'/author:(?P<author>\d+)' +
             r'(%s)?' % r'/page:(?P<page>\d+)' +
+            r'(%s)?' % r'/page-size:(?P<page_size>\d+)' +
+            r'(%s)?' % r'/cursor:(?P<cursor>[\w\-]+)' +
             r'(%s)?' % r'/query:(?P<query>.+)' +  # INFO: query is last, b/c it can contain slash!!!
         """
 
@@ -206,6 +213,8 @@ class SearchState(object):
             lst.append('author:' + str(self.author))
         if self.page:
             lst.append('page:' + str(self.page))
+        if self.cursor:
+            lst.append('cursor:' + self.cursor)
         if self.query:
             lst.append('query:' + urllib.parse.quote(smart_str(self.query), safe=self.SAFE_CHARS))
         return '/'.join(lst) + '/'
@@ -230,6 +239,7 @@ class SearchState(object):
         #ss.query_title = self.query_title
 
         #ss._questions_url = self._questions_url
+        ss._tag_urls = dict()
 
         return ss
 
@@ -238,12 +248,23 @@ class SearchState(object):
         if tag not in ss.tags:
             ss.tags.append(tag)
             ss.page = 1 # state change causes page reset
+            ss.cursor = None
         return ss
 
+    def add_tag_url(self, tag):
+        """returns url of the search state with the added tag,
+        memoized on this search state object"""
+        url = self._tag_urls.get(tag)
+        if url is None:
+            url = self.add_tag(tag).full_url()
+            self._tag_urls[tag] = url
+        return url
+
     def remove_author(self):
         ss = self.deepcopy()
         ss.author = None
         ss.page = 1
+        ss.cursor = None
         return ss
 
     def remove_tags(self, tags = None):
@@ -255,23 +276,35 @@ class SearchState(object):
         else:
             ss.tags = []
         ss.page = 1
+        ss.cursor = None
         return ss
 
     def change_scope(self, new_scope):
         ss = self.deepcopy()
         ss.scope = new_scope
         ss.page = 1
+        ss.cursor = None
         return ss
 
     def change_sort(self, new_sort):
         ss = self.deepcopy()
         ss.sort = new_sort
         ss.page = 1
+        ss.cursor = None
         return ss
 
     def change_page(self, new_page):
         ss = self.deepcopy()
         ss.page = new_page
+        ss.cursor = None
+        return ss
+
+    def change_page_by_cursor(self, new_page, cursor):
+        """``cursor`` points to the start of the page,
+        ``new_page`` number is used only for display"""
+        ss = self.deepcopy()
+        ss.page = new_page
+        ss.cursor = cursor
         return ss
 
 
@@ -286,3 +319,6 @@ class DummySearchState(object): # Used for caching question/thread summaries
 
     def full_url(self):
         return '<<<%s>>>' % self.tag
+
+    def add_tag_url(self, tag):
+        return '<<<%s>>>' % tag
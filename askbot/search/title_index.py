@@ -0,0 +1,284 @@
+"""In-memory index of the thread titles for the
+as-you-type lookup of the similar questions on the ask page.
+
+Every process keeps an index per language: the sorted list
+of the (word, thread id) pairs of the titles and the data shown
+in the dropdown - title, url, answer count, tags and groups.
+Words of the query are matched as prefixes of the title words.
+
+Changed threads are recorded in the shared cache
+with an incrementing version number. On lookup, processes compare
+the version with the version of their index and reload all threads
+changed in between with one batch of queries. The index is rebuilt
+when the change log is lost or is too long.
+
+Until the index of the process is built, titles are searched in the
+database, and the index is built after the response is sent,
+see :func:`build_pending_indexes`.
+"""
+import bisect
+import heapq
+import re
+import threading
+import uuid
+import askbot
+from django.core.cache import cache
+from askbot.utils.translation import get_language
+
+VERSION_KEY = 'askbot-title-index-version'
+#random id of the change log, it changes when the log is started anew
+EPOCH_KEY = 'askbot-title-index-epoch'
+MAX_CHANGES = 1000 #index is rebuilt if more threads have changed
+CHANGE_TIMEOUT = 3600
+MAX_RESULTS = 30
+
+#language code (or None) -> TitleIndex
+INDEXES = dict()
+INDEXES_LOCK = threading.Lock()
+#language codes of the indexes to build after the response
+PENDING_BUILDS = set()
+
+
+def get_words(text):
+    return re.findall(r'\w+', text.lower(), re.UNICODE)
+
+
+def get_change_key(version):
+    return 'askbot-title-index-change-%d' % version
+
+
+def start_change_log():
+    """starts new change log, all indexes will be rebuilt"""
+    cache.set(EPOCH_KEY, uuid.uuid4().hex[:12], None)
+    cache.add(VERSION_KEY, 0, None)
+
+
+def get_change_log_state():
+    """returns pair (epoch, version) of the change log"""
+    values = cache.get_many([EPOCH_KEY, VERSION_KEY])
+    if len(values) < 2:
+        #version numbers may start over, so the epoch is changed
+        start_change_log()
+        values = cache.get_many([EPOCH_KEY, VERSION_KEY])
+    return values.get(EPOCH_KEY), values.get(VERSION_KEY, 0)
+
+
+def record_change(thread_id):
+    """records change of the title, tags, groups
+    or deleted status of the thread"""
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        #change log is lost, the indexes will be rebuilt
+        start_change_log()
+        return
+    cache.set(get_change_key(version), thread_id, CHANGE_TIMEOUT)
+
+
+class TitleIndex(object):
+    """index of the titles of the threads in one language,
+    or of all threads, if the site is not multilingual
+    """
+    def __init__(self, language_code=None):
+        self.language_code = language_code
+        self.entries = dict()
+        self.words = list()
+        self.epoch = None
+        self.version = None
+        self.lock = threading.Lock()
+
+    def is_built(self):
+        return self.version is not None
+
+    def get_threads(self, thread_ids=None):
+        from askbot.models import Thread
+        threads = Thread.objects.filter(deleted=False, approved=True)
+        if self.language_code:
+            threads = threads.filter(language_code=self.language_code)
+        if thread_ids is not None:
+            threads = threads.filter(id__in=thread_ids)
+        return threads
+
+    def load_entries(self, thread_ids=None):
+        """returns dictionary thread id -> entry,
+        loaded with three queries"""
+        from askbot.models import Post, ThreadToGroup
+        threads = self.get_threads(thread_ids).only(
+                                    'id', 'title', 'tagnames', 'answer_count'
+                                )
+        threads = dict([(thread.id, thread) for thread in threads])
+
+        questions = Post.objects.filter(
+                                post_type='question', thread_id__in=threads.keys()
+                            ).only('id', 'thread_id', 'post_type', 'language_code')
+
+        group_ids = dict()
+        memberships = ThreadToGroup.objects.filter(
+                                    thread_id__in=threads.keys()
+                                ).values_list('thread_id', 'group_id')
+        for thread_id, group_id in memberships:
+            group_ids.setdefault(thread_id, set()).add(group_id)
+
+        entries = dict()
+        for question in questions:
+            thread = threads[question.thread_id]
+            entries[thread.id] = {
+                'id': thread.id,
+                'title': thread.title,
+                'url': question.get_absolute_url(thread=thread),
+                'answer_count': thread.answer_count,
+                'tags': set(thread.get_tag_names()),
+                'group_ids': group_ids.get(thread.id, set())
+            }
+        return entries
+
+    def add_entry(self, entry):
+        self.entries[entry['id']] = entry
+        for word in set(get_words(entry['title'])):
+            bisect.insort(self.words, (word, entry['id']))
+
+    def remove_entry(self, thread_id):
+        entry = self.entries.pop(thread_id, None)
+        if entry is None:
+            return
+        for word in set(get_words(entry['title'])):
+            pos = bisect.bisect_left(self.words, (word, thread_id))
+            if pos < len(self.words) and self.words[pos] == (word, thread_id):
+                del self.words[pos]
+
+    def rebuild(self, epoch, version):
+        self.entries = self.load_entries()
+        words = list()
+        for entry in self.entries.values():
+            for word in set(get_words(entry['title'])):
+                words.append((word, entry['id']))
+        words.sort()
+        self.words = words
+        self.epoch = epoch
+        self.version = version
+
+    def update(self, version):
+        """reloads threads changed since the
+        version of the index"""
+        keys = [get_change_key(v) for v in range(self.version + 1, version + 1)]
+        changes = cache.get_many(keys)
+        if len(changes) < len(keys):
+            #change log is lost
+            self.rebuild(self.epoch, version)
+            return
+        thread_ids = set(changes.values())
+        entries = self.load_entries(thread_ids)
+        for thread_id in thread_ids:
+            self.remove_entry(thread_id)
+            if thread_id in entries:
+                self.add_entry(entries[thread_id])
+        self.version = version
+
+    def refresh(self):
+        """applies changes of the threads made since
+        the last refresh, all at once"""
+        epoch, version = get_change_log_state()
+        if self.is_built() and epoch == self.epoch and version <= self.version:
+            return
+        with self.lock:
+            #index may have been refreshed by another thread
+            epoch, version = get_change_log_state()
+            if not self.is_built() or epoch != self.epoch \
+                or version - self.version > MAX_CHANGES:
+                self.rebuild(epoch, version)
+            elif version > self.version:
+                self.update(version)
+
+    def search_database(self, query, tag_name=None, group_ids=None, limit=MAX_RESULTS):
+        """same as ``search``, but titles are searched
+        in the database, used until the index is built"""
+        from askbot.models import ThreadToGroup
+        threads = self.get_threads()
+        if tag_name:
+            threads = threads.filter(tags__name=tag_name)
+        if group_ids is not None:
+            shared_thread_ids = ThreadToGroup.objects.filter(
+                                            group_id__in=group_ids
+                                        ).values('thread_id')
+            threads = threads.filter(id__in=shared_thread_ids)
+        if query:
+            threads = threads.get_for_title_query(query)
+        else:
+            threads = threads.order_by('-id')
+        thread_ids = list(threads.values_list('id', flat=True)[:limit])
+        entries = self.load_entries(thread_ids)
+        return [entries[thread_id] for thread_id in thread_ids if thread_id in entries]
+
+    def get_prefix_matches(self, prefix):
+        """returns set of ids of the threads having
+        title words starting with the prefix"""
+        thread_ids = set()
+        pos = bisect.bisect_left(self.words, (prefix,))
+        while pos < len(self.words) and self.words[pos][0].startswith(prefix):
+            thread_ids.add(self.words[pos][1])
+            pos += 1
+        return thread_ids
+
+    def search(self, query, tag_name=None, group_ids=None, limit=MAX_RESULTS):
+        """returns entries of the newest threads, whose titles
+        have words starting with each of the words of the query
+
+        ``group_ids`` - if given, only threads shared with
+        any of these groups are returned
+        """
+        self.refresh()
+        words = get_words(query)
+        #the longest prefix has the fewest matches
+        words.sort(key=len, reverse=True)
+
+        def is_visible(entry):
+            if tag_name and tag_name not in entry['tags']:
+                return False
+            if group_ids is not None and not (entry['group_ids'] & group_ids):
+                return False
+            return True
+
+        with self.lock:
+            if words:
+                thread_ids = self.get_prefix_matches(words[0])
+                for word in words[1:]:
+                    if not thread_ids:
+                        break
+                    thread_ids &= self.get_prefix_matches(word)
+            else:
+                thread_ids = self.entries.keys()
+            matches = [self.entries[thread_id] for thread_id in thread_ids]
+
+        matches = [entry for entry in matches if is_visible(entry)]
+        return heapq.nlargest(limit, matches, key=lambda entry: entry['id'])
+
+
+def get_index(language_code=None):
+    with INDEXES_LOCK:
+        if language_code not in INDEXES:
+            INDEXES[language_code] = TitleIndex(language_code)
+        return INDEXES[language_code]
+
+
+def search_titles(query, tag_name=None, group_ids=None):
+    """searches titles in the index of the current language,
+    if the index is not built yet, searches the database
+    and schedules the build of the index"""
+    language_code = get_language() if askbot.is_multilingual() else None
+    index = get_index(language_code)
+    if not index.is_built():
+        with INDEXES_LOCK:
+            PENDING_BUILDS.add(language_code)
+        return index.search_database(query, tag_name=tag_name, group_ids=group_ids)
+    return index.search(query, tag_name=tag_name, group_ids=group_ids)
+
+
+def build_pending_indexes(**kwargs):
+    """builds indexes requested by the lookups, called
+    on the ``request_finished`` signal - after the response
+    is sent, so that the build does not delay the lookups"""
+    with INDEXES_LOCK:
+        language_codes = list(PENDING_BUILDS)
+        PENDING_BUILDS.clear()
+    for language_code in language_codes:
+        get_index(language_code).refresh()
@@ -83,35 +83,50 @@ def get_skin_choices():
     skin_names = list(reversed(available_skins))
     return list(zip(skin_names, skin_names))
 
+#process-level tables used by get_media_url(), they are reset
+#when the skin, the media revision or the extra skins directory change
+MEDIA_TABLES = {
+    'state': None,
+    #(url, skin, revision) -> resolved url or None
+    'urls': dict(),
+    #skin directory -> set of paths of the files in its media directory
+    'files': dict(),
+    #(url, skin) of the missing resources, logged once
+    'missing': set(),
+}
+
+def reset_media_tables(state=None):
+    MEDIA_TABLES['state'] = state
+    MEDIA_TABLES['urls'] = dict()
+    MEDIA_TABLES['files'] = dict()
+    MEDIA_TABLES['missing'] = set()
+
+def get_skin_media_files(skin_dir):
+    """returns set of normalized paths of the files
+    in the media directory of the skin, relative to that directory"""
+    files = MEDIA_TABLES['files'].get(skin_dir)
+    if files is None:
+        files = set()
+        media_dir = os.path.join(skin_dir, 'media')
+        for dir_path, _, file_names in os.walk(media_dir, followlinks=True):
+            rel_dir = os.path.relpath(dir_path, media_dir)
+            for file_name in file_names:
+                files.add(os.path.normpath(os.path.join(rel_dir, file_name)))
+        MEDIA_TABLES['files'][skin_dir] = files
+    return files
+
 def resolve_skin_for_media(media=None, preferred_skin = None):
     #see if file exists, if not, try skin 'default'
     available_skins = list(get_available_skins(selected=preferred_skin).items())
+    media_path = os.path.normpath(media)
     for skin_name, skin_dir in available_skins:
-        if os.path.isfile(os.path.join(skin_dir, 'media', media)):
+        if media_path in get_skin_media_files(skin_dir):
             return skin_name
     raise MediaNotFound(media)
 
-def get_media_url(url, ignore_missing = False):
-    """returns url prefixed with the skin name
-    of the first skin that contains the file
-    directories are searched in this order:
-    askbot_settings.ASKBOT_DEFAULT_SKIN, then 'default', then 'commmon'
-    if file is not found - returns None
-    and logs an error message
-
-    todo: move this to the skin environment class
-    """
-    #from django.utils import timezone
-    #before = timezone.now()
-    url = urllib.parse.unquote(str(url))
-    while url[0] == '/': url = url[1:]
-
-    #a hack allowing urls media stored on external locations to
-    #just pass through unchanged
-    if url.startswith('http://') or url.startswith('https://'):
-        return url
-    #todo: handles case of multiple skin directories
-
+def resolve_media_url(url, use_skin, resource_revision):
+    """returns url of the uploaded file or of the media file
+    of the first skin that contains it, or None"""
     #if file is in upfiles directory, then give that
     url_copy = url
     if url_copy.startswith(django_settings.MEDIA_URL[1:]):
@@ -133,11 +148,44 @@ def get_media_url(url, ignore_missing = False):
                                     '///', '/'
                                 )
             return url_copy
-        elif ignore_missing == False:
-            logging.critical('missing media resource %s' % url)
 
     #2) if it does not exist in uploaded files directory - look in skins
 
+    #determine from which skin take the media file
+    try:
+        use_skin = resolve_skin_for_media(media=url, preferred_skin = use_skin)
+    except MediaNotFound:
+        return None
+
+    url = django_settings.STATIC_URL + use_skin + '/media/' + url
+    url = os.path.normpath(url).replace('\\', '/')
+
+    if resource_revision:
+        url +=  '?v=%d' % resource_revision
+    return url
+
+def get_media_url(url, ignore_missing = False):
+    """returns url prefixed with the skin name
+    of the first skin that contains the file
+    directories are searched in this order:
+    askbot_settings.ASKBOT_DEFAULT_SKIN, then 'default', then 'commmon'
+    if file is not found - returns None
+    and logs an error message, once per url
+
+    resolved urls are memoized per process,
+    by the url, skin and media resource revision
+
+    todo: move this to the skin environment class
+    """
+    url = urllib.parse.unquote(str(url))
+    while url[0] == '/': url = url[1:]
+
+    #a hack allowing urls media stored on external locations to
+    #just pass through unchanged
+    if url.startswith('http://') or url.startswith('https://'):
+        return url
+    #todo: handles case of multiple skin directories
+
     #purpose of this try statement is to determine
     #which skin is currently used
     try:
@@ -151,25 +199,30 @@ def get_media_url(url, ignore_missing = False):
         use_skin = 'default'
         resource_revision = None
 
-    #determine from which skin take the media file
-    try:
-        use_skin = resolve_skin_for_media(media=url, preferred_skin = use_skin)
-    except MediaNotFound:
-        if ignore_missing == False:
+    extra_skins_dir = getattr(django_settings, 'ASKBOT_EXTRA_SKINS_DIR', None)
+    state = (use_skin, resource_revision, extra_skins_dir)
+    if MEDIA_TABLES['state'] != state:
+        reset_media_tables(state)
+
+    key = (url, use_skin, resource_revision)
+    urls = MEDIA_TABLES['urls']
+    if key in urls:
+        media_url = urls[key]
+    else:
+        media_url = resolve_media_url(url, use_skin, resource_revision)
+        #missing uploaded files may be uploaded later
+        is_upload = url.startswith(django_settings.MEDIA_URL[1:])
+        if media_url or not is_upload:
+            urls[key] = media_url
+
+    if media_url is None and ignore_missing == False:
+        missing = MEDIA_TABLES['missing']
+        if (url, use_skin) not in missing:
+            missing.add((url, use_skin))
             log_message = 'missing media resource %s in skin %s' \
                             % (url, use_skin)
             logging.critical(log_message)
-        return None
-
-    url = django_settings.STATIC_URL + use_skin + '/media/' + url
-    url = os.path.normpath(url).replace('\\', '/')
-
-    if resource_revision:
-        url +=  '?v=%d' % resource_revision
-
-    #after = timezone.now()
-    #print after - before
-    return url
+    return media_url
 
 def update_media_revision(skin=None):
     """update skin media revision number based on the contents
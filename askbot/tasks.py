@@ -23,6 +23,7 @@ import sys
 import traceback
 import uuid
 
+from django.conf import settings as django_settings
 from django.contrib.contenttypes.models import ContentType
 from django.core.management import call_command
 from django.template import Context
@@ -49,6 +50,7 @@ from askbot.models import (
     PostRevision,
     User,
     ReplyAddress,
+    get_reply_to_addresses_for_users
 )
 from askbot.models.user import get_invited_moderators
 from askbot.models.badges import award_badges_signal
@@ -106,6 +108,32 @@ def submit_spam_posts(post_ids):
                             author=post.author)
 
 
+@task(ignore_result=True)
+def update_similar_threads_celery_task(thread_id, update_neighbors=True):
+    """updates the similar threads index for the retagged thread"""
+    from askbot.models import Thread
+    try:
+        thread = Thread.objects.get(id=thread_id)
+    except Thread.DoesNotExist:
+        return
+    thread.update_similar_threads(update_neighbors=update_neighbors)
+
+
+@task(ignore_result=True)
+def write_pending_user_visit_celery_task(user_id):
+    """writes the last visit of the user, buffered
+    within the visit recording interval"""
+    from askbot.models import write_pending_user_visit
+    write_pending_user_visit(user_id)
+
+
+@task(ignore_result=True)
+def update_haystack_index_celery_task():
+    """updates haystack index of the queued threads and users"""
+    from askbot.search.haystack.queue import flush_queue
+    flush_queue()
+
+
 @task(ignore_result=True)
 def export_user_data(user_id):
     """Exports user data by ID"""
@@ -266,19 +294,10 @@ def record_question_visit(
                              actor=user,
                              context_object=question_post)
 
-@task()
-def send_instant_notifications_about_activity_in_post(
-        activity_id=None, post_id=None, recipients=None):
-
-    if recipients is None:
-        recipients = set()
-
-    recipients = set(recipients)
-    recipients.update(get_invited_moderators())
-
-    if len(recipients) == 0:
-        return
-
+def get_instant_notification_objects(activity_id, post_id):
+    """returns the update activity and the post
+    for the instant notifications, or ``None``
+    if the objects are not available"""
     acceptable_types = const.RESPONSE_ACTIVITY_TYPES_FOR_INSTANT_NOTIFICATIONS
     try:
         update_activity = Activity.objects\
@@ -286,17 +305,26 @@ def send_instant_notifications_about_activity_in_post(
             .get(id=activity_id)
     except Activity.DoesNotExist:
         logger.error("Unable to fetch activity with id %s" % post_id)
-        return
+        return None
 
     try:
         post = Post.objects.get(id=post_id)
     except Post.DoesNotExist:
         logger.error("Unable to fetch post with id %s" % post_id)
-        return
+        return None
 
     if not post.is_approved():
-        return
+        return None
+
+    return update_activity, post
 
+
+def send_instant_notifications(update_activity, post, recipients):
+    """sends instant email alerts about the `update_activity`
+    to the recipients over one email connection,
+    the part of the email context common to all
+    the recipients is calculated once, reply addresses
+    are created with a single insert"""
     if logger.getEffectiveLevel() <= logging.DEBUG:
         log_id = uuid.uuid1()
         message = 'email-alert %s, logId=%s' % (post.get_absolute_url(), log_id)
@@ -304,23 +332,73 @@ def send_instant_notifications_about_activity_in_post(
     else:
         log_id = None
 
-    for user in recipients:
-        if user.is_blocked():
-            continue
+    activate_language(post.language_code)
 
-        activate_language(post.language_code)
+    post_context = InstantEmailAlert.get_post_context(post, update_activity)
+    reply_addresses = get_reply_to_addresses_for_users(recipients, post)
 
-        email = InstantEmailAlert({
-            'to_user': user,
-            'from_user': update_activity.user,
-            'post': post,
-            'update_activity': update_activity
-        })
-        try:
-            email.send([user.email])
-        except askbot_exceptions.EmailNotSent as error:
-            logger.debug(
-                '%s, error=%s, logId=%s' % (user.email, error, log_id)
-            )
+    connection = mail.get_mail_connection()
+    try:
+        for user, addresses in zip(recipients, reply_addresses):
+            email = InstantEmailAlert({
+                'to_user': user,
+                'from_user': update_activity.user,
+                'post': post,
+                'update_activity': update_activity,
+                'post_context': post_context,
+                'reply_address': addresses[0],
+                'alt_reply_address': addresses[1]
+            })
+            try:
+                email.send([user.email], connection=connection)
+            except askbot_exceptions.EmailNotSent as error:
+                logger.debug(
+                    '%s, error=%s, logId=%s' % (user.email, error, log_id)
+                )
+            else:
+                logger.debug('success %s, logId=%s' % (user.email, log_id))
+    finally:
+        connection.close()
+
+
+@task()
+def send_instant_notifications_about_activity_in_post(
+        activity_id=None, post_id=None, recipients=None):
+
+    if recipients is None:
+        recipients = set()
+
+    recipients = set(recipients)
+    recipients.update(get_invited_moderators())
+
+    if len(recipients) == 0:
+        return
+
+    objects = get_instant_notification_objects(activity_id, post_id)
+    if objects is None:
+        return
+
+    recipients = [user for user in recipients if not user.is_blocked()]
+
+    #large fan-outs are split into tasks shared by the workers
+    batch_size = django_settings.ASKBOT_INSTANT_NOTIFICATIONS_BATCH_SIZE
+    if len(recipients) <= batch_size:
+        send_instant_notifications(objects[0], objects[1], recipients)
+        return
+
+    for start in range(0, len(recipients), batch_size):
+        task_kwargs = {
+            'args': (activity_id, post_id, recipients[start:start + batch_size])
+        }
+        if django_settings.CELERY_ALWAYS_EAGER:
+            send_instant_notifications_batch_celery_task.apply(**task_kwargs)
         else:
-            logger.debug('success %s, logId=%s' % (user.email, log_id))
+            send_instant_notifications_batch_celery_task.apply_async(**task_kwargs)
+
+
+@task(ignore_result=True)
+def send_instant_notifications_batch_celery_task(activity_id, post_id, recipients):
+    """sends instant notifications to a part of the recipients"""
+    objects = get_instant_notification_objects(activity_id, post_id)
+    if objects is not None:
+        send_instant_notifications(objects[0], objects[1], recipients)
@@ -35,7 +35,7 @@ class ApiV1Tests(AskbotTestCase):
         self.post_question(user=user)
         response = self.client.get(reverse('api_v1_questions'))
         response_data = simplejson.loads(response.content)
-        expected_keys = set(['count', 'pages', 'questions'])
+        expected_keys = set(['count', 'pages', 'next_cursor', 'questions'])
         self.assertEqual(expected_keys, set(response_data.keys()))
 
         expected_keys = set([
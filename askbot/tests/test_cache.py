@@ -1,7 +1,14 @@
 from django.db import connection
 from django.urls import reverse
 from django.conf import settings
+from django.core import management
+from django.core.cache.backends.locmem import LocMemCache
+from django.test import TestCase, modify_settings, override_settings
+from io import StringIO
+from mock import patch
 from askbot.tests.utils import AskbotTestCase
+from askbot.utils import cache_stats
+from askbot.utils.cache import get_or_compute, set_with_stale
 
 
 class CacheTests(AskbotTestCase):
@@ -27,3 +34,77 @@ class CacheTests(AskbotTestCase):
         self.assertTrue(before_count > after_count,
                 ('Expected fewer queries after calling visit_question. ' +
                  'Before visit: %d. After visit: %d.') % (before_count, after_count))
+
+
+class GetOrComputeTests(TestCase):
+    def setUp(self):
+        self.backend = LocMemCache('get-or-compute', {})
+        self.backend.clear()
+        self.computed = list()
+
+    def compute(self):
+        self.computed.append(True)
+        return 'new value'
+
+    def get(self, key='key'):
+        return get_or_compute(key, self.compute, 60, backend=self.backend)
+
+    def test_value_is_computed_once(self):
+        self.assertEqual(self.get(), 'new value')
+        self.assertEqual(self.get(), 'new value')
+        self.assertEqual(len(self.computed), 1)
+
+    def test_stale_value_is_served_during_computation(self):
+        set_with_stale('key', 'old value', 60, backend=self.backend)
+        self.backend.delete('key')
+        #another caller holds the lock
+        self.backend.add('key:lock', True)
+        self.assertEqual(self.get(), 'old value')
+        self.assertEqual(self.computed, [])
+        #lock is released, the value is recomputed
+        self.backend.delete('key:lock')
+        self.assertEqual(self.get(), 'new value')
+        self.assertEqual(self.backend.get('key:stale'), 'new value')
+
+    @patch('askbot.utils.cache.WAIT_TIMEOUT', 0)
+    def test_value_is_computed_when_lock_is_not_released(self):
+        self.backend.add('key:lock', True)
+        self.assertEqual(self.get(), 'new value')
+        self.assertEqual(self.backend.get('key'), None)
+
+
+@override_settings(ASKBOT_CACHE_STATS_ENABLED=True)
+class CacheStatsTests(AskbotTestCase):
+    def setUp(self):
+        cache_stats.reset_stats()
+
+    def test_lookups_are_counted_by_key_family(self):
+        for thread_id in (1, 2, 1):
+            get_or_compute('some-data-%d' % thread_id, lambda: [1, 2, 3])
+        stats = cache_stats.get_stats()['some-data']
+        self.assertEqual(stats['hits'], 1)
+        self.assertEqual(stats['misses'], 2)
+        self.assertEqual(stats['computes'], 2)
+        self.assertTrue(stats['bytes'] > 0)
+
+        output = StringIO()
+        management.call_command('askbot_cache_stats', stdout=output)
+        self.assertIn('some-data', output.getvalue())
+
+        management.call_command('askbot_cache_stats', reset=True)
+        self.assertEqual(cache_stats.get_stats(), {})
+
+        #families are listed again after the reset
+        get_or_compute('some-data-1', lambda: [1, 2, 3])
+        self.assertEqual(cache_stats.get_stats()['some-data']['hits'], 1)
+        self.assertEqual(list(cache_stats.get_stats().keys()), ['some-data'])
+
+    @modify_settings(MIDDLEWARE={
+        'append': 'askbot.middleware.debug_headers.DebugHeadersMiddleware'
+    })
+    def test_debug_headers(self):
+        response = self.client.get(reverse('questions'))
+        self.assertTrue(int(response['X-Askbot-Queries']) > 0)
+        self.assertIn('X-Askbot-Time-Ms', response)
+        self.assertIn('X-Askbot-Cache-Hits', response)
+        self.assertEqual(cache_stats.get_stats()['view:questions']['requests'], 1)
@@ -0,0 +1,78 @@
+from django.core.management import call_command
+from askbot.models import counters
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase
+
+
+class CountersTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.question = self.post_question(user=self.user, tags='one two')
+
+    def assert_counts(self, questions, unanswered, tagged):
+        """compares counters to the expected values
+        and to the recounted values"""
+        values = (
+            counters.get_counter('questions', None, 'all'),
+            counters.get_counter('questions', None, 'unanswered'),
+            counters.get_counter('questions', None, 'all', 'one')
+        )
+        self.assertEqual(values, (questions, unanswered, tagged))
+        recounted = (
+            counters.count_questions(None, 'all'),
+            counters.count_questions(None, 'unanswered'),
+            counters.count_questions(None, 'all', 'one')
+        )
+        self.assertEqual(values, recounted)
+
+    def test_counters_follow_posts(self):
+        self.assert_counts(1, 1, 1)
+        self.assertEqual(counters.get_counter('posts', 'question'), 1)
+
+        question = self.post_question(user=self.user, tags='one')
+        self.assert_counts(2, 2, 2)
+
+        other_user = self.create_user('other_user')
+        answer = self.post_answer(user=other_user, question=question)
+        self.assertEqual(counters.get_counter('posts', 'answer'), 1)
+        self.user.accept_best_answer(answer=answer)
+        self.assert_counts(2, 1, 2)
+
+        other_user.delete_answer(answer=answer)
+        self.assert_counts(2, 2, 2)
+        self.assertEqual(counters.get_counter('posts', 'answer'), 0)
+
+        self.user.delete_question(question=question)
+        self.assert_counts(1, 1, 1)
+        self.assertEqual(counters.get_counter('posts', 'question'), 1)
+
+        self.user.restore_post(post=question)
+        self.assert_counts(2, 2, 2)
+
+        question.thread.retag(
+            retagged_by=self.user,
+            retagged_at=question.added_at,
+            tagnames='two'
+        )
+        self.assert_counts(2, 2, 1)
+
+    def test_counted_value_is_cached(self):
+        counters.get_counter('posts', 'question')
+        with self.assertNumQueries(0):
+            self.assertEqual(counters.get_counter('posts', 'question'), 1)
+
+    def test_listing_count(self):
+        search_state = SearchState.get_empty()
+        self.assertEqual(counters.get_listing_count(search_state, self.user), 1)
+        search_state = search_state.add_tag('two')
+        self.assertEqual(counters.get_listing_count(search_state, self.user), 1)
+        search_state = search_state.add_tag('one')
+        self.assertEqual(counters.get_listing_count(search_state, self.user), None)
+
+    def test_reconcile_counters(self):
+        counters.get_counter('posts', 'question')
+        counters.update_counter(5, 'posts', 'question')
+        self.assertEqual(counters.get_counter('posts', 'question'), 6)
+        call_command('askbot_reconcile_counters')
+        self.assertEqual(counters.get_counter('posts', 'question'), 1)
@@ -9,6 +9,7 @@ from django.urls import reverse
 from django.test.client import Client
 from django.conf import settings
 from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
 from django import forms
 from django.utils import timezone
 from askbot import exceptions as askbot_exceptions
@@ -303,6 +304,7 @@ class GlobalTagSubscriberGetterTests(AskbotTestCase):
     """
     def setUp(self):
         """create two users"""
+        cache.clear()
         schedule = {'q_all': 'i'}
         self.u1 = self.create_user(
                         username = 'user1',
@@ -393,6 +395,27 @@ class GlobalTagSubscriberGetterTests(AskbotTestCase):
             reason = 'bad'
         )
 
+    def test_wildcard_index_follows_tag_selections(self):
+        """cached wildcard index is invalidated when the user edits wildcards"""
+        askbot_settings.update('USE_WILDCARD_TAGS', True)
+        self.assertEqual(
+            models.tag.get_wildcard_subscriber_ids(['day'], 'good'), set()
+        )
+        self.u1.mark_tags(wildcards = ('da*',), reason = 'good', action = 'add')
+        self.assertEqual(
+            models.tag.get_wildcard_subscriber_ids(['day', 'good'], 'good'),
+            set([self.u1.id])
+        )
+        self.u1.mark_tags(wildcards = ('da*',), reason = 'good', action = 'remove')
+        self.u1.mark_tags(wildcards = ('go*',), reason = 'good', action = 'add')
+        self.assertEqual(
+            models.tag.get_wildcard_subscriber_ids(['day'], 'good'), set()
+        )
+        self.assertEqual(
+            models.tag.get_wildcard_subscriber_ids(['good'], 'good'),
+            set([self.u1.id])
+        )
+
     def test_user_dislikes_wildcard_and_matching_tag(self):
         """user ignores tag "day" and ignores a wildcard "da*"
         """
@@ -583,6 +606,37 @@ class GroupTests(AskbotTestCase):
         anon = AnonymousUser()
         self.assertEqual(threads.get_visible(anon).count(), 1)
 
+    def test_post_data_cache_is_keyed_by_visible_groups(self):
+        question = self.post_question(self.u1)
+        thread = question.thread
+        u2 = self.create_user('u2')
+        u3 = self.create_user('u3')
+        group = self.create_group(group_name='private')
+        u2.join_group(group)
+        answer = self.post_answer(question=question, user=u2, is_private=True)
+
+        #u1 and u3 share the cached data, u2 sees the private answer
+        self.assertEqual(len(thread.get_cached_post_data(user=u2)[1]), 1)
+        self.assertEqual(len(thread.get_cached_post_data(user=self.u1)[1]), 0)
+        self.assertEqual(
+            thread.get_post_data_cache_key('votes', user=self.u1),
+            thread.get_post_data_cache_key('votes', user=u3)
+        )
+        with self.assertNumQueries(0):
+            self.assertEqual(len(thread.get_cached_post_data(user=u3)[1]), 0)
+
+        answer.make_public()
+        self.assertEqual(len(thread.get_cached_post_data(user=u3)[1]), 1)
+
+        summary = thread.update_summary_html(visitor=u2)
+        self.assertTrue(thread.summary_html_cached(visitor=u2))
+        self.assertEqual(thread.get_cached_summary_html(visitor=u2), summary)
+        #the answer is public now, so u3 sees the same posts
+        self.assertTrue(thread.summary_html_cached(visitor=u3))
+        self.assertFalse(thread.summary_html_cached())
+        thread.remove_from_groups((group,))
+        self.assertFalse(thread.summary_html_cached(visitor=u2))
+
     def test_thread_answer_count_for_multiple_groups(self):
         question = self.post_question(self.u1)
         group = self.create_group(group_name='private')
@@ -3,18 +3,21 @@ import copy
 import datetime
 import functools
 import time
+from mock import patch
 from django.conf import settings as django_settings
 from django.core import management
+from django.core.cache import cache
 from django.core import serializers
 import django.core.mail
 from django.urls import reverse
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.test.client import Client
 from django.utils import translation, timezone
 from askbot.tests import utils
 from askbot.tests.utils import with_settings
 from askbot import models
 from askbot import mail
+from askbot import tasks
 from askbot.conf import settings as askbot_settings
 from askbot import const
 from askbot.models.question import Thread
@@ -1012,6 +1015,145 @@ class EmailFeedSettingTests(utils.AskbotTestCase):
         self.assertEqual(data_before, data_after)
 
 
+class IncrementalDigestTests(utils.AskbotTestCase):
+    def setUp(self):
+        schedule = copy.deepcopy(models.EmailFeedSetting.NO_EMAIL_SCHEDULE)
+        schedule['q_ask'] = 'd'
+        long_ago = timezone.now() - datetime.timedelta(30)
+        self.asker = self.create_user('asker', notification_schedule=schedule,
+                                      date_joined=long_ago)
+        self.idle = self.create_user('idle', notification_schedule=schedule,
+                                     date_joined=long_ago)
+        self.other = self.create_user('other')
+        two_days_ago = timezone.now() - datetime.timedelta(2)
+        models.EmailFeedSetting.objects.update(reported_at=two_days_ago)
+
+    def test_find_digest_recipients(self):
+        from askbot.management.commands.send_email_alerts import \
+                                        find_digest_recipient_ids
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+
+        now = timezone.now()
+        self.assertEqual(find_digest_recipient_ids(now), set([self.asker.id]))
+
+        #feed of the user without activity is advanced
+        idle_feed = self.idle.notification_subscriptions.get(feed_type='q_ask')
+        self.assertEqual(idle_feed.reported_at, now)
+        asker_feed = self.asker.notification_subscriptions.get(feed_type='q_ask')
+        self.assertTrue(asker_feed.reported_at < now)
+
+    def test_send_email_alerts(self):
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        management.call_command('send_email_alerts')
+        outbox = django.core.mail.outbox
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox[0].recipients(), [self.asker.email])
+
+    def test_send_email_alerts_sharded(self):
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        management.call_command('send_email_alerts', shards=2, shard_index=0)
+        management.call_command('send_email_alerts', shards=2, shard_index=1)
+        outbox = django.core.mail.outbox
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox[0].recipients(), [self.asker.email])
+
+    def test_shards_do_not_depend_on_the_max_user_id(self):
+        from askbot.management.commands import send_email_alerts
+        command = send_email_alerts.Command()
+
+        def get_shard_user_ids(shard_index):
+            checkpoint = {'shard': (2, shard_index), 'last_user_id': 0}
+            return set([user.id for user in command.get_all_users(checkpoint)])
+
+        user_ids = set(models.User.objects.values_list('id', flat=True))
+        shard0 = get_shard_user_ids(0)
+        #users join between the starts of the shards
+        for number in range(5):
+            self.create_user('newcomer%d' % number)
+        shard1 = get_shard_user_ids(1)
+        self.assertEqual(shard0 & shard1, set())
+        self.assertEqual(user_ids - shard0 - shard1, set())
+
+    def test_send_email_alerts_resumes_from_checkpoint(self):
+        from askbot.management.commands import send_email_alerts
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        #pretend that an interrupted run has processed the asker
+        key = send_email_alerts.get_checkpoint_cache_key(1, 0)
+        checkpoint = {
+            'started_at': timezone.now(),
+            'shard': (1, 0),
+            'last_user_id': self.asker.id
+        }
+        cache.set(key, checkpoint)
+        management.call_command('send_email_alerts')
+        self.assertEqual(len(django.core.mail.outbox), 0)
+        self.assertEqual(cache.get(key), None)
+
+    def test_send_email_alerts_retries_over_new_connection(self):
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        #the first attempt fails, as if the server dropped the connection
+        failures = [Exception('server disconnected')]
+        send = mail._send_mail
+        def send_mail(*args, **kwargs):
+            if failures:
+                raise failures.pop()
+            return send(*args, **kwargs)
+        with patch('askbot.mail._send_mail', side_effect=send_mail):
+            management.call_command('send_email_alerts')
+        self.assertEqual(len(django.core.mail.outbox), 1)
+
+    def test_send_email_alerts_keeps_checkpoint_on_failure(self):
+        from askbot.management.commands import send_email_alerts
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        with patch('askbot.mail._send_mail', side_effect=Exception('down')):
+            self.assertRaises(
+                management.CommandError,
+                management.call_command,
+                'send_email_alerts'
+            )
+        key = send_email_alerts.get_checkpoint_cache_key(1, 0)
+        self.assertTrue(cache.get(key)['last_user_id'] < self.asker.id)
+        #the next run sends the digest, the feeds
+        #were not marked reported by the failed run
+        management.call_command('send_email_alerts')
+        outbox = django.core.mail.outbox
+        self.assertEqual(len(outbox), 1)
+        self.assertEqual(outbox[0].recipients(), [self.asker.email])
+
+    def test_send_email_alerts_survives_lost_checkpoint(self):
+        from askbot.management.commands import send_email_alerts
+        question = self.post_question(user=self.asker)
+        self.post_answer(user=self.other, question=question)
+        question = self.post_question(user=self.idle)
+        self.post_answer(user=self.other, question=question)
+
+        outbox = django.core.mail.outbox
+        send = send_email_alerts.Command.send_email_alerts
+        def send_and_crash(command, user):
+            if len(outbox) == 1:
+                raise KeyboardInterrupt
+            send(command, user)
+
+        with patch.object(send_email_alerts.Command,
+                          'send_email_alerts', send_and_crash):
+            self.assertRaises(
+                KeyboardInterrupt,
+                management.call_command,
+                'send_email_alerts'
+            )
+        #the checkpoint is lost, the asker is not emailed again
+        cache.delete(send_email_alerts.get_checkpoint_cache_key(1, 0))
+        management.call_command('send_email_alerts')
+        recipients = [message.recipients() for message in outbox]
+        self.assertEqual(recipients, [[self.asker.email], [self.idle.email]])
+
+
 class EmailAlertTestsWithGroupsEnabled(utils.AskbotTestCase):
 
     def setUp(self):
@@ -1138,3 +1280,35 @@ class MailMessagesTests(utils.AskbotTestCase):
                             'footer_code': 'nothing'
                         }).render_body()
         self.assertTrue(user.username in message)
+
+
+class InstantNotificationBatchTests(utils.AskbotTestCase):
+    def setUp(self):
+        self.subscribers = [
+            self.create_user(
+                username='subscriber%d' % idx,
+                notification_schedule={'q_all': 'i'},
+                status='m'
+            ) for idx in range(3)
+        ]
+        self.author = self.create_user(username='author', status='m')
+
+    @override_settings(ASKBOT_INSTANT_NOTIFICATIONS_BATCH_SIZE=2)
+    @with_settings(REPLY_BY_EMAIL=True, MIN_REP_TO_POST_BY_EMAIL=0)
+    def test_alerts_are_sent_in_batches(self):
+        with patch(
+            'askbot.tasks.send_instant_notifications_batch_celery_task.apply',
+            wraps=tasks.send_instant_notifications_batch_celery_task.apply
+        ) as apply_batch:
+            question = self.post_question(user=self.author)
+
+        self.assertEqual(apply_batch.call_count, 2)
+        outbox = django.core.mail.outbox
+        recipients = set(message.recipients()[0] for message in outbox)
+        expected = set(user.email for user in self.subscribers)
+        self.assertEqual(recipients, expected)
+        #answer and comment addresses for each subscriber
+        reply_addresses = models.ReplyAddress.objects.filter(post=question)
+        self.assertEqual(reply_addresses.count(), 6)
+        reply_to = set(message.extra_headers['Reply-To'] for message in outbox)
+        self.assertEqual(len(reply_to), 3)
@@ -106,3 +106,53 @@ class HaystackSearchTests(AskbotTestCase):
 
         for instance in qs:
            self.assertTrue(isinstance(instance, models.Thread))
+
+
+class HaystackQueueTests(AskbotTestCase):
+    """tests the queue of the index updates,
+    which does not need haystack"""
+
+    def setUp(self):
+        self.user = self.create_user()
+
+    def test_saves_without_indexed_changes_are_skipped(self):
+        from askbot.search.haystack import queue
+        question = self.post_question()
+        thread = question.thread
+        self.assertTrue(queue.has_indexed_changes(thread))
+        thread.view_count += 1
+        self.assertFalse(queue.has_indexed_changes(thread))
+        thread.title = 'New title'
+        self.assertFalse(queue.has_indexed_changes(thread, update_fields=['view_count']))
+        self.assertTrue(queue.has_indexed_changes(thread))
+
+    def test_queued_objects_are_deduplicated(self):
+        from askbot.search.haystack import queue
+        queue.get_queued_items()
+        queue.enqueue('askbot.thread', 1, 'en')
+        queue.enqueue('askbot.thread', 1, 'en')
+        queue.enqueue('askbot.thread', 2, 'de')
+        queue.enqueue('auth.user', 1)
+        self.assertEqual(
+            queue.get_queued_items(),
+            {'askbot.thread': {1: 'en', 2: 'de'}, 'auth.user': {1: None}}
+        )
+        self.assertEqual(queue.get_queued_items(), {})
+        #objects are queued again after the flush
+        queue.enqueue('askbot.thread', 1, 'en')
+        self.assertEqual(queue.get_queued_items(), {'askbot.thread': {1: 'en'}})
+
+    def test_profile_changes_are_detected(self):
+        from askbot.search.haystack import queue
+        profile = models.get_profile(self.user)
+        self.assertTrue(queue.has_indexed_changes(profile))
+        profile.reputation += 1
+        self.assertFalse(queue.has_indexed_changes(profile))
+        profile.location = 'Lisbon'
+        self.assertTrue(queue.has_indexed_changes(profile))
+        self.assertEqual(queue.get_profile_user_id(profile), self.user.id)
+        localized_profile = models.LocalizedUserProfile.objects.create(
+                                        auth_user=self.user, about='hello'
+                                    )
+        self.assertTrue(queue.has_indexed_changes(localized_profile))
+        self.assertEqual(queue.get_profile_user_id(localized_profile), self.user.id)
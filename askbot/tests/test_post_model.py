@@ -2,6 +2,8 @@ import copy
 import datetime
 from operator import attrgetter
 import time
+from mock import patch
+from askbot.search.paginator import QuestionsPaginator, decode_cursor
 from askbot.search.state_manager import SearchState
 from django.conf import settings as django_settings
 from django.contrib.auth.models import User
@@ -18,12 +20,14 @@ from askbot.models import Post
 from askbot.models import PostRevision
 from askbot.models import Thread
 from askbot.models import Tag
+from askbot.models.tag import get_tag_filter_profile, resolve_tag_names
 from askbot.models import Group
 from askbot.search.state_manager import DummySearchState
 import simplejson
 from django.utils import timezone
 from askbot.tests.utils import skipIf, with_settings
 from askbot.conf import settings as askbot_settings
+from askbot import const
 
 
 class PostModelTests(AskbotTestCase):
@@ -129,6 +133,27 @@ class PostModelTests(AskbotTestCase):
 
         del self.user
 
+    def test_revision_precaching(self):
+        question = self.post_question(user=self.u1)
+        question.apply_edit(edited_by=self.u2, text='blah2', comment='blahc2')
+        question.apply_edit(edited_by=self.u3, text='blah3', comment='blahc3')
+        answer = self.post_answer(user=self.u2, question=question)
+
+        posts = list(Post.objects.filter(id__in=(question.id, answer.id)))
+        with self.assertNumQueries(2):
+            Post.objects.precache_revisions(posts)
+
+        post_map = dict([(post.id, post) for post in posts])
+        with self.assertNumQueries(0):
+            question = post_map[question.id]
+            self.assertEqual(question.get_earliest_revision().revision, 1)
+            self.assertEqual(question.get_earliest_revision().author, self.u1)
+            self.assertEqual(question.get_latest_revision().revision, 3)
+            self.assertEqual(question.get_latest_revision().author, self.u3)
+            answer = post_map[answer.id]
+            self.assertEqual(answer.get_earliest_revision().revision, 1)
+            self.assertEqual(answer.get_latest_revision().revision, 1)
+
     def test_cached_get_absolute_url_1(self):
         th = lambda:1
         th.title = 'lala-x-lala'
@@ -243,6 +268,68 @@ class ThreadTagModelsTests(AskbotTestCase):
         qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
         self.assertEqual(1, qs.count())
 
+    @with_settings(TAG_SEARCH_INPUT_ENABLED=True)
+    def test_run_adv_search_tag_resolution(self):
+        ss = SearchState.get_empty().add_tag('TAG6').add_tag('nosuchtag')
+        qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
+        self.assertEqual(2, qs.count())
+        self.assertEqual(['nosuchtag'], meta_data['non_existing_tags'])
+
+        #both the hit and the miss are now resolved from the cache
+        with self.assertNumQueries(0):
+            resolved = resolve_tag_names(['TAG6', 'nosuchtag'], 'en')
+        self.assertEqual(['TAG6'], list(resolved.keys()))
+
+        #newly created tag resets the cached miss
+        self.post_question(tags='nosuchtag')
+        resolved = resolve_tag_names(['nosuchtag'], 'en')
+        self.assertEqual('nosuchtag', resolved['nosuchtag'][1])
+
+    def test_run_adv_search_tag_filter_profile(self):
+        self.user.display_tag_filter_strategy = const.INCLUDE_INTERESTING
+        self.user.save()
+        self.user.mark_tags(tagnames=['tag6'], reason='good', action='add')
+        ss = SearchState.get_empty()
+        qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
+        self.assertEqual(set([self.q3.thread_id, self.q4.thread_id]), set(qs.values_list('id', flat=True)))
+        self.assertEqual(['tag6'], meta_data['interesting_tag_names'])
+
+        #marking more tags resets the cached profile
+        self.user.mark_tags(tagnames=['tag5'], reason='good', action='add')
+        qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
+        self.assertEqual(3, qs.count())
+
+        #so does renaming the marked tag
+        tag = Tag.objects.get(name='tag5')
+        tag.name = 'tag5-renamed'
+        tag.save()
+        profile = get_tag_filter_profile(self.user, 'en')
+        self.assertEqual(set(['tag5-renamed', 'tag6']), set(profile['good']['names']))
+
+    def test_run_adv_search_keyset_pages(self):
+        for sort in ('activity-desc', 'age-asc', 'votes-desc', 'answers-asc'):
+            ss = SearchState.get_empty().change_sort(sort)
+            qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
+            expected_ids = list(qs.values_list('id', flat=True))
+
+            paginator = QuestionsPaginator(qs, 3, sort=sort)
+            page = paginator.page(1)
+            self.assertEqual(expected_ids[:3], [thread.id for thread in page.object_list])
+            self.assertTrue(page.next_cursor)
+
+            paginator = QuestionsPaginator(qs, 3, sort=sort, cursor=page.next_cursor)
+            page = paginator.page(2)
+            self.assertEqual(expected_ids[3:], [thread.id for thread in page.object_list])
+            self.assertEqual(page.next_cursor, None)
+
+    def test_keyset_cursor_must_match_sort(self):
+        ss = SearchState.get_empty()
+        qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
+        cursor = QuestionsPaginator(qs, 2, sort='activity-desc').page(1).next_cursor
+        self.assertEqual(decode_cursor(cursor, 'age-desc'), None)
+        self.assertEqual(decode_cursor('garbage', 'activity-desc'), None)
+        self.assertEqual(decode_cursor(cursor, 'activity-desc')[1], qs[1].id)
+
     def test_run_adv_search_query_author(self):
         ss = SearchState(scope=None, sort=None, query="@user", tags=None, author=None, page=None, user_logged_in=None)
         qs, meta_data = Thread.objects.run_advanced_search(request_user=self.user, search_state=ss)
@@ -309,6 +396,65 @@ class ThreadTagModelsTests(AskbotTestCase):
             self.assertEqual(thread.last_activity_by, thread._last_activity_by_cache)
 
 
+    def test_similar_threads_index(self):
+        def get_similar_ids(question):
+            records = question.thread.similar_thread_records.order_by('-score')
+            return list(records.values_list('similar_thread_id', flat=True))
+
+        #index is maintained as questions are asked
+        self.assertEqual(get_similar_ids(self.q1), [self.q4.thread_id, self.q2.thread_id])
+        self.assertEqual(get_similar_ids(self.q3), [self.q4.thread_id])
+        similar = self.q1.thread.get_similar_threads().data()
+        self.assertEqual(
+            [item['url'] for item in similar],
+            [self.q4.get_absolute_url(), self.q2.get_absolute_url()]
+        )
+
+        #retagged thread enters the lists of the neighbors
+        self.q3.thread.retag(
+                        retagged_by=self.user,
+                        retagged_at=timezone.now(),
+                        tagnames='tag1 tag2'
+                    )
+        self.assertEqual(
+            get_similar_ids(self.q1),
+            [self.q4.thread_id, self.q3.thread_id, self.q2.thread_id]
+        )
+        #and leaves the lists of the former neighbors,
+        #which recalculate their lists
+        from askbot import tasks
+        with patch(
+            'askbot.tasks.update_similar_threads_celery_task.apply',
+            wraps=tasks.update_similar_threads_celery_task.apply
+        ) as apply_task:
+            self.q3.thread.retag(
+                            retagged_by=self.user,
+                            retagged_at=timezone.now(),
+                            tagnames='tag7'
+                        )
+        recalculated_ids = set([
+            call[1]['args'][0] for call in apply_task.call_args_list
+            if call[1].get('kwargs') == {'update_neighbors': False}
+        ])
+        self.assertEqual(
+            recalculated_ids,
+            set([self.q1.thread_id, self.q4.thread_id])
+        )
+        self.assertEqual(get_similar_ids(self.q3), [])
+        self.assertNotIn(self.q3.thread_id, get_similar_ids(self.q1))
+        self.assertNotIn(self.q3.thread_id, get_similar_ids(self.q4))
+        self.assertEqual(
+            get_similar_ids(self.q1),
+            [item[0] for item in self.q1.thread.get_similar_thread_scores()]
+        )
+
+    def test_similar_threads_fallback_is_bounded(self):
+        self.q1.thread.similar_thread_records.all().delete()
+        with patch('askbot.models.question.SIMILAR_THREADS_FALLBACK_ROWS', 1):
+            similar = self.q1.thread.get_similar_threads().data()
+        self.assertEqual(len(similar), 1)
+
+
 class ThreadRenderLowLevelCachingTests(AskbotTestCase):
     def setUp(self):
         self.create_user()
@@ -423,7 +569,7 @@ class ThreadRenderLowLevelCachingTests(AskbotTestCase):
 
         ###
         cache.cache.delete(key)
-        thread.update_summary_html = lambda dummy: "Monkey-patched <<<tag2>>>"
+        thread.render_summary_html = lambda dummy: "Monkey-patched <<<tag2>>>"
 
         self.assertFalse(thread.summary_html_cached())
         self.assertIsNone(thread.get_cached_summary_html())
@@ -434,6 +580,40 @@ class ThreadRenderLowLevelCachingTests(AskbotTestCase):
 
 
 
+    def test_summary_tag_urls_benchmark(self):
+        """renders a page of summaries with many tags,
+        tag urls must be built once per page"""
+        cache.cache = LocMemCache('', {})  # Enable local caching
+
+        thread = self.q.thread
+        tag_names = ['tag%d' % i for i in range(40)]
+        placeholders = ' '.join(['<<<%s>>>' % name for name in tag_names])
+        html = '<div>%s</div><p>%s</p>' % (placeholders, placeholders)
+        cache.cache.set(thread.get_summary_cache_key(), html, timeout=100)
+
+        search_state = SearchState.get_empty()
+        add_tag = search_state.add_tag
+        added_tags = list()
+        def counting_add_tag(tag):
+            added_tags.append(tag)
+            return add_tag(tag)
+        search_state.add_tag = counting_add_tag
+
+        page_size = 50
+        started_at = time.time()
+        for _ in range(page_size):
+            filled_html = thread.get_summary_html(search_state=search_state)
+        elapsed = time.time() - started_at
+
+        expected_urls = [SearchState.get_empty().add_tag(name).full_url() for name in tag_names]
+        expected_html = '<div>%s</div><p>%s</p>' % (' '.join(expected_urls), ' '.join(expected_urls))
+        self.assertEqual(filled_html, expected_html)
+        self.assertEqual(
+            added_tags, tag_names,
+            'tag urls rebuilt for every summary, page rendered in %.3fs' % elapsed
+        )
+
+
 class ThreadRenderCacheUpdateTests(AskbotTestCase):
     def setUp(self):
         self.create_user()
@@ -658,7 +838,10 @@ class ThreadRenderCacheUpdateTests(AskbotTestCase):
 
         thread = Thread.objects.get(id=question.thread.id)
 
-        self.assertTrue(thread.summary_html_cached())  # <<< make sure that caching backend is set up properly (i.e. it's not dummy)
+        # summary is rendered on the next read after the vote
+        self.assertFalse(thread.summary_html_cached())
+        thread.get_summary_html(search_state=SearchState.get_empty())
+        self.assertTrue(thread.summary_html_cached())
         html = self._html_for_question(thread._question_post())
         self.assertEqual(html, thread.get_cached_summary_html())
 
@@ -677,10 +860,41 @@ class ThreadRenderCacheUpdateTests(AskbotTestCase):
 
         thread = Thread.objects.get(id=question.thread.id)
 
-        self.assertTrue(thread.summary_html_cached())  # <<< make sure that caching backend is set up properly (i.e. it's not dummy)
+        # summary is rendered on the next read after the vote
+        self.assertFalse(thread.summary_html_cached())
+        thread.get_summary_html(search_state=SearchState.get_empty())
+        self.assertTrue(thread.summary_html_cached())
         html = self._html_for_question(thread._question_post())
         self.assertEqual(html, thread.get_cached_summary_html())
 
+    def test_vote_invalidates_cached_post_data(self):
+        question = self.post_question()
+        answer = self.post_answer(question=question)
+        comment = self.post_comment(parent_post=answer)
+        thread = Thread.objects.get(id=question.thread.id)
+        for sort_method in ('latest', 'votes'):
+            thread.get_cached_post_data(sort_method=sort_method)
+
+        self.user2.upvote(comment)
+        self.user2.upvote(question)
+        self.user2.downvote(answer)
+
+        for sort_method in ('latest', 'votes'):
+            key = thread.get_post_data_cache_key(sort_method)
+            self.assertEqual(cache.cache.get(key), None)
+
+        cached_question, answers = thread.get_cached_post_data(sort_method='latest')[:2]
+        self.assertEqual(cached_question.points, 1)
+        self.assertEqual(cached_question.vote_up_count, 1)
+        self.assertEqual(answers[0].points, -1)
+        self.assertEqual(answers[0].vote_down_count, 1)
+        self.assertEqual(answers[0].get_cached_comments()[0].points, 1)
+
+        self.assertEqual(Thread.objects.get(id=thread.id).points, 1)
+        self.user2.upvote(question, cancel=True)
+        self.assertEqual(Thread.objects.get(id=thread.id).points, 0)
+        self.assertEqual(Post.objects.get(id=question.id).vote_up_count, 0)
+
     def test_question_accept_answer(self):
         question = self.post_question(user=self.user2)
         answer = self.post_answer(question=question)
@@ -1,7 +1,7 @@
 from askbot.tests.utils import AskbotTestCase
 from askbot.search.state_manager import SearchState
 import askbot.conf
-from django.urls import reverse
+from django.urls import resolve, reverse
 
 
 class SearchStateTests(AskbotTestCase):
@@ -290,3 +290,15 @@ class SearchStateTests(AskbotTestCase):
             ss.query_string()
         )
 
+    def test_cursor(self):
+        ss = SearchState.get_empty().change_page_by_cursor(2, 'abc-_1')
+        self.assertEqual(
+            'scope:all/sort:activity-desc/page:2/cursor:abc-_1/',
+            ss.query_string()
+        )
+        match = resolve(ss.full_url())
+        self.assertEqual(match.kwargs['cursor'], 'abc-_1')
+        #any change of the state drops the cursor
+        self.assertEqual(ss.change_page(3).cursor, None)
+        self.assertEqual(ss.change_sort('age-desc').cursor, None)
+        self.assertEqual(ss.add_tag('tag1').cursor, None)
@@ -1,11 +1,16 @@
+from django.core.cache import cache
+from mock import patch
+from django.test.utils import override_settings
 from django.utils import timezone
 from askbot.tests.utils import AskbotTestCase
 from askbot import models
+from askbot.models.user_profile import UserProfile
 from datetime import timedelta
 
 class SignalHandlerTests(AskbotTestCase):
 
     def setUp(self):
+        cache.clear()
         self.user = self.create_user('user1')
 
     def test_record_user_visit(self):
@@ -17,3 +22,41 @@ class SignalHandlerTests(AskbotTestCase):
         models.record_user_visit(self.user, tomorrow)
         user = self.reload_object(self.user)
         self.assertEqual(user.consecutive_days_visit_count, 1)
+
+    @override_settings(ASKBOT_VISIT_RECORDING_INTERVAL=600, CELERY_ALWAYS_EAGER=False)
+    @patch('askbot.tasks.write_pending_user_visit_celery_task.apply_async')
+    def test_record_user_visit_buffered(self, apply_async):
+        today = timezone.now().replace(hour=10)
+        self.user.last_seen = today
+        self.user.save()
+
+        def get_db_last_seen():
+            return UserProfile.objects.get(pk=self.user.pk).last_seen
+
+        #first visit within the interval is written to the database
+        visit1 = today + timedelta(minutes=1)
+        models.record_user_visit(self.user, visit1)
+        self.assertEqual(get_db_last_seen(), visit1)
+
+        #subsequent visits are kept in the cached profile only
+        visit2 = today + timedelta(minutes=2)
+        with self.assertNumQueries(0):
+            models.record_user_visit(self.user, visit2)
+        self.assertEqual(get_db_last_seen(), visit1)
+        user = self.reload_object(self.user)
+        self.assertEqual(user.last_seen, visit2)
+
+        #skipped visits are written at the end of the interval, once
+        visit3 = today + timedelta(minutes=3)
+        models.record_user_visit(self.user, visit3)
+        self.assertEqual(apply_async.call_count, 1)
+        self.assertEqual(apply_async.call_args[1]['countdown'], 600)
+        models.write_pending_user_visit(self.user.pk)
+        self.assertEqual(get_db_last_seen(), visit3)
+
+        #day rollover is written right away
+        tomorrow = today + timedelta(1)
+        models.record_user_visit(self.user, tomorrow)
+        self.assertEqual(get_db_last_seen(), tomorrow)
+        profile = UserProfile.objects.get(pk=self.user.pk)
+        self.assertEqual(profile.consecutive_days_visit_count, 1)
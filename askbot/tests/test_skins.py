@@ -67,3 +67,23 @@ class SkinTests(TestCase):
         self.assertTrue(logo_url.startswith(django_settings.MEDIA_URL))
         response = self.client.get(logo_url, follow=True)
         self.assertTrue(response.status_code == 200)
+
+    def test_media_url_is_memoized_by_revision(self):
+        revision = askbot_settings.MEDIA_RESOURCE_REVISION
+        url = skin_utils.get_media_url('images/logo.gif')
+        key = ('images/logo.gif', 'default', revision)
+        self.assertEqual(skin_utils.MEDIA_TABLES['urls'][key], url)
+
+        askbot_settings.update('MEDIA_RESOURCE_REVISION', revision + 1)
+        try:
+            new_url = skin_utils.get_media_url('images/logo.gif')
+        finally:
+            askbot_settings.update('MEDIA_RESOURCE_REVISION', revision)
+        self.assertTrue(new_url.endswith('?v=%d' % (revision + 1)))
+        self.assertFalse(key in skin_utils.MEDIA_TABLES['urls'])
+
+    def test_missing_media_is_logged_once(self):
+        with self.assertLogs(level='CRITICAL') as logs:
+            self.assertEqual(skin_utils.get_media_url('images/missing.gif'), None)
+            self.assertEqual(skin_utils.get_media_url('images/missing.gif'), None)
+        self.assertEqual(len(logs.records), 1)
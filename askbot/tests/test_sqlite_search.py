@@ -0,0 +1,121 @@
+"""Tests of the SQLite full text search index and queries"""
+from django.core import management
+from django.db import connection
+from django.test import override_settings
+from askbot.search import sqlite
+from askbot.search.state_manager import SearchState
+from askbot.tests.utils import AskbotTestCase, skipIf
+from askbot import models
+
+
+@skipIf(not sqlite.supports_full_text_search(), 'needs SQLite with FTS5')
+@override_settings(ASKBOT_SQLITE_FULL_TEXT_SEARCH_ENABLED=True)
+class SqliteSearchTests(AskbotTestCase):
+
+    def setUp(self):
+        sqlite.create_index_tables()
+        self.user = self.create_user('gepeto')
+        self.other_user = self.create_user('pinocho')
+        self.other_user.update_localized_profile(about='made of wood')
+        self.question1 = self.post_question(
+                                user=self.user,
+                                title='Carving puppets',
+                                body_text='which knife is good for the pine wood?',
+                                tags='wood knives'
+                            )
+        self.question2 = self.post_question(
+                                user=self.other_user,
+                                title='Growing noses',
+                                body_text='how long can a nose grow?',
+                                tags='noses'
+                            )
+        self.post_answer(
+                    user=self.other_user,
+                    question=self.question2,
+                    body_text='it grows with every lie, even about wood'
+                )
+
+    def get_thread_ids(self, query_set):
+        return [thread.id for thread in query_set]
+
+    def test_thread_search_ranks_by_relevance(self):
+        threads = models.Thread.objects.get_for_query('wood')
+        threads = threads.order_by('-relevance')
+        self.assertEqual(
+            self.get_thread_ids(threads),
+            [self.question1.thread.id, self.question2.thread.id]
+        )
+        #prefix search
+        threads = models.Thread.objects.get_for_query('nos')
+        self.assertEqual(self.get_thread_ids(threads), [self.question2.thread.id])
+
+    def test_advanced_search_sorted_by_relevance(self):
+        search_state = SearchState(
+                                scope='all', sort='relevance-desc',
+                                query='wood', user_logged_in=True
+                            )
+        threads, meta_data = models.Thread.objects.run_advanced_search(
+                                request_user=self.user, search_state=search_state
+                            )
+        self.assertEqual(
+            self.get_thread_ids(threads),
+            [self.question1.thread.id, self.question2.thread.id]
+        )
+
+    def test_title_search(self):
+        threads = models.Thread.objects.get_for_title_query('wood')
+        self.assertEqual(self.get_thread_ids(threads), [self.question1.thread.id])
+
+    def test_index_is_updated(self):
+        self.post_answer(
+                    user=self.user,
+                    question=self.question1,
+                    body_text='use a chisel'
+                )
+        threads = models.Thread.objects.get_for_query('chisel')
+        self.assertEqual(self.get_thread_ids(threads), [self.question1.thread.id])
+
+        #text of the deleted posts is removed from the index
+        self.user.delete_question(self.question1)
+        threads = models.Thread.objects.get_for_query('knife')
+        self.assertEqual(self.get_thread_ids(threads), [])
+
+    def test_all_words_are_required(self):
+        threads = models.Thread.objects.get_for_query('wood knife')
+        self.assertEqual(self.get_thread_ids(threads), [self.question1.thread.id])
+
+    def test_post_search(self):
+        posts = models.Post.objects.get_by_text_query('lie')
+        answer = self.question2.thread.posts.get(post_type='answer')
+        self.assertEqual([post.id for post in posts], [answer.id])
+        #text of the deleted posts is removed from the index
+        self.user.delete_question(self.question1)
+        posts = models.Post.objects.get_by_text_query('knife')
+        self.assertEqual(list(posts), [])
+
+    def test_index_tables_are_missing(self):
+        cursor = connection.cursor()
+        for table in sqlite.INDEX_TABLES:
+            cursor.execute('DROP TABLE ' + table)
+        sqlite.HAS_INDEX_TABLES = False
+        #saves do not fail and the search falls back to the substring search
+        self.post_answer(
+                    user=self.user,
+                    question=self.question1,
+                    body_text='use a chisel'
+                )
+        self.assertFalse(sqlite.can_search('chisel'))
+        threads = models.Thread.objects.get_for_query('chisel')
+        self.assertEqual(self.get_thread_ids(threads), [self.question1.thread.id])
+
+    def test_user_search(self):
+        users = models.get_users_by_text_query('wood')
+        self.assertEqual([user.id for user in users], [self.other_user.id])
+        users = models.get_users_by_text_query('gepe')
+        self.assertEqual([user.id for user in users], [self.user.id])
+
+    def test_rebuild_index(self):
+        models.Thread.objects.filter(id=self.question2.thread.id).update(title='Lying')
+        management.call_command('askbot_rebuild_sqlite_search_index', verbosity=0)
+        threads = models.Thread.objects.get_for_query('lying')
+        self.assertEqual(self.get_thread_ids(threads), [self.question2.thread.id])
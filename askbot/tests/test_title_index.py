@@ -0,0 +1,81 @@
+"""Tests of the in-memory index of the thread titles"""
+from django.urls import reverse
+import simplejson
+from askbot.search import title_index
+from askbot.tests.utils import AskbotTestCase
+
+
+class TitleIndexTests(AskbotTestCase):
+
+    def setUp(self):
+        self.user = self.create_user()
+        self.index = title_index.TitleIndex()
+
+    def search(self, query, **kwargs):
+        return [entry['title'] for entry in self.index.search(query, **kwargs)]
+
+    def test_prefix_search(self):
+        question1 = self.post_question(title='Installing askbot on windows', tags='install')
+        question2 = self.post_question(title='How to install python', tags='python')
+        self.assertEqual(
+            self.search('inst'),
+            ['How to install python', 'Installing askbot on windows']
+        )
+        self.assertEqual(self.search('inst win'), ['Installing askbot on windows'])
+        self.assertEqual(self.search('inst', tag_name='python'), ['How to install python'])
+        entry = self.index.search('python')[0]
+        self.assertEqual(entry['url'], question2.get_absolute_url())
+        self.assertEqual(entry['answer_count'], 0)
+
+    def test_index_is_updated_incrementally(self):
+        question = self.post_question(title='Installing askbot')
+        self.assertEqual(self.search('askbot'), ['Installing askbot'])
+        version = self.index.version
+
+        self.post_answer(question=question, user=self.user)
+        thread = question.thread
+        thread.title = 'Upgrading askbot'
+        thread.save()
+        with self.assertNumQueries(3):
+            self.assertEqual(self.search('askbot'), ['Upgrading askbot'])
+        self.assertTrue(self.index.version > version)
+        self.assertEqual(self.search('install'), [])
+        self.assertEqual(self.index.search('upgr')[0]['answer_count'], 1)
+
+        self.user.delete_question(question)
+        self.assertEqual(self.search('askbot'), [])
+
+    def test_index_is_rebuilt_when_changes_are_lost(self):
+        self.post_question(title='Installing askbot')
+        self.search('askbot')
+        title_index.cache.delete(title_index.get_change_key(self.index.version))
+        self.post_question(title='Upgrading askbot')
+        self.assertEqual(self.search('askbot'), ['Upgrading askbot', 'Installing askbot'])
+
+    def test_index_is_rebuilt_when_change_log_starts_over(self):
+        self.post_question(title='Installing askbot')
+        self.search('askbot')
+        epoch = self.index.epoch
+        title_index.cache.clear()
+        self.post_question(title='Upgrading askbot')
+        self.assertEqual(self.search('askbot'), ['Upgrading askbot', 'Installing askbot'])
+        self.assertNotEqual(self.index.epoch, epoch)
+
+    def test_refresh_without_changes_is_noop(self):
+        self.post_question(title='Installing askbot')
+        self.search('askbot')
+        with self.assertNumQueries(0):
+            self.index.refresh()
+
+    def test_cold_index_is_built_after_response(self):
+        self.post_question(title='Installing askbot')
+        index = title_index.get_index(None)
+        index.version = None
+        data = {'query_text': 'askbot'}
+        response = self.client.get(reverse('api_get_questions'), data)
+        #titles are searched in the database
+        titles = [item['title'] for item in simplejson.loads(response.content)]
+        self.assertEqual(titles, ['Installing askbot'])
+        #index is built when the response is closed
+        self.assertTrue(index.is_built())
+        self.assertEqual(title_index.PENDING_BUILDS, set())
@@ -1,5 +1,7 @@
 from askbot.tests.utils import AskbotTestCase, with_settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
+from mock import patch
 from askbot import models
 from askbot.conf import settings
 from askbot import signals
@@ -96,3 +98,40 @@ class UserModelTests(AskbotTestCase):
         user = self.create_user('user')
         user.username = 'user2'
         user.save()
+
+    def test_get_profile_reuses_attached_profile(self):
+        user = self.create_user('user')
+        user = User.objects.get(id=user.id)
+        with patch('askbot.models.user_profile.cache') as cache:
+            cache.get.return_value = None
+            user.reputation
+            user.gold
+            self.assertEqual(cache.get.call_count, 1)
+
+    def test_prefetch_profiles(self):
+        user1 = self.create_user('user1')
+        user2 = self.create_user('user2', reputation=25)
+        users = list(User.objects.filter(id__in=(user1.id, user2.id)).order_by('id'))
+        #one of the profiles is missing in the cache
+        cache.delete(models.user_profile.get_profile_cache_key(user2))
+        with self.assertNumQueries(1):
+            models.prefetch_profiles(users)
+        with self.assertNumQueries(0):
+            self.assertEqual(users[1].reputation, 25)
+            self.assertEqual(users[0].reputation, user1.reputation)
+
+    def test_cached_post_data_has_no_attached_profiles(self):
+        user = self.create_user('user1')
+        question = self.post_question(user=user)
+        question.author.reputation #attaches the profile
+        thread = question.thread
+        cached_question = thread.get_cached_post_data(sort_method='latest')[0]
+        self.assertEqual(
+            models.user_profile.get_attached_profile(cached_question.author), None
+        )
+        #reputation changed after the post data was cached
+        profile = models.get_profile(user)
+        profile.reputation = 77
+        profile.save()
+        cached_question = thread.get_cached_post_data(sort_method='latest')[0]
+        self.assertEqual(cached_question.author.reputation, 77)
@@ -1,6 +1,7 @@
 import os
 import markdown2
 from django.conf import settings as django_settings
+from django.core.cache import cache
 from django.test import TestCase
 from askbot.tests.utils import with_settings
 from askbot.utils.url_utils import urls_equal
@@ -11,6 +12,7 @@ from askbot.utils.html import sanitize_html
 from askbot.utils import html as html_utils
 from askbot.utils.markup import get_parser
 from askbot.utils.functions import list_directory_files
+from askbot.utils.cache import delete_memoized, memoize
 from askbot.conf import settings as askbot_settings
 import askbot
 
@@ -147,6 +149,26 @@ class GetParserTest(TestCase):
         parser = get_parser('askbot.tests.utils.Markdown')
         self.assertIsInstance(parser, markdown2.Markdown)
 
+    def test_parser_is_reused(self):
+        self.assertIs(get_parser(), get_parser())
+
+    def test_parser_is_rebuilt_on_settings_change(self):
+        parser = get_parser()
+
+        @with_settings(
+            ENABLE_AUTO_LINKING=True,
+            AUTO_LINK_PATTERNS='#bug(\\d+)',
+            AUTO_LINK_URLS='http://example.com/bug/\\1'
+        )
+        def get_autolinking_parser():
+            return get_parser()
+
+        autolinking_parser = get_autolinking_parser()
+        self.assertIsNot(parser, autolinking_parser)
+        html = autolinking_parser.convert('see #bug123')
+        self.assertIn('http://example.com/bug/123', html)
+        self.assertIsNot(get_parser(), autolinking_parser)
+
 
 class SanitizeHtml(TestCase):
     def test_sanitize_html(self):
@@ -173,3 +195,55 @@ class SanitizeHtml(TestCase):
         self.assertIn('id="foo"', new_html)
         self.assertIn('class="bar"', new_html)
         delattr(django_settings, 'ASKBOT_ALLOWED_HTML_ATTRIBUTES')
+
+
+class MemoizeTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.calls = list()
+
+    def get_function(self, **kwargs):
+        @memoize(**kwargs)
+        def func(a, b=None):
+            self.calls.append((a, b))
+            return None
+        return func
+
+    def test_args_and_kwargs_share_keys(self):
+        func = self.get_function()
+        func(1, 2)
+        func(1, b=2)
+        func(a=1, b=2)
+        self.assertEqual(self.calls, [(1, 2)])
+        func(2, 1)
+        self.assertEqual(self.calls, [(1, 2), (2, 1)])
+
+    def test_none_result_is_cached(self):
+        func = self.get_function()
+        self.assertEqual(func(1), None)
+        self.assertEqual(func(1), None)
+        self.assertEqual(len(self.calls), 1)
+
+    def test_delete_and_invalidate(self):
+        func = self.get_function()
+        func(1)
+        func(2)
+        delete_memoized(func, 1)
+        func(1)
+        func(2)
+        self.assertEqual(self.calls, [(1, None), (2, None), (1, None)])
+        func.invalidate()
+        func(2)
+        self.assertEqual(len(self.calls), 4)
+
+    def test_local_memo(self):
+        func = self.get_function(local_size=1)
+        func(1)
+        cache.clear()
+        func(1)
+        self.assertEqual(len(self.calls), 1)
+        #least recently used result is dropped
+        func(2)
+        cache.clear()
+        func(1)
+        self.assertEqual(len(self.calls), 3)
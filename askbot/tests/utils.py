@@ -109,6 +109,8 @@ class AskbotTestCase(TestCase):
 
     def _fixture_setup(self):
         super(AskbotTestCase, self)._fixture_setup()
+        #cached data is keyed by object ids, which are reused between tests
+        cache.clear()
         for app_config in apps.get_app_configs():
             create_contenttypes(app_config)
             create_permissions(app_config)
@@ -1,18 +1,35 @@
 """Cache utilities"""
 from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+import collections
 import functools
+import hashlib
 import inspect
+import threading
+import time
+import uuid
 from django.db.models import Model
+from askbot.utils import cache_stats
+
+#seconds, for how long a single computation of a value may hold the lock
+LOCK_TIMEOUT = 30
+#seconds, for how long the callers may wait for a computation by another caller
+WAIT_TIMEOUT = 5
+#seconds between the checks for the value computed by another caller
+POLL_INTERVAL = 0.05
+#seconds, for how long stale copies outlive the values
+STALE_TIMEOUT = 24 * 3600
+
+#placeholder of the missing values, as None may be a memoized result
+MISSING = object()
+
 
 def django_repr(obj):
     """repr that reliably identifies instances django db models,
     including "deferred" objects"""
     if isinstance(obj, Model):
-        if obj._deferred:
-            cls = repr(obj._meta.proxy_for_model)
-        else:
-            cls = repr(obj.__class__)
-        return cls + ',id=' + repr(obj.id)
+        meta = obj._meta.concrete_model._meta
+        return '%s.%s,id=%r' % (meta.app_label, meta.model_name, obj.pk)
     return repr(obj)
 
 
@@ -21,49 +38,223 @@ def get_args_key(*args):
 
 
 def get_kwargs_key(**kwargs):
-    key = get_args_key(*list(kwargs.values()))
-    return key or ''
-    #todo: delete above line when args and kwargs resolution is fixed
-    items = list(kwargs.items())
-    items = [(django_repr(v[0]), django_repr(v[1])) for v in items]
-    items.sort(items)
-    return ':'.join([v[0] + '=' + v[1] for v in items])
+    items = sorted(kwargs.items())
+    return ':'.join([name + '=' + django_repr(value) for name, value in items])
+
+
+def get_function_name(func):
+    return func.__module__ + '.' + func.__qualname__
 
 
 def make_cache_key(func, *args, **kwargs):
-    """returns cache key for a function and the full set of its arguments"""
-    bits = [func.__name__,]
-    #todo: make proper resolution of args and kwargs
-    #as it is possible to mask kwarg as arg
-    args_key = get_args_key(*args)
-    if args_key:
-        bits.append(args_key)
-    kwargs_key = get_kwargs_key(**kwargs)
-    if kwargs_key:
-        bits.append(kwargs_key)
-    return ':'.join(bits).replace(' ', '')
-
-
-def get_recached(key, func, *args, **kwargs):
-    """calculates result of the function, caches the result
-    and returns the same result"""
-    val = func(*args, **kwargs)
-    cache.set(key, val)
-    return val
-
-
-def memoize(func):
+    """returns cache key for a function and the full set of its arguments,
+    arguments are resolved by the function signature, so that
+    the same call made with positional or keyword arguments
+    gets the same key"""
+    try:
+        bound = inspect.signature(func).bind(*args, **kwargs)
+    except (TypeError, ValueError):
+        args_key = get_args_key(*args) + '|' + get_kwargs_key(**kwargs)
+    else:
+        bound.apply_defaults()
+        args_key = get_kwargs_key(**bound.arguments)
+    args_hash = hashlib.md5(args_key.encode('utf-8')).hexdigest()
+    return 'memoized-%s-%s' % (get_function_name(func), args_hash)
+
+
+class LocalMemo(object):
+    """in-process LRU store of the memoized values,
+    with expiration of the values"""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self.items = collections.OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.items.get(key)
+            if item is None:
+                return MISSING
+            if item[0] < time.time():
+                del self.items[key]
+                return MISSING
+            self.items.move_to_end(key)
+            return item[1]
+
+    def set(self, key, value):
+        with self.lock:
+            self.items[key] = (time.time() + self.timeout, value)
+            self.items.move_to_end(key)
+            while len(self.items) > self.size:
+                self.items.popitem(last=False)
+
+    def delete(self, key):
+        with self.lock:
+            self.items.pop(key, None)
+
+    def clear(self):
+        with self.lock:
+            self.items.clear()
+
+
+def memoize(func=None, timeout=DEFAULT_TIMEOUT, local_size=0, local_timeout=60):
     """decorator that will automatically cache
-    results of the function call
+    results of the function call, including ``None`` and other
+    false values.
+
+    Can be used as ``@memoize`` or with parameters:
+
+    * ``timeout`` - seconds, for how long the results are cached
+    * ``local_size`` - if not zero, up to that many results are
+      also kept in the process memory, in front of the shared cache
+    * ``local_timeout`` - seconds, for how long the results are kept
+      in the process memory, as other processes can't invalidate them
+
+    The decorated function gets methods:
+
+    * ``delete(*args, **kwargs)`` - deletes result of one call
+    * ``invalidate()`` - deletes all results, by changing the version
+      namespace of the cache keys
     """
+    if func is None:
+        return functools.partial(
+                    memoize,
+                    timeout=timeout,
+                    local_size=local_size,
+                    local_timeout=local_timeout
+                )
+
+    version_key = 'memoized-version-' + get_function_name(func)
+    family = 'memoized:' + get_function_name(func)
+    local_memo = LocalMemo(local_size, local_timeout) if local_size else None
+
+    def get_version():
+        version = cache.get(version_key)
+        if version is None:
+            #version is random, so that the results
+            #of evicted versions can't be reached
+            cache.add(version_key, uuid.uuid4().hex[:12], None)
+            version = cache.get(version_key)
+        return version
+
     @functools.wraps(func)
     def decorated(*args, **kwargs):
         key = make_cache_key(func, *args, **kwargs)
-        return cache.get(key) or get_recached(key, func, *args, **kwargs)
+        if local_memo:
+            value = local_memo.get(key)
+            if value is not MISSING:
+                cache_stats.record_lookup(family, True)
+                return value
+
+        versioned_key = key + '-' + get_version()
+        #results are wrapped in a tuple, to tell a cached None from a miss
+        item = cache.get(versioned_key)
+        cache_stats.record_lookup(family, item is not None)
+        if item is None:
+            compute = functools.partial(func, *args, **kwargs)
+            item = (cache_stats.timed_compute(family, compute),)
+            cache.set(versioned_key, item, timeout)
+
+        if local_memo:
+            local_memo.set(key, item[0])
+        return item[0]
+
+    def delete(*args, **kwargs):
+        key = make_cache_key(func, *args, **kwargs)
+        if local_memo:
+            local_memo.delete(key)
+        cache.delete(key + '-' + get_version())
+
+    def invalidate():
+        if local_memo:
+            local_memo.clear()
+        cache.set(version_key, uuid.uuid4().hex[:12], None)
+
+    decorated.delete = delete
+    decorated.invalidate = invalidate
     return decorated
 
 
 def delete_memoized(func, *args, **kwargs):
-    """deletes cached result of the function"""
-    key = make_cache_key(func, *args, **kwargs)
-    cache.delete(key)
+    """deletes cached result of the function,
+    ``func`` is the function decorated with :func:`memoize`"""
+    func.delete(*args, **kwargs)
+
+
+def get_key_family(key):
+    """returns the leading parts of the key, that have no digits,
+    e.g. "thread-data" for the "thread-data-12-votes"."""
+    bits = list()
+    for bit in key.split('-'):
+        if any(char.isdigit() for char in bit):
+            break
+        bits.append(bit)
+    return '-'.join(bits) or key
+
+
+def get_stale_key(key):
+    """returns key of the stale copy of the cached value"""
+    return key + ':stale'
+
+
+def set_with_stale(key, value, timeout=DEFAULT_TIMEOUT, backend=None):
+    """caches the value and its stale copy,
+    the stale copy is kept ``STALE_TIMEOUT`` seconds longer
+    and is served while the value is recomputed,
+    see :func:`get_or_compute`"""
+    backend = backend or cache
+    if timeout is DEFAULT_TIMEOUT:
+        timeout = backend.default_timeout
+    backend.set(key, value, timeout)
+    stale_timeout = None if timeout is None else timeout + STALE_TIMEOUT
+    backend.set(get_stale_key(key), value, stale_timeout)
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, backend=None, family=None):
+    """returns value cached under the ``key``,
+    on a cache miss calls ``compute()`` and caches the result.
+
+    Only one caller at a time computes the value, others
+    get the stale copy of the value, if there is one,
+    or wait for the computed value. The caller computes
+    the value itself, if it waits longer than ``WAIT_TIMEOUT``.
+
+    ``timeout`` works as the soft expiration time of the value,
+    as the stale copy is served after it, until the value is recomputed.
+    Deleting the ``key`` invalidates the value in the same way.
+
+    ``backend`` - cache backend, django default cache by default
+    ``family`` - name of the group of keys for the cache stats,
+    by default the key without the trailing parts with digits
+    """
+    backend = backend or cache
+    family = family or get_key_family(key)
+    lock_key = key + ':lock'
+    deadline = time.time() + WAIT_TIMEOUT
+    while True:
+        value = backend.get(key)
+        if value is not None:
+            cache_stats.record_lookup(family, True)
+            return value
+
+        if backend.add(lock_key, True, LOCK_TIMEOUT):
+            cache_stats.record_lookup(family, False)
+            try:
+                value = cache_stats.timed_compute(family, compute)
+                set_with_stale(key, value, timeout, backend=backend)
+            finally:
+                backend.delete(lock_key)
+            return value
+
+        value = backend.get(get_stale_key(key))
+        if value is not None:
+            cache_stats.record_lookup(family, False, stale=True)
+            return value
+
+        if time.time() > deadline:
+            cache_stats.record_lookup(family, False)
+            return cache_stats.timed_compute(family, compute)
+
+        time.sleep(POLL_INTERVAL)
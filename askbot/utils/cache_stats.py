@@ -0,0 +1,154 @@
+"""Instrumentation of the askbot caches.
+
+When ``ASKBOT_CACHE_STATS_ENABLED`` is true, lookups and recomputations
+of the cached data are counted per "family" of the cache keys,
+for example all keys of the thread summaries are in one family.
+Stats are kept in the shared cache, so that they add up over
+all the processes, and are shown by the ``askbot_cache_stats``
+management command.
+
+Per-request numbers are collected by the
+``askbot.middleware.debug_headers.DebugHeadersMiddleware``.
+"""
+import pickle
+import threading
+import time
+from django.conf import settings as django_settings
+from django.core.cache import cache
+
+#families are listed in the numbered items, so that they
+#are registered without the read-modify-write of a shared list
+FAMILY_COUNT_KEY = 'askbot-cache-stats-family-count'
+#counters kept for the cache key families and for the views
+CACHE_COUNTERS = ('hits', 'misses', 'stale', 'computes', 'compute_ms', 'bytes')
+VIEW_COUNTERS = ('requests', 'queries', 'render_ms')
+
+#counters of the request, being processed by the thread
+REQUEST_STATS = threading.local()
+
+
+def is_enabled():
+    return django_settings.ASKBOT_CACHE_STATS_ENABLED
+
+
+def get_counter_key(family, name):
+    return 'askbot-cache-stats-%s-%s' % (family, name)
+
+
+def get_family_key(family):
+    return 'askbot-cache-stats-family-%s' % family
+
+
+def get_family_item_key(number):
+    return 'askbot-cache-stats-family-item-%d' % number
+
+
+def register_family(family):
+    """adds family to the list of families in the shared cache,
+    unless it is already there, ``cache.add`` is atomic, so
+    the family is listed once by one of the processes"""
+    if not cache.add(get_family_key(family), True, None):
+        return
+    try:
+        number = cache.incr(FAMILY_COUNT_KEY)
+    except ValueError:
+        cache.add(FAMILY_COUNT_KEY, 0, None)
+        number = cache.incr(FAMILY_COUNT_KEY)
+    cache.set(get_family_item_key(number), family, None)
+
+
+def get_families():
+    count = cache.get(FAMILY_COUNT_KEY, 0)
+    keys = [get_family_item_key(number) for number in range(1, count + 1)]
+    return set(cache.get_many(keys).values())
+
+
+def increment(family, name, delta=1):
+    key = get_counter_key(family, name)
+    try:
+        cache.incr(key, delta)
+    except ValueError:
+        #new counter, the family is registered
+        #also after the stats were reset
+        register_family(family)
+        cache.add(key, 0, None)
+        cache.incr(key, delta)
+
+
+def increment_request_counter(name):
+    counters = getattr(REQUEST_STATS, 'counters', None)
+    if counters is not None:
+        counters[name] = counters.get(name, 0) + 1
+
+
+def record_lookup(family, hit, stale=False):
+    """records hit or miss of the cached value,
+    ``stale`` - True when the stale copy of the value was served"""
+    increment_request_counter('hits' if hit or stale else 'misses')
+    if not is_enabled():
+        return
+    if stale:
+        increment(family, 'stale')
+    else:
+        increment(family, 'hits' if hit else 'misses')
+
+
+def record_compute(family, seconds, value):
+    """records time of the recomputation of the value
+    and size of the pickled value"""
+    if not is_enabled():
+        return
+    increment(family, 'computes')
+    increment(family, 'compute_ms', int(seconds * 1000))
+    try:
+        size = len(pickle.dumps(value, pickle.HIGHEST_PROTOCOL))
+    except (pickle.PicklingError, TypeError, AttributeError):
+        size = 0
+    increment(family, 'bytes', size)
+
+
+def timed_compute(family, compute):
+    """calls ``compute()``, records the stats
+    and returns the computed value"""
+    start = time.time()
+    value = compute()
+    record_compute(family, time.time() - start, value)
+    return value
+
+
+def record_view(view_name, queries, seconds):
+    """records the number of database queries
+    and the time of the request, processed by the view"""
+    if not is_enabled():
+        return
+    family = 'view:' + view_name
+    increment(family, 'requests')
+    increment(family, 'queries', queries)
+    increment(family, 'render_ms', int(seconds * 1000))
+
+
+def get_stats():
+    """returns dictionary family -> dictionary of counters"""
+    stats = dict()
+    for family in get_families():
+        if family.startswith('view:'):
+            names = VIEW_COUNTERS
+        else:
+            names = CACHE_COUNTERS
+        keys = dict([(get_counter_key(family, name), name) for name in names])
+        values = cache.get_many(list(keys.keys()))
+        stats[family] = dict([(keys[key], values.get(key, 0)) for key in keys])
+    return stats
+
+
+def reset_stats():
+    families = get_families()
+    keys = list()
+    for family in families:
+        keys.append(get_family_key(family))
+        for name in CACHE_COUNTERS + VIEW_COUNTERS:
+            keys.append(get_counter_key(family, name))
+    count = cache.get(FAMILY_COUNT_KEY, 0)
+    keys.extend([get_family_item_key(number) for number in range(1, count + 1)])
+    keys.append(FAMILY_COUNT_KEY)
+    cache.delete_many(keys)
@@ -229,6 +229,7 @@ def setup_paginator(context):
                 "has_previous": page_object.has_previous(),
                 "next": next_page_number,
                 "has_next": page_object.has_next(),
+                "next_cursor": getattr(page_object, 'next_cursor', None),
                 "page": context["current_page_number"],
                 "pages": context["pages"],
                 "page_numbers": page_numbers,
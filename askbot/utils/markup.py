@@ -5,6 +5,7 @@ Twitter-style @mentions"""
 
 import re
 import logging
+import threading
 
 from django.utils.html import urlize
 from django.utils.module_loading import import_string
@@ -20,56 +21,124 @@ from askbot.utils.html import urlize_html
 URL_RE = re.compile("((?<!(href|.src|data)=['\"])((http|https|ftp)\://([a-zA-Z0-9\.\-]+(\:[a-zA-Z0-9\.&amp;%\$\-]+)*@)*((25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9])\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[1-9]|0)\.(25[0-5]|2[0-4][0-9]|[0-1]{1}[0-9]{2}|[1-9]{1}[0-9]{1}|[0-9])|localhost|([a-zA-Z0-9\-]+\.)*[a-zA-Z0-9\-]+\.(com|edu|gov|int|mil|net|org|biz|arpa|info|name|pro|aero|coop|museum|[a-zA-Z]{2}))(\:[0-9]+)*(/($|[a-zA-Z0-9\.\,\?\'\\\+&amp;%\$#\=~_\-]+))*))")
 
 
+def get_parser_settings_key(markdown_class_addr=None):
+    """Returns a hashable tuple of all settings
+    that affect construction of the markdown parser.
+    Parsers are cached under this key and rebuilt
+    when any of the values changes."""
+    if markdown_class_addr is None:
+        from django.conf import settings as django_settings
+        markdown_class_addr = getattr(django_settings, 'ASKBOT_MARKDOWN_CLASS',
+                                      'markdown2.Markdown')
+
+    code_friendly = askbot_settings.ENABLE_MATHJAX or \
+                            askbot_settings.MARKUP_CODE_FRIENDLY
+
+    if askbot_settings.ENABLE_AUTO_LINKING:
+        link_settings = (
+            askbot_settings.AUTO_LINK_PATTERNS,
+            askbot_settings.AUTO_LINK_URLS
+        )
+    else:
+        link_settings = None
+
+    return (markdown_class_addr, bool(code_friendly), link_settings)
+
+
+def compile_link_patterns(link_settings):
+    """Returns list of (compiled regex, url template) pairs
+    from the auto-link patterns and urls settings values"""
+    if link_settings is None:
+        return []
+
+    link_patterns = []
+    pattern_list = link_settings[0].split('\n')
+    url_list = link_settings[1].split('\n')
+    pairs = list(zip(pattern_list, url_list))  # always takes equal number of items
+    for item in pairs:
+        if not item[0].strip() or not item[1].strip():
+            continue
+        link_patterns.append(
+            (re.compile(item[0].strip()), item[1].strip())
+        )
+
+    # Check whether  we have matching links for all key terms,
+    # Other wise we ignore the key terms
+    # May be we should do this test in update_callback?
+    # looks like this might be a defect of livesettings
+    # as there seems to be no way
+    # to validate entries that depend on each other
+    if len(pattern_list) != len(url_list):
+        settings_url = askbot_settings.APP_URL+'/settings/AUTOLINK/'
+        msg = "Number of autolink patterns didn't match the number "\
+              "of url templates, fix this by visiting %s"
+        logging.critical(msg, settings_url)
+
+    return link_patterns
+
+
+# process-wide cache of the markdown classes and compiled link patterns,
+# keyed by the output of get_parser_settings_key()
+_PARSER_SPECS = dict()
+_PARSER_SPECS_LOCK = threading.Lock()
+# markdown parser instances keep state during the conversion,
+# therefore each thread gets its own instance
+_THREAD_PARSERS = threading.local()
+
+
+def get_parser_spec(settings_key):
+    """Returns cached tuple (Markdown class, extras, link patterns)
+    for the given settings key, builds it if necessary"""
+    spec = _PARSER_SPECS.get(settings_key)
+    if spec is None:
+        markdown_class_addr, code_friendly, link_settings = settings_key
+        extras = ['link-patterns', 'video']
+        if code_friendly:
+            extras.append('code-friendly')
+
+        spec = (
+            import_string(markdown_class_addr),
+            tuple(extras),
+            compile_link_patterns(link_settings)
+        )
+        with _PARSER_SPECS_LOCK:
+            # drop parsers built for the outdated settings
+            # of the same markdown class
+            for key in list(_PARSER_SPECS.keys()):
+                if key[0] == markdown_class_addr:
+                    del _PARSER_SPECS[key]
+            _PARSER_SPECS[settings_key] = spec
+    return spec
+
+
 def get_parser(markdown_class_addr=None):
     """
     Returns an instance of configured :class:`markdown2.Markdown parser.
 
+    The parser instance is reused within the current thread
+    and is rebuilt only when the relevant livesettings change.
+
     :param markdown_class_addr: Path to :class:`markdown2.Markdown` custom
                                 class. (default: `'markdown2.Markdown'`)
     :type markdown_class_addr: ``str``
     """
-    if markdown_class_addr is None:
-        from django.conf import settings as django_settings
-        markdown_class_addr = getattr(django_settings, 'ASKBOT_MARKDOWN_CLASS',
-                                      'markdown2.Markdown')
-    Markdown = import_string(markdown_class_addr)
-    extras = ['link-patterns', 'video']
-
-    if askbot_settings.ENABLE_MATHJAX or askbot_settings.MARKUP_CODE_FRIENDLY:
-        extras.append('code-friendly')
-
-    # link_patterns = [
-    #     (URL_RE, r'\1'),
-    # ]
-    link_patterns = []
-    if askbot_settings.ENABLE_AUTO_LINKING:
-        pattern_list = askbot_settings.AUTO_LINK_PATTERNS.split('\n')
-        url_list = askbot_settings.AUTO_LINK_URLS.split('\n')
-        pairs = list(zip(pattern_list, url_list))  # always takes equal number of items
-        for item in pairs:
-            if not item[0].strip() or not item[1].strip():
-                continue
-            link_patterns.append(
-                (re.compile(item[0].strip()), item[1].strip())
-            )
-
-        # Check whether  we have matching links for all key terms,
-        # Other wise we ignore the key terms
-        # May be we should do this test in update_callback?
-        # looks like this might be a defect of livesettings
-        # as there seems to be no way
-        # to validate entries that depend on each other
-        if len(pattern_list) != len(url_list):
-            settings_url = askbot_settings.APP_URL+'/settings/AUTOLINK/'
-            msg = "Number of autolink patterns didn't match the number "\
-                  "of url templates, fix this by visiting %s"
-            logging.critical(msg, settings_url)
-
-    return Markdown(
-        html4tags=True,
-        extras=extras,
-        link_patterns=link_patterns
-    )
+    settings_key = get_parser_settings_key(markdown_class_addr)
+    parsers = getattr(_THREAD_PARSERS, 'parsers', None)
+    if parsers is None:
+        parsers = dict()
+        _THREAD_PARSERS.parsers = parsers
+
+    parser = parsers.get(settings_key[0])
+    if parser is None or parser.askbot_settings_key != settings_key:
+        Markdown, extras, link_patterns = get_parser_spec(settings_key)
+        parser = Markdown(
+            html4tags=True,
+            extras=list(extras),
+            link_patterns=link_patterns
+        )
+        parser.askbot_settings_key = settings_key
+        parsers[settings_key[0]] = parser
+    return parser
 
 
 def format_mention_in_html(mentioned_user):
@@ -6,7 +6,9 @@ from django.db.models import Q
 from django.urls import reverse
 from askbot import models
 from askbot.models import User, UserProfile
+from askbot.models import counters
 from askbot.conf import settings as askbot_settings
+from askbot.search.paginator import QuestionsPaginator
 from askbot.search.state_manager import SearchState
 from askbot.utils.html import site_url
 from askbot.utils.functions import get_epoch_str
@@ -61,14 +63,13 @@ def info(request):
        Returns general data about the forum
     '''
     data = {}
-    posts = models.Post.objects.filter(deleted=False)
-    data['answers'] = posts.filter(post_type='answer').count()
-    data['questions'] = posts.filter(post_type='question').count()
-    data['comments'] = posts.filter(post_type='comment').count()
-    data['users'] = User.objects.filter(is_active=True).count()
+    data['answers'] = counters.get_counter('posts', 'answer')
+    data['questions'] = counters.get_counter('posts', 'question')
+    data['comments'] = counters.get_counter('posts', 'comment')
+    data['users'] = counters.get_counter('users')
 
     if askbot_settings.GROUPS_ENABLED:
-        data['groups'] = models.Group.objects.exclude_personal().count()
+        data['groups'] = counters.get_counter('groups')
     else:
         data['groups'] = 0
 
@@ -178,6 +179,7 @@ def questions(request):
                 tags=request.GET.get('tags', None),
                 author=author_id,
                 page=page,
+                cursor=request.GET.get('cursor', None),
                 user_logged_in=request.user.is_authenticated,
             )
 
@@ -192,8 +194,13 @@ def questions(request):
     #qs = qs.exclude(~Q(groups__id=global_group.id))
 
     page_size = askbot_settings.DEFAULT_QUESTIONS_PAGE_SIZE
-    paginator = Paginator(qs, page_size)
-    if paginator.num_pages < search_state.page:
+    paginator = QuestionsPaginator(
+                        qs, page_size,
+                        sort=search_state.sort,
+                        cursor=search_state.cursor,
+                        count=counters.get_listing_count(search_state, request.user)
+                    )
+    if paginator.position is None and paginator.num_pages < search_state.page:
         search_state.page = 1
     page = paginator.page(search_state.page)
 
@@ -205,6 +212,7 @@ def questions(request):
     ajax_data = {
         'count': paginator.count,
         'pages' : paginator.num_pages,
+        'next_cursor': page.next_cursor,
         'questions': question_list
     }
     response_data = simplejson.dumps(ajax_data)
@@ -9,6 +9,7 @@ import logging
 from bs4 import BeautifulSoup
 from django.conf import settings as django_settings
 from django.core import exceptions
+from django.db.models import Count
 #from django.core.management import call_command
 from django.urls import reverse
 from django.contrib.auth.decorators import login_required
@@ -47,6 +48,8 @@ from django.template import RequestContext
 from askbot.skins.shortcuts import render_into_skin_as_string
 from askbot.skins.shortcuts import render_text_into_skin
 from askbot.models.tag import get_tags_by_names
+from askbot.models.question import get_visible_group_ids
+from askbot.search import title_index
 
 
 def process_vote(user = None, vote_direction = None, post = None):
@@ -96,13 +99,6 @@ def process_vote(user = None, vote_direction = None, post = None):
         response_data['count'] = post.points
         response_data['status'] = 0 #this means "not cancel", normal operation
 
-    if vote and post.thread_id:
-        #todo: may be more careful here and clear
-        #less items and maybe recalculate certain data
-        #depending on whether the vote is on question
-        #or other posts
-        post.thread.clear_cached_data()
-
     response_data['success'] = 1
 
     return response_data
@@ -186,9 +182,6 @@ def vote(request):
         elif vote_type in const.VOTE_TYPES_VOTING:
             response_data = process_vote(
                 user=user, vote_direction=vote_args[1], post=post)
-
-            if vote_args[0] == 'question':
-                post.thread.update_summary_html()
         elif vote_type in const.VOTE_TYPES_REPORTING:
             user.flag_post(post, cancel=vote_args[1], cancel_all=vote_args[2])
             response_data['count'] = post.offensive_flag_count
@@ -701,34 +694,44 @@ def delete_bulk_tag_subscription(request):
 
 @decorators.get_only
 def api_get_questions(request):
-    """json api for retrieving questions by title match"""
+    """json api for retrieving questions by title match,
+    served from the in-memory title index"""
     query = request.GET.get('query_text', '').strip()
     tag_name = request.GET.get('tag_name', None)
 
     if askbot_settings.GROUPS_ENABLED:
-        threads = models.Thread.objects.get_visible(user=request.user)
+        group_ids = get_visible_group_ids(request.user)
     else:
-        threads = models.Thread.objects.all()
+        group_ids = None
 
-    if tag_name:
-        threads = threads.filter(tags__name=tag_name)
+    entries = title_index.search_titles(
+                                query, tag_name=tag_name, group_ids=group_ids
+                            )
 
-    if query:
-        threads = threads.get_for_title_query(query)
-
-    #todo: filter out deleted threads, for now there is no way
-    threads = threads.distinct()[:30]
+    if askbot_settings.GROUPS_ENABLED:
+        #count answers visible to the user, all with one query
+        user = request.user if request.user.is_authenticated else None
+        answer_counts = models.Post.objects.get_answers(user).filter(
+                                thread_id__in=[entry['id'] for entry in entries],
+                                deleted=False
+                            ).values('thread_id').annotate(
+                                count=Count('id', distinct=True)
+                            ).values_list('thread_id', 'count')
+        answer_counts = dict(answer_counts)
+    else:
+        answer_counts = None
 
     thread_list = list()
-    for thread in threads:#todo: this is a temp hack until thread model is fixed
-        try:
-            thread_list.append({
-                    'title': escape(thread.title),
-                    'url': thread.get_absolute_url(),
-                    'answer_count': thread.get_answer_count(request.user)
-                })
-        except:
-            continue
+    for entry in entries:
+        if answer_counts is None:
+            answer_count = entry['answer_count']
+        else:
+            answer_count = answer_counts.get(entry['id'], 0)
+        thread_list.append({
+                'title': escape(entry['title']),
+                'url': entry['url'],
+                'answer_count': answer_count
+            })
 
     json_data = simplejson.dumps(thread_list)
     return HttpResponse(json_data, content_type="application/json")
@@ -39,8 +39,10 @@ from askbot.forms import GetDataForPostForm
 from askbot.forms import GetUserItemsForm
 from askbot.forms import ShowTagsForm
 from askbot.forms import ShowQuestionForm
+from askbot.models import counters
 from askbot.models.post import MockPost
 from askbot.models.tag import Tag
+from askbot.search.paginator import QuestionsPaginator
 from askbot.search.state_manager import SearchState, DummySearchState
 from askbot.startup_procedures import domain_is_bad
 from askbot.templatetags import extra_tags
@@ -89,11 +91,17 @@ def questions(request, **kwargs):
     if meta_data['non_existing_tags']:
         search_state = search_state.remove_tags(meta_data['non_existing_tags'])
 
-    paginator = Paginator(qs, search_state.page_size)
-    if paginator.num_pages < search_state.page:
-        search_state.page = 1
-    page = paginator.page(search_state.page)
-    page.object_list = list(page.object_list) # evaluate the queryset
+    paginator = QuestionsPaginator(
+                        qs, search_state.page_size,
+                        sort=search_state.sort,
+                        cursor=search_state.cursor,
+                        count=counters.get_listing_count(search_state, request.user)
+                    )
+    if paginator.position is None:
+        search_state.cursor = None
+        if paginator.num_pages < search_state.page:
+            search_state.page = 1
+    page = paginator.page(search_state.page) # the queryset is evaluated
 
     # INFO: Because for the time being we need question posts and thread authors
     #       down the pipeline, we have to precache them in thread objects
@@ -531,6 +539,13 @@ def question(request, id):#refactor - long subroutine. display question body, an
                                 sort_method=answer_sort_method,
                                 user=request.user
                             )
+    #load profiles of the authors at once, profiles
+    #in the cached post data may be outdated
+    thread_posts = [post for post in [question_post] + answers if post]
+    for post in list(thread_posts):
+        thread_posts.extend(post.get_cached_comments())
+    models.prefetch_profiles([post.author for post in thread_posts])
+
     user_votes = {}
     user_post_id_list = list()
     #todo: cache this query set, but again takes only 3ms!
@@ -708,6 +708,7 @@ def __generate_comments_json(obj, user, avatar_size):
     """
     models.Post.objects.precache_comments(for_posts=[obj], visitor=user)
     comments = obj._cached_comments
+    models.prefetch_profiles([comment.author for comment in comments])
 
     # {"Id":6,"PostId":38589,"CreationDate":"an hour ago","Text":"hello there!","UserDisplayName":"Jarrod Dixon","UserUrl":"/users/3/jarrod-dixon","DeleteUrl":null}
     json_comments = []